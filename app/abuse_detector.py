@@ -0,0 +1,109 @@
+"""
+Sliding-window burst detection for scripted voting.
+
+Each client key (IP, session id, user agent) gets a small ring of per-bucket
+vote counts covering the window, e.g. 6 buckets of 10 s for a 60 s window.
+A check advances the ring, adds the vote and compares the window total with
+the limit for that dimension: a few integer operations and a dict lookup per
+dimension, a few microseconds per vote (see load-tests/bench_abuse_detector.py). Keys live in an LRU
+capped at ``max_keys`` per dimension, so memory stays fixed however many
+clients show up; a key evicted while cold has nothing worth remembering.
+
+Flagged votes are still recorded (tagged with the reason) unless the
+detector runs in ``reject`` mode, so analytics can exclude them later
+instead of losing them outright.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+DEFAULT_LIMITS = {'ip': 60, 'session': 20, 'user_agent': 600}
+
+class SlidingWindow:
+    __slots__ = ('counts', 'bucket', 'total')
+
+    def __init__(self, buckets):
+        self.counts = [0] * buckets
+        self.bucket = 0
+        self.total = 0
+
+    def add(self, bucket, amount):
+        size = len(self.counts)
+        if bucket - self.bucket >= size:
+            self.counts = [0] * size
+            self.total = 0
+        else:
+            for b in range(self.bucket + 1, bucket + 1):
+                self.total -= self.counts[b % size]
+                self.counts[b % size] = 0
+        self.bucket = bucket
+        self.counts[bucket % size] += amount
+        self.total += amount
+        return self.total
+
+class AbuseDetector:
+    def __init__(self, window_seconds=60, buckets=6, limits=None, max_keys=50000, action='tag'):
+        self.bucket_seconds = window_seconds / buckets
+        self.window_seconds = window_seconds
+        self.buckets = buckets
+        self.limits = {**DEFAULT_LIMITS, **(limits or {})}
+        self.max_keys = max_keys
+        self.action = action
+        self.windows = {dimension: OrderedDict() for dimension in self.limits}
+        self.flagged = {}
+        self.checked = 0
+        self.evicted = 0
+        self.lock = threading.Lock()
+
+    def check(self, ip=None, session_id=None, user_agent=None, choice=None, amount=1, now=None):
+        """Count a vote; returns the flag reason (e.g. 'ip:75/60s') or None"""
+        bucket = int((time.monotonic() if now is None else now) / self.bucket_seconds)
+        reasons = []
+        with self.lock:
+            self.checked += amount
+            for dimension, key in (('ip', ip), ('session', session_id), ('user_agent', user_agent)):
+                if not key:
+                    continue
+                windows = self.windows[dimension]
+                window = windows.get(key)
+                if window is None:
+                    window = windows[key] = SlidingWindow(self.buckets)
+                    if len(windows) > self.max_keys:
+                        windows.popitem(last=False)
+                        self.evicted += 1
+                else:
+                    windows.move_to_end(key)
+                total = window.add(bucket, amount)
+                if total > self.limits[dimension]:
+                    reasons.append(f'{dimension}:{total}/{self.window_seconds:g}s')
+            if not reasons:
+                return None
+            if choice is not None:
+                self.flagged[choice] = self.flagged.get(choice, 0) + amount
+        return ','.join(reasons)
+
+    def rejects(self, reason):
+        return reason is not None and self.action == 'reject'
+
+    def stats(self, top=10):
+        bucket = int(time.monotonic() / self.bucket_seconds)
+        with self.lock:
+            offenders = {}
+            for dimension, windows in self.windows.items():
+                limit = self.limits[dimension]
+                # Advancing with 0 drops buckets that slid out since the key's last vote
+                hot = [(key, w.total) for key, w in windows.items()
+                       if w.total > limit and w.add(bucket, 0) > limit]
+                offenders[dimension] = [{'key': k, 'votes': v}
+                                        for k, v in sorted(hot, key=lambda item: -item[1])[:top]]
+            return {
+                'action': self.action,
+                'window_seconds': self.window_seconds,
+                'limits': self.limits,
+                'checked': self.checked,
+                'flagged': dict(self.flagged),
+                'tracked_keys': {d: len(w) for d, w in self.windows.items()},
+                'evicted_keys': self.evicted,
+                'offenders': offenders
+            }
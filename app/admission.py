@@ -0,0 +1,175 @@
+"""
+Adaptive admission control for the Flask voting apps.
+
+Every backend dependency (Postgres, Redis, the on-prem API) gets its own
+in-flight limit that adapts to observed latency, either AIMD (additive
+increase, multiplicative decrease when latency exceeds a target or a call
+fails) or gradient (scale by long-term / short-term latency). Requests are
+classed by route: votes may use the whole limit, page loads, result polls
+and health detail progressively less, so polling is shed before it can
+starve /vote. A shed request gets the last good response for its route,
+marked stale, or a fast 503.
+"""
+
+import math
+import threading
+import time
+from contextlib import contextmanager, nullcontext
+
+from flask import Response, g, has_request_context, jsonify, request
+
+# Share of a dependency's limit each priority class may occupy
+PRIORITY_HEADROOM = {
+    'vote': 1.0,
+    'page': 0.9,
+    'results': 0.75,
+    'health': 0.5
+}
+
+MIN_RTT = 1e-6  # seconds; floor for the gradient's short-term latency
+
+class Overloaded(Exception):
+    def __init__(self, dependency, priority):
+        super().__init__(f"{dependency} is at its concurrency limit for {priority} requests")
+        self.dependency = dependency
+        self.priority = priority
+
+class AdaptiveLimiter:
+    def __init__(self, name, strategy='aimd', initial=20, min_limit=2, max_limit=200,
+                 target_latency=0.25, backoff=0.9):
+        self.name = name
+        self.strategy = strategy
+        self.limit = float(initial)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.backoff = backoff
+        self.in_flight = 0
+        self.short_rtt = None
+        self.long_rtt = None
+        self.admitted = 0
+        self.shed = {priority: 0 for priority in PRIORITY_HEADROOM}
+        self.lock = threading.Lock()
+
+    def try_acquire(self, priority):
+        headroom = PRIORITY_HEADROOM.get(priority, PRIORITY_HEADROOM['page'])
+        with self.lock:
+            if self.in_flight >= max(1, int(self.limit * headroom)):
+                self.shed[priority] = self.shed.get(priority, 0) + 1
+                return False
+            self.in_flight += 1
+            self.admitted += 1
+            return True
+
+    def release(self, rtt, ok=True):
+        with self.lock:
+            self.in_flight -= 1
+            self.short_rtt = rtt if self.short_rtt is None else 0.5 * rtt + 0.5 * self.short_rtt
+            self.long_rtt = rtt if self.long_rtt is None else 0.02 * rtt + 0.98 * self.long_rtt
+
+            if self.strategy == 'gradient':
+                # Cached answers and coarse clocks can report a zero round-trip
+                gradient = max(0.5, min(1.0, self.long_rtt / max(self.short_rtt, MIN_RTT))) if ok else 0.5
+                new_limit = self.limit * gradient + math.sqrt(self.limit)
+                self.limit = 0.8 * self.limit + 0.2 * new_limit
+            elif not ok or rtt > self.target_latency:
+                self.limit *= self.backoff
+            elif self.in_flight * 2 >= self.limit:
+                # Only grow while the limit is actually being used
+                self.limit += 1.0 / self.limit
+
+            self.limit = max(self.min_limit, min(self.max_limit, self.limit))
+
+    def stats(self):
+        with self.lock:
+            return {
+                'limit': round(self.limit, 2),
+                'in_flight': self.in_flight,
+                'admitted': self.admitted,
+                'shed': dict(self.shed),
+                'latency_ms': round(self.short_rtt * 1000, 1) if self.short_rtt is not None else None
+            }
+
+class AdmissionController:
+    def __init__(self, route_priorities, cacheable=(), enabled=True, strategy='aimd',
+                 initial_limit=20, max_limit=200, target_latency=0.25):
+        self.route_priorities = route_priorities
+        self.enabled = enabled
+        self.cacheable = set(cacheable)
+        self.strategy = strategy
+        self.initial_limit = initial_limit
+        self.max_limit = max_limit
+        self.target_latency = target_latency
+        self.limiters = {}
+        self.last_good = {}
+        # Optional dependency(name) context manager wrapped around every guarded
+        # call, enabled or not (e.g. Saturation.track for latency EWMAs)
+        self.track = None
+        self.lock = threading.Lock()
+
+    def limiter(self, dependency):
+        limiter = self.limiters.get(dependency)
+        if limiter is None:
+            with self.lock:
+                limiter = self.limiters.setdefault(dependency, AdaptiveLimiter(
+                    dependency, self.strategy, self.initial_limit,
+                    max_limit=self.max_limit, target_latency=self.target_latency))
+        return limiter
+
+    @contextmanager
+    def guard(self, dependency):
+        """Hold a slot on a dependency for the duration of a call, or raise Overloaded"""
+        with self.admit(dependency):
+            # Shed calls never reach the dependency, so they are not timed
+            with self.track(dependency) if self.track else nullcontext():
+                yield
+
+    @contextmanager
+    def admit(self, dependency):
+        if not self.enabled:
+            yield
+            return
+        # Background work (e.g. cache revalidation) is never worth more than a results poll
+        priority = g.get('priority', 'page') if has_request_context() else 'results'
+        limiter = self.limiter(dependency)
+        if not limiter.try_acquire(priority):
+            raise Overloaded(dependency, priority)
+        started = time.monotonic()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            limiter.release(time.monotonic() - started, ok)
+
+    def init_app(self, app):
+        @app.before_request
+        def classify_request():
+            g.priority = self.route_priorities.get(request.endpoint, 'page')
+
+        @app.after_request
+        def remember_good_response(response):
+            if (self.enabled and request.endpoint in self.cacheable and response.status_code == 200
+                    and not response.direct_passthrough):
+                self.last_good[request.endpoint] = (response.get_data(), response.mimetype,
+                                                    response.headers.get('Content-Encoding'))
+            return response
+
+        @app.errorhandler(Overloaded)
+        def shed_request(e):
+            cached = self.last_good.get(request.endpoint)
+            # A pre-gzipped body can only go to a client that accepts gzip
+            if cached is not None and (not cached[2] or cached[2] in request.headers.get('Accept-Encoding', '')):
+                body, mimetype, encoding = cached
+                headers = {'X-Stale': 'true'}
+                if encoding:
+                    headers.update({'Content-Encoding': encoding, 'Vary': 'Accept-Encoding'})
+                return Response(body, mimetype=mimetype, headers=headers)
+            response = jsonify({'error': str(e), 'shed': True})
+            response.status_code = 503
+            response.headers['Retry-After'] = '1'
+            return response
+
+        @app.route('/metrics/admission')
+        def admission_metrics():
+            return jsonify({name: limiter.stats() for name, limiter in self.limiters.items()})
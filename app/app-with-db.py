@@ -1,95 +1,354 @@
 from flask import Flask, render_template, request, jsonify, redirect, url_for
-import psycopg2
 import os
+import io
+import csv
 import json
-from datetime import datetime
+from datetime import datetime, timezone
 import socket
 
+from db_routing import ReplicaRouter, parse_replica_hosts
+from vote_journal import VoteJournal, PostgresJournalSink
+from tiered_store import TieredVoteStore
+from admission import AdmissionController, Overloaded
+from saturation import Saturation
+from event_log import EventLog
+from snapshot_cache import SnapshotCache
+from serialized_snapshot import SerializedSnapshots
+from migrations import migrate
+from vote_ids import VoteIdGenerator
+from warmup import Warmup
+from voter_sketches import VoterAnalytics
+from abuse_detector import AbuseDetector
+from metadata_dictionary import MetadataDictionary
+from batch_votes import BatchTooLarge, parse_batch, validate_batch, batch_response
+from auth import authorized
+from polls import DEFAULT_POLL, PollCatalog, PollSnapshots, parse_poll
+from memory_debug import MemoryDebug
+
 app = Flask(__name__)
 
+# Admission control: per-dependency adaptive concurrency limits, with result
+# polling shed before page loads and votes (ADMISSION_CONTROL=true to enable)
+admission = AdmissionController(
+    {'vote': 'vote', 'vote_batch': 'vote', 'index': 'page', 'results': 'results', 'api_results': 'results', 'health': 'health', 'ready': 'health',
+     'voter_analytics_summary': 'results', 'abuse_stats': 'results',
+     'list_polls': 'results', 'poll_results': 'results', 'create_poll': 'vote'},
+    cacheable=('index', 'results', 'api_results', 'health'),
+    enabled=os.getenv('ADMISSION_CONTROL', 'false').lower() == 'true',
+    strategy=os.getenv('ADMISSION_STRATEGY', 'aimd'),
+    initial_limit=int(os.getenv('ADMISSION_INITIAL_LIMIT', '20')),
+    max_limit=int(os.getenv('ADMISSION_MAX_LIMIT', '200')),
+    target_latency=float(os.getenv('ADMISSION_TARGET_LATENCY_MS', '250')) / 1000
+)
+admission.init_app(app)
+
+# Saturation signals at /metrics/saturation for autoscaling on busy workers
+# rather than CPU; SATURATION_THREADS is the request threads per worker process
+saturation = Saturation(threads=int(os.getenv('SATURATION_THREADS', '1')),
+                        window=int(os.getenv('SATURATION_WINDOW_SECONDS', '60')),
+                        queue_target=int(os.getenv('SATURATION_QUEUE_TARGET', '1000')))
+saturation.init_app(app)
+admission.track = saturation.track
+
+# Request-path logging goes through a bounded queue to a background writer,
+# sampled per category (LOG_LEVEL, LOG_SAMPLE_RATES, see event_log)
+log = EventLog.from_env()
+saturation.queue('event_log', log.depth)
+
 # Database configuration
 DB_CONFIG = {
     'host': os.getenv('DB_HOST', 'postgres-service'),
     'port': int(os.getenv('DB_PORT', '5432')),
     'database': os.getenv('DB_NAME', 'voting_app'),
     'user': os.getenv('DB_USER', 'votinguser'),
-    'password': os.getenv('DB_PASSWORD', 'secure_password_123')
+    'password': os.getenv('DB_PASSWORD', 'secure_password_123'),
+    'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '5'))
 }
 
+# Optional read replicas, e.g. DB_REPLICA_HOSTS="replica-1:5432,replica-2"
+replica_router = ReplicaRouter(
+    DB_CONFIG,
+    parse_replica_hosts(os.getenv('DB_REPLICA_HOSTS', ''), DB_CONFIG),
+    strategy=os.getenv('DB_REPLICA_STRATEGY', 'round_robin'),
+    max_lag=float(os.getenv('DB_REPLICA_MAX_LAG', '5')),
+    check_interval=float(os.getenv('DB_REPLICA_CHECK_INTERVAL', '5')),
+    # Reads are bounded so a slow database can't hold request threads
+    read_overrides={'options': f"-c statement_timeout={os.getenv('READ_STATEMENT_TIMEOUT_MS', '2000')}"}
+)
+
+# DB_DRIVER=psycopg uses a psycopg 3 pool with prepared statements and pipelines
+# the vote insert with the summary read; the default keeps psycopg2
+pg = None
+if os.getenv('DB_DRIVER', 'psycopg2') == 'psycopg':
+    from pg_pipeline import PipelinedPostgres
+    pg = PipelinedPostgres(
+        {**DB_CONFIG, 'options': f"-c statement_timeout={os.getenv('DB_STATEMENT_TIMEOUT_MS', '2000')}"},
+        min_size=int(os.getenv('DB_POOL_MIN', '1')),
+        max_size=int(os.getenv('DB_POOL_MAX', '10'))
+    )
+    pg.open()
+    saturation.pool('postgres', pg.stats)
+
+INSERT_VOTE_SQL = "INSERT INTO votes (id, vote_choice, vote_source, ip_address, user_agent, session_id, abuse_flag, poll_id) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"
+COPY_VOTES_SQL = "COPY votes (id, vote_choice, vote_source, timestamp, ip_address, user_agent, session_id, abuse_flag, poll_id) FROM STDIN"
+SUMMARY_SQL = "SELECT * FROM vote_summary ORDER BY vote_choice"
+POLL_SUMMARY_SQL = "SELECT vote_choice, total_votes, azure_votes, onprem_votes, percentage FROM poll_summary WHERE poll_id = %s ORDER BY vote_choice"
+POLL_OPTIONS_SQL = "SELECT poll_id, option FROM poll_options ORDER BY poll_id, position"
+
+# COMPACT_METADATA=true stores lookup ids for user agent and source instead of
+# the text (schema migration 5); ids are cached in-process so writes stay one round-trip
+metadata = None
+if os.getenv('COMPACT_METADATA', 'false').lower() == 'true':
+    metadata = MetadataDictionary(capacity=int(os.getenv('METADATA_CACHE_SIZE', '4096')))
+    INSERT_VOTE_SQL = "INSERT INTO votes (id, vote_choice, source_id, ip_address, user_agent_id, session_id, abuse_flag, poll_id) VALUES (%s, %s, %s, %s, %s, %s, %s, %s)"
+    COPY_VOTES_SQL = "COPY votes (id, vote_choice, source_id, timestamp, ip_address, user_agent_id, session_id, abuse_flag, poll_id) FROM STDIN"
+
 # Determine environment (azure vs onprem)
 ENVIRONMENT = os.getenv('VOTE_SOURCE', 'onprem')
 
-def get_db_connection():
+# Vote ids are generated here, time-ordered and unique across sites (see
+# vote_ids), so inserts need no sequence and journaled votes keep their id
+vote_ids = VoteIdGenerator.from_env(ENVIRONMENT)
+
+# Largest batch accepted by POST /votes/batch
+VOTE_BATCH_MAX = int(os.getenv('VOTE_BATCH_MAX', '1000'))
+
+# POST /api/polls is disabled unless an admin token is configured
+POLL_ADMIN_TOKEN = os.getenv('POLL_ADMIN_TOKEN')
+
+def get_db_connection(readonly=False):
+    """Primary connection for writes; replica (when configured) for read-only queries"""
     try:
-        return psycopg2.connect(**DB_CONFIG)
+        if readonly:
+            return replica_router.connect_read()
+        return replica_router.connect_primary()
     except Exception as e:
-        print(f"Database connection error: {e}")
+        log.error('postgres', 'connection failed', error=e, readonly=readonly)
         return None
 
+# Optional local journal that keeps votes while the database is unreachable
+VOTE_JOURNAL_DIR = os.getenv('VOTE_JOURNAL_DIR')
+vote_journal = None
+if VOTE_JOURNAL_DIR:
+    vote_journal = VoteJournal(VOTE_JOURNAL_DIR,
+                               use_mmap=os.getenv('VOTE_JOURNAL_MMAP', 'false').lower() == 'true')
+    vote_journal.start_replayer(PostgresJournalSink(replica_router.connect_primary, metadata, vote_ids),
+                                interval=float(os.getenv('VOTE_JOURNAL_REPLAY_INTERVAL', '5')))
+    saturation.queue('vote_journal', vote_journal.backlog)
+
+# Storage mode: "postgres" writes every vote synchronously; "tiered" counts in
+# Redis and streams the full record to Postgres in the background
+STORAGE_MODE = os.getenv('STORAGE_MODE', 'postgres')
+tiered_store = None
+if STORAGE_MODE == 'tiered':
+    import redis
+    tiered_store = TieredVoteStore(
+        redis.Redis(host=os.getenv('REDIS_HOST', 'localhost'),
+                    port=int(os.getenv('REDIS_PORT', '6379')),
+                    decode_responses=True),
+        replica_router.connect_primary,
+        polls=lambda: catalog.polls(),
+        batch_size=int(os.getenv('TIERED_BATCH_SIZE', '500')),
+        metadata=metadata,
+        ids=vote_ids
+    )
+    saturation.queue('vote_stream', lambda: tiered_store.redis.xlen(tiered_store.stream_key))
+
+# Streaming distinct-voter / top IP and user agent sketches (VOTER_ANALYTICS=local,
+# or redis in tiered mode to share PFADD-based distinct counts across pods)
+VOTER_ANALYTICS = os.getenv('VOTER_ANALYTICS', 'off')
+voter_analytics = None
+if VOTER_ANALYTICS != 'off':
+    voter_analytics = VoterAnalytics(
+        bucket_seconds=int(os.getenv('VOTER_ANALYTICS_BUCKET_SECONDS', '3600')),
+        buckets=int(os.getenv('VOTER_ANALYTICS_BUCKETS', '24')),
+        k=int(os.getenv('VOTER_ANALYTICS_TOP_K', '20')),
+        redis_client=tiered_store.redis if VOTER_ANALYTICS == 'redis' and tiered_store else None
+    )
+
+# Burst detection on the vote path: ABUSE_DETECTION=tag records flagged votes
+# with an abuse_flag, reject answers 429 instead
+ABUSE_DETECTION = os.getenv('ABUSE_DETECTION', 'off')
+abuse_detector = None
+if ABUSE_DETECTION != 'off':
+    abuse_detector = AbuseDetector(
+        window_seconds=float(os.getenv('ABUSE_WINDOW_SECONDS', '60')),
+        limits={'ip': int(os.getenv('ABUSE_IP_LIMIT', '60')),
+                'session': int(os.getenv('ABUSE_SESSION_LIMIT', '20')),
+                'user_agent': int(os.getenv('ABUSE_USER_AGENT_LIMIT', '600'))},
+        max_keys=int(os.getenv('ABUSE_MAX_KEYS', '50000')),
+        action=ABUSE_DETECTION
+    )
+
+def read_rows(sql, params=None):
+    """Run a read-only query on a replica (or the pipelined pool) and return its rows"""
+    with admission.guard('postgres'):
+        if pg and not replica_router.replicas:
+            return pg.query(sql, params)
+        
+        conn = get_db_connection(readonly=True)
+        if not conn:
+            raise ConnectionError("Database connection failed")
+        try:
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+            cursor.close()
+            return rows
+        finally:
+            conn.close()
+
+def fetch_vote_summary():
+    """Rows of (choice, total, azure, onprem, percentage) from the configured store"""
+    if tiered_store:
+        with admission.guard('redis'):
+            return tiered_store.get_summary()
+    return read_rows(SUMMARY_SQL)
+
+def fetch_poll_summary(poll_id):
+    """Same rows as fetch_vote_summary for any poll"""
+    if tiered_store:
+        with admission.guard('redis'):
+            return tiered_store.get_summary(poll_id)
+    return read_rows(POLL_SUMMARY_SQL, (poll_id,))
+
+def load_polls():
+    polls = {}
+    for poll_id, option in read_rows(POLL_OPTIONS_SQL):
+        polls.setdefault(poll_id, []).append(option)
+    return polls
+
+# Polls and their options, cached so validating a vote stays a dict lookup
+catalog = PollCatalog(load_polls, ttl=float(os.getenv('POLL_CATALOG_TTL', '30')))
+
+READ_CACHE_SETTINGS = {
+    'ttl': float(os.getenv('READ_CACHE_TTL', '0.5')),
+    'soft_timeout': float(os.getenv('READ_SOFT_TIMEOUT_MS', '200')) / 1000,
+    # Cold start: wait no longer than a read query is allowed to run
+    'first_load_timeout': float(os.getenv('READ_FIRST_LOAD_TIMEOUT_MS', os.getenv('READ_STATEMENT_TIMEOUT_MS', '2000'))) / 1000
+}
+
+# Last good vote summary, served (flagged stale) while the store is slow or down
+summary_cache = SnapshotCache(fetch_vote_summary, name='vote summary', **READ_CACHE_SETTINGS)
+
+# The same for other polls, kept only for the POLL_CACHE_SIZE most recently read
+poll_snapshots = PollSnapshots(fetch_poll_summary, maxsize=int(os.getenv('POLL_CACHE_SIZE', '1000')),
+                               **READ_CACHE_SETTINGS)
+
+def summary_for(poll_id):
+    return summary_cache if poll_id == DEFAULT_POLL else poll_snapshots.get(poll_id)
+
+# Result polls serve bytes serialized once per summary change (see serialized_snapshot)
+result_snapshots = SerializedSnapshots()
+
+def store_unavailable(error):
+    """Connectivity/overload errors are worth journaling; bad data would block replay forever"""
+    if isinstance(error, (ConnectionError, TimeoutError, Overloaded)):
+        return True
+    import psycopg2
+    unavailable = (psycopg2.OperationalError, psycopg2.InterfaceError)
+    if pg:
+        import psycopg
+        unavailable += (psycopg.OperationalError, psycopg.InterfaceError)
+    if tiered_store:
+        import redis
+        unavailable += (redis.ConnectionError, redis.TimeoutError)
+    return isinstance(error, unavailable)
+
+def journal_vote(vote_id, choice, is_ajax, session_id=None, abuse_flag=None, poll_id=DEFAULT_POLL):
+    """Accept a vote into the local journal when the database can't take it"""
+    vote_journal.append({
+        'id': vote_id,
+        'poll_id': poll_id,
+        'choice': choice,
+        'source': ENVIRONMENT,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'ip': request.remote_addr,
+        'user_agent': request.headers.get('User-Agent', ''),
+        'session_id': session_id,
+        'abuse_flag': abuse_flag
+    })
+    if voter_analytics:
+        voter_analytics.observe(choice, ENVIRONMENT, request.remote_addr, request.headers.get('User-Agent', ''))
+    if is_ajax:
+        return jsonify({
+            'success': True,
+            'queued': True,
+            'choice': choice,
+            'source': ENVIRONMENT,
+            'message': f'Vote for {choice} accepted and will be recorded shortly'
+        }), 202
+    return redirect(url_for('index'))
+
 def init_database():
+    """Apply pending schema migrations; a no-op query when already up to date"""
     conn = get_db_connection()
     if not conn:
         return False
     
     try:
-        cursor = conn.cursor()
-        
-        # Create table if it doesn't exist
-        cursor.execute('''
-            CREATE TABLE IF NOT EXISTS votes (
-                id SERIAL PRIMARY KEY,
-                vote_choice VARCHAR(10) NOT NULL CHECK (vote_choice IN ('cat', 'dog')),
-                vote_source VARCHAR(20) NOT NULL CHECK (vote_source IN ('azure', 'onprem')),
-                timestamp TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
-                ip_address INET,
-                user_agent TEXT,
-                session_id VARCHAR(255)
-            )
-        ''')
-        
-        # Create view
-        cursor.execute('''
-            CREATE OR REPLACE VIEW vote_summary AS
-            SELECT 
-                vote_choice,
-                COUNT(*) as total_votes,
-                COUNT(CASE WHEN vote_source = 'azure' THEN 1 END) as azure_votes,
-                COUNT(CASE WHEN vote_source = 'onprem' THEN 1 END) as onprem_votes,
-                ROUND(COUNT(*) * 100.0 / (SELECT COUNT(*) FROM votes), 2) as percentage
-            FROM votes 
-            GROUP BY vote_choice
-        ''')
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
+        applied = migrate(conn)
+        if applied:
+            print(f"✅ Applied schema migrations {applied}")
         return True
         
     except Exception as e:
         print(f"Database initialization error: {e}")
         return False
+    finally:
+        conn.close()
+
+def start_tiered_store():
+    try:
+        tiered_store.seed_counters()
+    except Exception as e:
+        print(f"⚠️ Could not seed Redis counters from Postgres: {e}")
+    tiered_store.start(reconcile_interval=float(os.getenv('TIERED_RECONCILE_INTERVAL', '60')),
+                       repair=os.getenv('TIERED_RECONCILE_REPAIR', 'true').lower() == 'true')
+    print("✅ Tiered storage: Redis counters + Postgres stream consumer")
+
+def require(ok, message):
+    if not ok:
+        raise RuntimeError(message)
+
+# Start-up work runs in the background; /ready flips once it is done
+warmup = Warmup('voting app')
+warmup.step('migrations', lambda: require(init_database(), "database initialization failed"))
+if pg:
+    warmup.step('postgres pool', lambda: pg.wait(float(os.getenv('DB_POOL_WAIT_TIMEOUT', '10'))))
+if tiered_store:
+    warmup.step('tiered storage', start_tiered_store)
+warmup.step('vote summary', summary_cache.get)
+warmup.init_app(app)
+
+# Opt-in tracemalloc surface at /debug/memory (DEBUG_MEMORY_TOKEN)
+memory_debug = MemoryDebug.from_env()
+memory_debug.register('result_snapshots', result_snapshots.stats)
+memory_debug.register('poll_snapshots', poll_snapshots.stats)
+memory_debug.register('poll_catalog', lambda: len(catalog.catalog))
+memory_debug.register('admission_last_good', lambda: {
+    'routes': len(admission.last_good), 'bytes': sum(len(body) for body, _, _ in admission.last_good.values())})
+memory_debug.register('event_log', log.depth)
+if pg:
+    memory_debug.register('postgres_pool', pg.stats)
+if metadata:
+    memory_debug.register('metadata_cache', metadata.stats)
+if abuse_detector:
+    memory_debug.register('abuse_windows', lambda: {d: len(w) for d, w in abuse_detector.windows.items()})
+if vote_journal:
+    memory_debug.register('vote_journal', vote_journal.backlog)
+memory_debug.init_app(app)
 
 @app.route('/')
 def index():
-    conn = get_db_connection()
-    if not conn:
-        return render_template('voting.html', 
-                             cat_votes=0, 
-                             dog_votes=0, 
-                             total_votes=0,
-                             environment=ENVIRONMENT,
-                             error="Database connection failed")
-    
     try:
-        cursor = conn.cursor()
-        
         # Get vote summary
-        cursor.execute("SELECT * FROM vote_summary ORDER BY vote_choice")
-        results = cursor.fetchall()
+        results, stale, age = summary_cache.get()
         
-        votes = {'cat': 0, 'dog': 0}
-        azure_votes = {'cat': 0, 'dog': 0}
-        onprem_votes = {'cat': 0, 'dog': 0}
+        options = catalog.options(DEFAULT_POLL)
+        votes = dict.fromkeys(options, 0)
+        azure_votes = dict.fromkeys(options, 0)
+        onprem_votes = dict.fromkeys(options, 0)
         
         for row in results:
             choice, total, azure, onprem, percentage = row
@@ -99,21 +358,21 @@ def index():
         
         total_votes = sum(votes.values())
         
-        cursor.close()
-        conn.close()
-        
         return render_template('voting.html', 
-                             cat_votes=votes['cat'],
-                             dog_votes=votes['dog'],
+                             cat_votes=votes.get('cat', 0),
+                             dog_votes=votes.get('dog', 0),
                              total_votes=total_votes,
                              environment=ENVIRONMENT,
-                             azure_cat=azure_votes['cat'],
-                             azure_dog=azure_votes['dog'],
-                             onprem_cat=onprem_votes['cat'],
-                             onprem_dog=onprem_votes['dog'])
+                             azure_cat=azure_votes.get('cat', 0),
+                             azure_dog=azure_votes.get('dog', 0),
+                             onprem_cat=onprem_votes.get('cat', 0),
+                             onprem_dog=onprem_votes.get('dog', 0),
+                             stale=stale)
         
+    except Overloaded:
+        raise
     except Exception as e:
-        print(f"Query error: {e}")
+        log.error('index', 'summary query failed', error=e)
         return render_template('voting.html', 
                              cat_votes=0, 
                              dog_votes=0, 
@@ -121,68 +380,263 @@ def index():
                              environment=ENVIRONMENT,
                              error=str(e))
 
+def store_vote(vote_id, choice, session_id=None, abuse_flag=None, poll_id=DEFAULT_POLL):
+    """Write a vote to the configured store; raises when it can't be recorded"""
+    record = {
+        'id': vote_id,
+        'poll_id': poll_id,
+        'choice': choice,
+        'source': ENVIRONMENT,
+        'timestamp': datetime.now(timezone.utc).isoformat(),
+        'ip': request.remote_addr,
+        'user_agent': request.headers.get('User-Agent', ''),
+        'session_id': session_id,
+        'abuse_flag': abuse_flag
+    }
+    
+    def params(query):
+        if metadata:
+            (source_id, user_agent_id), = metadata.encode([record], query)
+            return (vote_id, choice, source_id, record['ip'], user_agent_id, session_id, abuse_flag, poll_id)
+        return (vote_id, choice, ENVIRONMENT, record['ip'], record['user_agent'], session_id, abuse_flag, poll_id)
+    
+    if tiered_store:
+        with admission.guard('redis'):
+            tiered_store.record_vote(record)
+        summary_for(poll_id).invalidate()
+        return
+    
+    with admission.guard('postgres'):
+        if pg:
+            # Insert and re-read the summary in one round-trip, refreshing the read cache
+            _, summary = pg.pipeline([
+                (INSERT_VOTE_SQL, params(pg.query)),
+                (SUMMARY_SQL, None) if poll_id == DEFAULT_POLL else (POLL_SUMMARY_SQL, (poll_id,))
+            ])
+            summary_for(poll_id).put(summary)
+            return
+        
+        conn = get_db_connection()
+        if not conn:
+            raise ConnectionError("Database connection failed")
+        try:
+            cursor = conn.cursor()
+            cursor.execute(INSERT_VOTE_SQL, params(metadata.connection_query(conn) if metadata else None))
+            conn.commit()
+            cursor.close()
+        finally:
+            conn.close()
+    summary_for(poll_id).invalidate()
+
 @app.route('/vote', methods=['POST'])
 def vote():
     # Handle both form data (traditional) and JSON (AJAX) requests
     if request.content_type == 'application/json':
-        choice = request.get_json().get('choice')
+        payload = request.get_json()
+        choice = payload.get('choice')
+        session_id = payload.get('session_id')
+        poll_id = payload.get('poll_id') or DEFAULT_POLL
         is_ajax = True
     else:
         choice = request.form.get('vote')
+        session_id = request.form.get('session_id')
+        poll_id = request.form.get('poll_id') or DEFAULT_POLL
         is_ajax = False
+    if not isinstance(session_id, str) or len(session_id) > 255:
+        session_id = None
     
-    if choice not in ['cat', 'dog']:
+    options = catalog.options(poll_id) if isinstance(poll_id, str) else None
+    if options is None or choice not in options:
         if is_ajax:
+            if options is None:
+                return jsonify({'success': False, 'error': f'Unknown poll: {poll_id}'}), 404
             return jsonify({'success': False, 'error': 'Invalid choice'}), 400
         else:
             return redirect(url_for('index'))
     
-    conn = get_db_connection()
-    if not conn:
-        if is_ajax:
-            return jsonify({'success': False, 'error': 'Database connection failed'}), 500
-        else:
-            return jsonify({'error': 'Database connection failed'}), 500
+    abuse_flag = None
+    if abuse_detector:
+        abuse_flag = abuse_detector.check(request.remote_addr, session_id,
+                                          request.headers.get('User-Agent', ''), choice)
+        if abuse_detector.rejects(abuse_flag):
+            return jsonify({'success': False, 'error': 'Too many votes, slow down', 'flag': abuse_flag}), 429
     
+    # The journaled copy keeps the id, so a vote whose commit was only lost
+    # in transit is not inserted twice on replay
+    vote_id = vote_ids.next()
     try:
-        cursor = conn.cursor()
-        
-        cursor.execute(
-            "INSERT INTO votes (vote_choice, vote_source, ip_address, user_agent) VALUES (%s, %s, %s, %s)",
-            (choice, ENVIRONMENT, request.remote_addr, request.headers.get('User-Agent', ''))
-        )
-        
-        conn.commit()
-        cursor.close()
-        conn.close()
-        
-        if is_ajax:
-            return jsonify({
-                'success': True, 
-                'choice': choice,
-                'source': ENVIRONMENT,
-                'message': f'Vote for {choice} recorded successfully!'
-            })
-        else:
-            return redirect(url_for('index'))
-        
+        store_vote(vote_id, choice, session_id, abuse_flag, poll_id)
     except Exception as e:
-        print(f"Vote error: {e}")
+        log.error('vote', 'storing vote failed', error=e, poll_id=poll_id)
+        if vote_journal and store_unavailable(e):
+            return journal_vote(vote_id, choice, is_ajax, session_id, abuse_flag, poll_id)
+        if isinstance(e, Overloaded):
+            raise
         if is_ajax:
             return jsonify({'success': False, 'error': str(e)}), 500
         else:
             return jsonify({'error': str(e)}), 500
+    
+    if voter_analytics:
+        voter_analytics.observe(choice, ENVIRONMENT, request.remote_addr, request.headers.get('User-Agent', ''))
+    
+    if is_ajax:
+        return jsonify({
+            'success': True, 
+            'poll_id': poll_id,
+            'choice': choice,
+            'source': ENVIRONMENT,
+            'message': f'Vote for {choice} recorded successfully!'
+        })
+    else:
+        return redirect(url_for('index'))
+
+def store_votes(records):
+    """Write a validated batch in one bulk operation; raises when it can't be recorded"""
+    poll_ids = {r['poll_id'] for r in records}
+    
+    def invalidate():
+        for poll_id in poll_ids:
+            summary_for(poll_id).invalidate()
+    
+    if tiered_store:
+        with admission.guard('redis'):
+            tiered_store.record_votes(records)
+        invalidate()
+        return
+    
+    def rows(query):
+        if metadata:
+            return [(r['id'], r['choice'], source_id, r['timestamp'], r['ip'], user_agent_id, r['session_id'],
+                     r.get('abuse_flag'), r['poll_id'])
+                    for r, (source_id, user_agent_id) in zip(records, metadata.encode(records, query))]
+        return [(r['id'], r['choice'], r['source'], r['timestamp'], r['ip'], r['user_agent'], r['session_id'],
+                 r.get('abuse_flag'), r['poll_id']) for r in records]
+    
+    with admission.guard('postgres'):
+        if pg and poll_ids == {DEFAULT_POLL}:
+            summary, = pg.copy(COPY_VOTES_SQL, rows(pg.query), [(SUMMARY_SQL, None)])
+            summary_cache.put(summary)
+            return
+        if pg:
+            pg.copy(COPY_VOTES_SQL, rows(pg.query))
+            invalidate()
+            return
+        
+        conn = get_db_connection()
+        if not conn:
+            raise ConnectionError("Database connection failed")
+        try:
+            buffer = io.StringIO()
+            csv.writer(buffer).writerows(rows(metadata.connection_query(conn) if metadata else None))
+            buffer.seek(0)
+            cursor = conn.cursor()
+            # psycopg2 streams a prepared buffer, written as CSV; psycopg 3's
+            # write_row() above produces the default text format
+            cursor.copy_expert(f"{COPY_VOTES_SQL} WITH (FORMAT csv)", buffer)
+            conn.commit()
+            cursor.close()
+        finally:
+            conn.close()
+    invalidate()
+
+@app.route('/votes/batch', methods=['POST'])
+def vote_batch():
+    """Bulk ingestion for edge aggregators: JSON array or NDJSON of votes"""
+    try:
+        items = parse_batch(request, VOTE_BATCH_MAX)
+    except BatchTooLarge as e:
+        return jsonify({'success': False, 'error': str(e), 'max_batch': VOTE_BATCH_MAX}), 413
+    except ValueError as e:
+        return jsonify({'success': False, 'error': str(e)}), 400
+    
+    records, errors = validate_batch(items, catalog.options, ('azure', 'onprem'), ENVIRONMENT)
+    ip = request.remote_addr
+    user_agent = request.headers.get('User-Agent', '')
+    for record in records:
+        record['id'] = vote_ids.next()
+        record['ip'] = ip
+        record['user_agent'] = user_agent
+    
+    # A batch arrives from one aggregator address, so only per-session bursts count
+    if abuse_detector:
+        flagged = []
+        for record in records:
+            record['abuse_flag'] = abuse_detector.check(session_id=record['session_id'], choice=record['choice'])
+            flagged.append(abuse_detector.rejects(record['abuse_flag']))
+        if any(flagged):
+            errors = sorted(errors + [{'index': r['index'], 'error': f"Rejected as burst voting ({r['abuse_flag']})"}
+                                      for r, rejected in zip(records, flagged) if rejected],
+                            key=lambda error: error['index'])
+            records = [r for r, rejected in zip(records, flagged) if not rejected]
+    
+    if not records:
+        return batch_response(records, errors, environment=ENVIRONMENT)
+    
+    try:
+        store_votes(records)
+    except Exception as e:
+        log.error('vote_batch', 'storing batch failed', error=e, votes=len(records))
+        if vote_journal and store_unavailable(e):
+            for record in records[:-1]:
+                vote_journal.append({k: v for k, v in record.items() if k != 'index'}, wait=False)
+            vote_journal.append({k: v for k, v in records[-1].items() if k != 'index'})
+            if voter_analytics:
+                voter_analytics.observe_records(records)
+            return batch_response(records, errors, environment=ENVIRONMENT, queued=True)
+        if isinstance(e, Overloaded):
+            raise
+        return batch_response(records, errors, write_error=e, environment=ENVIRONMENT)
+    
+    if voter_analytics:
+        voter_analytics.observe_records(records)
+    return batch_response(records, errors, environment=ENVIRONMENT)
+
+@app.route('/api/analytics/abuse')
+def abuse_stats():
+    """Burst detector state: flagged votes per choice, tracked keys, current offenders"""
+    if not abuse_detector:
+        return jsonify({'error': 'Abuse detection disabled (set ABUSE_DETECTION=tag or reject)'}), 404
+    return jsonify(abuse_detector.stats())
+
+@app.route('/api/analytics/voters')
+def voter_analytics_summary():
+    """Distinct voters and top IPs/user agents from the streaming sketches"""
+    if not voter_analytics:
+        return jsonify({'error': 'Voter analytics disabled (set VOTER_ANALYTICS=local or redis)'}), 404
+    if request.args.get('format') == 'sketch':
+        # Raw sketches for merging into another pod's or environment's analytics
+        return jsonify(voter_analytics.to_dict())
+    try:
+        return jsonify({**voter_analytics.summary(), 'environment': ENVIRONMENT})
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/health')
 def health():
-    conn = get_db_connection()
+    try:
+        # Raise inside the guard so a failed connect counts against the limiter
+        with admission.guard('postgres'):
+            conn = get_db_connection()
+            if not conn:
+                raise ConnectionError("Database connection failed")
+    except ConnectionError:
+        conn = None
     if conn:
         conn.close()
-        return jsonify({
+        status = {
             'status': 'healthy', 
             'environment': ENVIRONMENT,
             'database': 'connected'
-        })
+        }
+        if replica_router.replicas:
+            status['replicas'] = replica_router.status()
+        if tiered_store:
+            status['storage'] = tiered_store.status()
+        if metadata:
+            status['metadata_cache'] = metadata.stats()
+        status['log'] = log.stats()
+        return jsonify(status)
     else:
         return jsonify({
             'status': 'unhealthy', 
@@ -190,84 +644,152 @@ def health():
             'database': 'disconnected'
         }), 500
 
-@app.route('/results')
-def results():
-    # Web interface endpoint - returns data in format expected by JavaScript
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
+@app.route('/api/polls', methods=['GET'])
+def list_polls():
+    return jsonify({'polls': [{'poll_id': poll_id, 'options': list(options)}
+                              for poll_id, options in sorted(catalog.polls().items())]})
+
+@app.route('/api/polls', methods=['POST'])
+def create_poll():
+    """Add a poll; needs the POLL_ADMIN_TOKEN (X-Admin-Token or Authorization: Bearer)"""
+    if not POLL_ADMIN_TOKEN:
+        return jsonify({'error': 'Poll creation disabled (set POLL_ADMIN_TOKEN)'}), 404
+    if not authorized(request, POLL_ADMIN_TOKEN):
+        return jsonify({'error': 'Unauthorized'}), 401
+    payload = request.get_json(silent=True)
+    try:
+        poll_id, options = parse_poll(payload)
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    from psycopg2.extras import execute_values
     
+    with admission.guard('postgres'):
+        conn = get_db_connection()
+        if not conn:
+            raise ConnectionError("Database connection failed")
+        try:
+            cursor = conn.cursor()
+            cursor.execute("INSERT INTO polls (poll_id, title) VALUES (%s, %s) ON CONFLICT (poll_id) DO NOTHING",
+                           (poll_id, payload.get('title')))
+            if not cursor.rowcount:
+                conn.rollback()
+                return jsonify({'error': f'Poll {poll_id} already exists'}), 409
+            execute_values(cursor, "INSERT INTO poll_options (poll_id, option, position) VALUES %s",
+                           [(poll_id, option, position) for position, option in enumerate(options)])
+            conn.commit()
+            cursor.close()
+        finally:
+            conn.close()
+    catalog.invalidate()
+    return jsonify({'poll_id': poll_id, 'options': options}), 201
+
+@app.route('/api/polls/<poll_id>/results')
+def poll_results(poll_id):
+    options = catalog.options(poll_id)
+    if options is None:
+        return jsonify({'error': f'Unknown poll: {poll_id}'}), 404
     try:
-        cursor = conn.cursor()
+        cache = summary_for(poll_id)
+        results, stale, age, version = cache.get_versioned()
         
-        cursor.execute("SELECT * FROM vote_summary ORDER BY vote_choice")
-        db_results = cursor.fetchall()
+        def build():
+            data = {option: {'total': 0, 'azure': 0, 'onprem': 0, 'percentage': 0} for option in options}
+            for choice, total, azure, onprem, percentage in results:
+                data[choice] = {
+                    'total': total,
+                    'azure': azure,
+                    'onprem': onprem,
+                    'percentage': float(percentage) if percentage else 0
+                }
+            return {
+                'poll_id': poll_id,
+                'votes': data,
+                'environment': ENVIRONMENT,
+                'stale': stale,
+                'age': round(age, 3),
+                'timestamp': datetime.now().isoformat()
+            }
         
-        # Convert to format expected by JavaScript
-        summary = []
-        for row in db_results:
-            choice, total, azure, onprem, percentage = row
-            summary.append({
-                'vote_choice': choice,
-                'total_votes': total,
-                'azure_votes': azure,
-                'onprem_votes': onprem,
-                'percentage': float(percentage) if percentage else 0
-            })
+        return result_snapshots.response(snapshot_key(('poll_results', poll_id, getattr(cache, 'generation', 0)), version, stale, age), build)
         
-        cursor.close()
-        conn.close()
+    except Overloaded:
+        raise
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
+
+def snapshot_key(endpoint, version, stale, age):
+    """Serialized responses are reused per summary version; stale ones per whole second of age"""
+    return (endpoint, version, stale, int(age) if stale else 0)
+
+@app.route('/results')
+def results():
+    # Web interface endpoint - returns data in format expected by JavaScript
+    try:
+        db_results, stale, age, version = summary_cache.get_versioned()
         
-        return jsonify({
-            'summary': summary,
-            'environment': ENVIRONMENT,
-            'timestamp': datetime.now().isoformat()
-        })
+        def build():
+            # Convert to format expected by JavaScript
+            summary = []
+            for row in db_results:
+                choice, total, azure, onprem, percentage = row
+                summary.append({
+                    'vote_choice': choice,
+                    'total_votes': total,
+                    'azure_votes': azure,
+                    'onprem_votes': onprem,
+                    'percentage': float(percentage) if percentage else 0
+                })
+            return {
+                'summary': summary,
+                'environment': ENVIRONMENT,
+                'stale': stale,
+                'age': round(age, 3),
+                'timestamp': datetime.now().isoformat()
+            }
+        
+        return result_snapshots.response(snapshot_key('results', version, stale, age), build)
         
+    except Overloaded:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 @app.route('/api/results')
 def api_results():
-    conn = get_db_connection()
-    if not conn:
-        return jsonify({'error': 'Database connection failed'}), 500
-    
     try:
-        cursor = conn.cursor()
-        
-        cursor.execute("SELECT * FROM vote_summary ORDER BY vote_choice")
-        results = cursor.fetchall()
+        results, stale, age, version = summary_cache.get_versioned()
         
-        data = {}
-        for row in results:
-            choice, total, azure, onprem, percentage = row
-            data[choice] = {
-                'total': total,
-                'azure': azure,
-                'onprem': onprem,
-                'percentage': float(percentage) if percentage else 0
+        def build():
+            data = {}
+            for row in results:
+                choice, total, azure, onprem, percentage = row
+                data[choice] = {
+                    'total': total,
+                    'azure': azure,
+                    'onprem': onprem,
+                    'percentage': float(percentage) if percentage else 0
+                }
+            return {
+                'votes': data,
+                'environment': ENVIRONMENT,
+                'stale': stale,
+                'age': round(age, 3),
+                'timestamp': datetime.now().isoformat()
             }
         
-        cursor.close()
-        conn.close()
-        
-        return jsonify({
-            'votes': data,
-            'environment': ENVIRONMENT,
-            'timestamp': datetime.now().isoformat()
-        })
+        return result_snapshots.response(snapshot_key('api_results', version, stale, age), build)
         
+    except Overloaded:
+        raise
     except Exception as e:
         return jsonify({'error': str(e)}), 500
 
 if __name__ == '__main__':
     print(f"🚀 Starting Voting App (Environment: {ENVIRONMENT})")
     
-    # Initialize database
-    if init_database():
-        print("✅ Database initialized successfully")
-    else:
-        print("⚠️ Database initialization failed - app may not work properly")
+    # Migrations, pool connections and the first summary load run in the
+    # background; /ready reports 503 until they have finished
+    warmup.start()
     
     app.run(host='0.0.0.0', port=5000, debug=True)
@@ -2,25 +2,177 @@ from flask import Flask, request, jsonify, render_template_string
 import redis
 import os
 import json
-from datetime import datetime
+import threading
+import time
+from datetime import datetime, timezone
+
+from shared_counters import SharedCounters
+from vote_journal import VoteJournal, RedisJournalSink
+from warmup import Warmup
+from saturation import Saturation
+from serialized_snapshot import SerializedSnapshots
+from voter_sketches import VoterAnalytics
+from abuse_detector import AbuseDetector
+from batch_votes import BatchTooLarge, parse_batch, validate_batch, count_by_poll, batch_response
+from auth import authorized
+from polls import DEFAULT_POLL, PollCatalog, counter_key, parse_poll
+from memory_debug import MemoryDebug
 
 app = Flask(__name__)
 
-# Redis connection (for vote storage)
-try:
-    redis_client = redis.Redis(
-        host=os.environ.get('REDIS_HOST', 'localhost'),
-        port=int(os.environ.get('REDIS_PORT', 6379)),
-        decode_responses=True
+# Saturation signals at /metrics/saturation for autoscaling on busy workers
+# rather than CPU; SATURATION_THREADS is the request threads per worker process
+saturation = Saturation(threads=int(os.environ.get('SATURATION_THREADS', 1)),
+                        window=int(os.environ.get('SATURATION_WINDOW_SECONDS', 60)),
+                        queue_target=int(os.environ.get('SATURATION_QUEUE_TARGET', 1000)))
+saturation.init_app(app)
+
+# Redis connection (for vote storage); redis.Redis connects lazily, the
+# availability check happens during warm-up instead of at import
+redis_client = redis.Redis(
+    host=os.environ.get('REDIS_HOST', 'localhost'),
+    port=int(os.environ.get('REDIS_PORT', 6379)),
+    decode_responses=True
+)
+
+# While Redis is down votes go to the fallback store; it is probed again at
+# most every REDIS_RETRY_INTERVAL seconds, so reads and writes move back to
+# Redis (where the journal replays fallback votes) once it recovers
+REDIS_RETRY_INTERVAL = float(os.environ.get('REDIS_RETRY_INTERVAL', 5))
+redis_state = {'up': False, 'retry_at': 0.0}
+
+def redis_down():
+    redis_state['up'] = False
+    redis_state['retry_at'] = time.monotonic() + REDIS_RETRY_INTERVAL
+
+def redis_up():
+    if redis_state['up']:
+        return True
+    if time.monotonic() < redis_state['retry_at']:
+        return False
+    # Claim the probe so concurrent requests don't all ping a dead server
+    redis_state['retry_at'] = time.monotonic() + REDIS_RETRY_INTERVAL
+    try:
+        connect_redis()
+    except ConnectionError:
+        return False
+    return True
+
+def connect_redis():
+    try:
+        redis_client.ping()
+        redis_state['up'] = True
+        # Initialize Redis votes if not exists
+        redis_client.hsetnx(POLL_CATALOG_KEY, DEFAULT_POLL, json.dumps(catalog.options(DEFAULT_POLL)))
+        for option in catalog.options(DEFAULT_POLL):
+            redis_client.set(counter_key(DEFAULT_POLL, option), 0, nx=True)
+        print("Connected to Redis")
+    except Exception as e:
+        redis_down()
+        print("Redis not available, using in-memory storage")
+        # Reported as a failed warm-up step so /ready shows the pod is on the fallback store
+        raise ConnectionError(f"Redis not available, using in-memory storage: {e}")
+    catalog.invalidate()
+
+# Polls and their options live in a Redis hash (poll_id -> JSON list of options),
+# cached in memory; POST /api/polls needs POLL_ADMIN_TOKEN and is off without it
+POLL_CATALOG_KEY = 'polls:catalog'
+POLL_ADMIN_TOKEN = os.environ.get('POLL_ADMIN_TOKEN')
+
+def load_polls():
+    if not redis_up():
+        raise ConnectionError("Redis not available")
+    with saturation.track('redis'):
+        return {poll_id: json.loads(options) for poll_id, options in redis_client.hgetall(POLL_CATALOG_KEY).items()}
+
+catalog = PollCatalog(load_polls, ttl=float(os.environ.get('POLL_CATALOG_TTL', 30)))
+
+# Largest batch accepted by POST /votes/batch
+VOTE_BATCH_MAX = int(os.environ.get('VOTE_BATCH_MAX', 1000))
+
+# Streaming distinct-voter / top IP and user agent sketches (VOTER_ANALYTICS=local,
+# or redis to share PFADD-based distinct counts across pods)
+voter_analytics = None
+if os.environ.get('VOTER_ANALYTICS', 'off') != 'off':
+    voter_analytics = VoterAnalytics(
+        bucket_seconds=int(os.environ.get('VOTER_ANALYTICS_BUCKET_SECONDS', 3600)),
+        buckets=int(os.environ.get('VOTER_ANALYTICS_BUCKETS', 24)),
+        k=int(os.environ.get('VOTER_ANALYTICS_TOP_K', 20)),
+        redis_client=redis_client if os.environ.get('VOTER_ANALYTICS') == 'redis' else None
     )
-    redis_client.ping()
-    print("Connected to Redis")
-except:
-    redis_client = None
-    print("Redis not available, using in-memory storage")
 
-# In-memory fallback
-votes = {"cat": 0, "dog": 0}
+# Burst detection on the vote path: ABUSE_DETECTION=tag also counts flagged
+# votes under votes:flagged:<animal> so analytics can subtract them, reject
+# answers 429 instead
+abuse_detector = None
+if os.environ.get('ABUSE_DETECTION', 'off') != 'off':
+    abuse_detector = AbuseDetector(
+        window_seconds=float(os.environ.get('ABUSE_WINDOW_SECONDS', 60)),
+        limits={'ip': int(os.environ.get('ABUSE_IP_LIMIT', 60)),
+                'session': int(os.environ.get('ABUSE_SESSION_LIMIT', 20)),
+                'user_agent': int(os.environ.get('ABUSE_USER_AGENT_LIMIT', 600))},
+        max_keys=int(os.environ.get('ABUSE_MAX_KEYS', 50000)),
+        action=os.environ['ABUSE_DETECTION']
+    )
+
+# Totals are serialized once per distinct count, not once per poll
+vote_snapshots = SerializedSnapshots()
+
+def votes_response(current):
+    return vote_snapshots.response(tuple(sorted(current.items())), lambda: current)
+
+# In-memory fallback, keyed like the Redis counters
+votes = {}
+votes_lock = threading.Lock()
+
+# Fallback counters of the default poll shared by all worker processes, e.g.
+# SHARED_COUNTERS_PATH=/dev/shm/voting-app-counters; unset keeps the
+# per-process dict, which other polls always use
+shared_counters = None
+if os.environ.get('SHARED_COUNTERS_PATH'):
+    try:
+        shared_counters = SharedCounters(
+            os.environ['SHARED_COUNTERS_PATH'],
+            snapshot_path=os.environ.get('COUNTER_SNAPSHOT_PATH'),
+            snapshot_interval=float(os.environ.get('COUNTER_SNAPSHOT_INTERVAL', 30))
+        )
+        shared_counters.start_snapshots()
+    except Exception as e:
+        print(f"Shared counters unavailable, using per-process storage: {e}")
+
+# Optional local journal so fallback votes survive restarts and reach Redis later
+vote_journal = None
+if os.environ.get('VOTE_JOURNAL_DIR'):
+    vote_journal = VoteJournal(os.environ['VOTE_JOURNAL_DIR'],
+                               use_mmap=os.environ.get('VOTE_JOURNAL_MMAP', 'false').lower() == 'true')
+    # redis.Redis connects lazily, so replay starts working once Redis comes up
+    vote_journal.start_replayer(RedisJournalSink(redis_client),
+                                interval=float(os.environ.get('VOTE_JOURNAL_REPLAY_INTERVAL', 5)))
+    saturation.queue('vote_journal', vote_journal.backlog)
+
+def record_fallback_vote(poll_id, animal, amount=1, records=None):
+    if shared_counters and poll_id == DEFAULT_POLL:
+        shared_counters.increment(animal, amount)
+    else:
+        with votes_lock:
+            key = counter_key(poll_id, animal)
+            votes[key] = votes.get(key, 0) + amount
+    if vote_journal:
+        records = records or [{
+            'choice': animal,
+            'source': os.environ.get('ENVIRONMENT', 'development'),
+            'timestamp': datetime.now(timezone.utc).isoformat()
+        }]
+        for i, record in enumerate(records):
+            vote_journal.append({
+                'poll_id': poll_id,
+                'choice': animal,
+                'source': record['source'],
+                'timestamp': record['timestamp'],
+                'session_id': record.get('session_id'),
+                'ip': request.remote_addr,
+                'user_agent': request.headers.get('User-Agent', '')
+            }, wait=i == len(records) - 1)
 
 # HTML Template
 HTML_TEMPLATE = """
@@ -105,8 +257,8 @@ HTML_TEMPLATE = """
 def index():
     current_votes = get_votes()
     return render_template_string(HTML_TEMPLATE, 
-                                cat_votes=current_votes['cat'],
-                                dog_votes=current_votes['dog'],
+                                cat_votes=current_votes.get('cat', 0),
+                                dog_votes=current_votes.get('dog', 0),
                                 environment=os.environ.get('ENVIRONMENT', 'development'),
                                 cluster_type=os.environ.get('CLUSTER_TYPE', 'local'))
 
@@ -114,24 +266,161 @@ def index():
 def vote():
     vote_data = request.get_json()
     animal = vote_data.get('vote', '').lower()
+    poll_id = vote_data.get('poll_id') or DEFAULT_POLL
+    
+    options = catalog.options(poll_id) if isinstance(poll_id, str) else None
+    if options is None:
+        return jsonify({'error': f'Unknown poll: {poll_id}'}), 404
+    if animal not in options:
+        return jsonify({'error': f"Invalid vote. Must be one of: {', '.join(options)}"}), 400
     
-    if animal not in ['cat', 'dog']:
-        return jsonify({'error': 'Invalid vote. Must be cat or dog'}), 400
+    abuse_flag = None
+    if abuse_detector:
+        session_id = vote_data.get('session_id')
+        abuse_flag = abuse_detector.check(request.remote_addr, session_id if isinstance(session_id, str) else None,
+                                          request.headers.get('User-Agent', ''), animal)
+        if abuse_detector.rejects(abuse_flag):
+            return jsonify({'error': 'Too many votes, slow down', 'flag': abuse_flag}), 429
     
     # Increment vote count
-    if redis_client:
+    if redis_up():
         try:
-            redis_client.incr(f'votes:{animal}')
+            with saturation.track('redis'):
+                if abuse_flag:
+                    pipe = redis_client.pipeline(transaction=True)
+                    pipe.incr(counter_key(poll_id, animal))
+                    pipe.incr(counter_key(poll_id, animal, 'flagged'))
+                    pipe.execute()
+                else:
+                    redis_client.incr(counter_key(poll_id, animal))
         except:
-            votes[animal] += 1
+            redis_down()
+            record_fallback_vote(poll_id, animal)
     else:
-        votes[animal] += 1
+        record_fallback_vote(poll_id, animal)
+    
+    if voter_analytics:
+        voter_analytics.observe(animal, os.environ.get('ENVIRONMENT', 'development'),
+                                request.remote_addr, request.headers.get('User-Agent', ''))
+    
+    return votes_response(get_votes(poll_id))
+
+@app.route('/votes/batch', methods=['POST'])
+def vote_batch():
+    """Bulk ingestion for edge aggregators: JSON array or NDJSON of votes"""
+    try:
+        items = parse_batch(request, VOTE_BATCH_MAX)
+    except BatchTooLarge as e:
+        return jsonify({'error': str(e), 'max_batch': VOTE_BATCH_MAX}), 413
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    
+    records, errors = validate_batch(items, catalog.options, None,
+                                     os.environ.get('ENVIRONMENT', 'development'))
+    # A batch arrives from one aggregator address, so only per-session bursts count
+    flagged_counts = {}
+    if abuse_detector:
+        accepted = []
+        for record in records:
+            flag = abuse_detector.check(session_id=record['session_id'], choice=record['choice'])
+            if abuse_detector.rejects(flag):
+                errors.append({'index': record['index'], 'error': f'Rejected as burst voting ({flag})'})
+                continue
+            if flag:
+                key = (record['poll_id'], record['choice'])
+                flagged_counts[key] = flagged_counts.get(key, 0) + 1
+            accepted.append(record)
+        records = accepted
+        errors.sort(key=lambda error: error['index'])
+    
+    counts = count_by_poll(records)
+    if not counts:
+        return batch_response(records, errors)
     
-    return jsonify(get_votes())
+    # One round-trip: an INCRBY per poll and choice in a single pipeline
+    try:
+        if not redis_up():
+            raise ConnectionError("Redis not available")
+        pipe = redis_client.pipeline(transaction=True)
+        for (poll_id, animal), amount in counts.items():
+            pipe.incrby(counter_key(poll_id, animal), amount)
+        for (poll_id, animal), amount in flagged_counts.items():
+            pipe.incrby(counter_key(poll_id, animal, 'flagged'), amount)
+        with saturation.track('redis'):
+            pipe.execute()
+    except:
+        redis_down()
+        for (poll_id, animal), amount in counts.items():
+            record_fallback_vote(poll_id, animal, amount,
+                                 [r for r in records if r['poll_id'] == poll_id and r['choice'] == animal])
+    
+    if voter_analytics:
+        ip = request.remote_addr
+        user_agent = request.headers.get('User-Agent', '')
+        voter_analytics.observe_records([{**r, 'ip': ip, 'user_agent': user_agent} for r in records])
+    
+    return batch_response(records, errors, votes=get_votes())
+
+@app.route('/api/analytics/abuse')
+def abuse_stats():
+    """Burst detector state: flagged votes per choice, tracked keys, current offenders"""
+    if not abuse_detector:
+        return jsonify({'error': 'Abuse detection disabled (set ABUSE_DETECTION=tag or reject)'}), 404
+    stats = abuse_detector.stats()
+    if redis_up():
+        try:
+            options = catalog.options(DEFAULT_POLL)
+            flagged = redis_client.mget([counter_key(DEFAULT_POLL, animal, 'flagged') for animal in options])
+            stats['flagged_total'] = {animal: int(count or 0) for animal, count in zip(options, flagged)}
+        except:
+            pass
+    return jsonify(stats)
+
+@app.route('/api/analytics/voters')
+def voter_analytics_summary():
+    """Distinct voters and top IPs/user agents from the streaming sketches"""
+    if not voter_analytics:
+        return jsonify({'error': 'Voter analytics disabled (set VOTER_ANALYTICS=local or redis)'}), 404
+    if request.args.get('format') == 'sketch':
+        return jsonify(voter_analytics.to_dict())
+    try:
+        return jsonify(voter_analytics.summary())
+    except Exception as e:
+        return jsonify({'error': str(e)}), 500
 
 @app.route('/results')
 def results():
-    return jsonify(get_votes())
+    return votes_response(get_votes())
+
+@app.route('/api/polls', methods=['GET'])
+def list_polls():
+    return jsonify({'polls': [{'poll_id': poll_id, 'options': list(options)}
+                              for poll_id, options in sorted(catalog.polls().items())]})
+
+@app.route('/api/polls', methods=['POST'])
+def create_poll():
+    if not POLL_ADMIN_TOKEN:
+        return jsonify({'error': 'Poll creation disabled (set POLL_ADMIN_TOKEN)'}), 404
+    if not authorized(request, POLL_ADMIN_TOKEN):
+        return jsonify({'error': 'Unauthorized'}), 401
+    try:
+        poll_id, options = parse_poll(request.get_json(silent=True))
+    except ValueError as e:
+        return jsonify({'error': str(e)}), 400
+    if not redis_up():
+        return jsonify({'error': 'Redis not available'}), 503
+    
+    with saturation.track('redis'):
+        if not redis_client.hsetnx(POLL_CATALOG_KEY, poll_id, json.dumps(options)):
+            return jsonify({'error': f'Poll {poll_id} already exists'}), 409
+    catalog.invalidate()
+    return jsonify({'poll_id': poll_id, 'options': options}), 201
+
+@app.route('/api/polls/<poll_id>/results')
+def poll_results(poll_id):
+    if catalog.options(poll_id) is None:
+        return jsonify({'error': f'Unknown poll: {poll_id}'}), 404
+    return votes_response(get_votes(poll_id))
 
 @app.route('/health')
 def health():
@@ -140,34 +429,39 @@ def health():
         'timestamp': datetime.utcnow().isoformat(),
         'environment': os.environ.get('ENVIRONMENT', 'development'),
         'cluster_type': os.environ.get('CLUSTER_TYPE', 'local'),
-        'redis_connected': redis_client is not None
+        'redis_connected': redis_state['up']
     })
 
-@app.route('/ready')
-def ready():
-    # Simple readiness check
-    return jsonify({'status': 'ready'})
-
-def get_votes():
-    if redis_client:
+def get_votes(poll_id=DEFAULT_POLL):
+    options = catalog.options(poll_id) or ()
+    if redis_up():
         try:
-            cat_votes = int(redis_client.get('votes:cat') or 0)
-            dog_votes = int(redis_client.get('votes:dog') or 0)
-            return {'cat': cat_votes, 'dog': dog_votes}
+            with saturation.track('redis'):
+                counts = redis_client.mget([counter_key(poll_id, option) for option in options])
+            return {option: int(count or 0) for option, count in zip(options, counts)}
         except:
-            pass
+            redis_down()
     
-    return votes
+    if shared_counters and poll_id == DEFAULT_POLL:
+        return shared_counters.totals()
+    return {option: votes.get(counter_key(poll_id, option), 0) for option in options}
+
+# /ready flips once Redis has been checked (its pooled connection stays open)
+warmup = Warmup('voting app')
+warmup.step('redis', connect_redis)
+warmup.init_app(app)
+
+# Opt-in tracemalloc surface at /debug/memory (DEBUG_MEMORY_TOKEN)
+memory_debug = MemoryDebug.from_env()
+memory_debug.register('vote_snapshots', vote_snapshots.stats)
+memory_debug.register('poll_catalog', lambda: len(catalog.catalog))
+memory_debug.register('fallback_votes', lambda: len(votes))
+if abuse_detector:
+    memory_debug.register('abuse_windows', lambda: {d: len(w) for d, w in abuse_detector.windows.items()})
+if vote_journal:
+    memory_debug.register('vote_journal', vote_journal.backlog)
+memory_debug.init_app(app)
 
 if __name__ == '__main__':
-    # Initialize Redis votes if not exists
-    if redis_client:
-        try:
-            if not redis_client.exists('votes:cat'):
-                redis_client.set('votes:cat', 0)
-            if not redis_client.exists('votes:dog'):
-                redis_client.set('votes:dog', 0)
-        except:
-            pass
-    
+    warmup.start()
     app.run(host='0.0.0.0', port=5000, debug=False)
\ No newline at end of file
@@ -0,0 +1,16 @@
+"""
+Shared-token checks for the admin and debug endpoints.
+
+A route guarded by a token accepts it as ``X-Admin-Token`` or as
+``Authorization: Bearer <token>``; an unset token refuses every request.
+"""
+
+import hmac
+
+def authorized(request, token):
+    """True when the request carries the token (Authorization: Bearer or X-Admin-Token)"""
+    if not token:
+        return False
+    supplied = request.headers.get('X-Admin-Token') or \
+        request.headers.get('Authorization', '').removeprefix('Bearer ').strip()
+    return hmac.compare_digest(supplied.encode(), token.encode())
@@ -0,0 +1,161 @@
+"""
+Bulk vote ingestion for edge aggregators (kiosks, proxies).
+
+``POST /votes/batch`` accepts either a JSON array (or ``{"votes": [...]}``)
+or an NDJSON stream. Each item is a bare choice string or an object with
+``vote``/``choice`` plus optional ``poll_id``, ``source``, ``timestamp``
+and ``session_id``. Items are validated column-wise against lookup sets in one
+pass, the valid ones are written by the app in a single bulk operation, and
+the response lists the index and reason for every rejected item.
+"""
+
+import json
+import re
+from datetime import datetime, timezone
+
+from flask import jsonify
+
+from polls import DEFAULT_POLL
+
+MAX_SESSION_ID_LENGTH = 255  # votes.session_id is VARCHAR(255)
+RFC3339_TIMESTAMP = re.compile(
+    r'\d{4}-\d{2}-\d{2}[Tt ]\d{2}:\d{2}:\d{2}(\.\d{1,6})?([Zz]|[+-]\d{2}:\d{2})?')
+
+class BatchTooLarge(Exception):
+    pass
+
+def parse_batch(request, max_items):
+    """Return the raw items of a batch request, enforcing max_items"""
+    if request.mimetype in ('application/x-ndjson', 'application/jsonl'):
+        items = []
+        for line in request.stream:
+            line = line.strip()
+            if not line:
+                continue
+            if len(items) >= max_items:
+                raise BatchTooLarge(f"Batch exceeds {max_items} votes")
+            try:
+                items.append(json.loads(line))
+            except ValueError:
+                items.append(None)
+        return items
+
+    payload = request.get_json(silent=True)
+    if isinstance(payload, dict):
+        payload = payload.get('votes')
+    if not isinstance(payload, list):
+        raise ValueError("Body must be a JSON array of votes, {\"votes\": [...]} or NDJSON")
+    if len(payload) > max_items:
+        raise BatchTooLarge(f"Batch exceeds {max_items} votes")
+    return payload
+
+def validate_batch(items, options_for, sources, default_source):
+    """Split items into (records, errors) in one column-wise pass.
+
+    options_for(poll_id) returns a poll's options or None for an unknown
+    poll (e.g. PollCatalog.options); sources=None accepts any source.
+    """
+    now = datetime.now(timezone.utc).isoformat()
+    objects = [item if isinstance(item, dict) else {'vote': item} for item in items]
+
+    # A non-string poll_id (list, object, number) can't be looked up or hashed
+    poll_column = [o.get('poll_id') or DEFAULT_POLL for o in objects]
+    poll_column = [poll_id if isinstance(poll_id, str) else None for poll_id in poll_column]
+    # One catalog lookup per distinct poll in the batch
+    poll_options = {None: None}
+    for poll_id in set(poll_column) - {None}:
+        poll_options[poll_id] = options_for(poll_id)
+    choice_column = [str(o.get('vote', o.get('choice', ''))).lower() for o in objects]
+    source_column = [o.get('source') or default_source for o in objects]
+    timestamp_column = [normalise_timestamp(o['timestamp']) if o.get('timestamp') else now for o in objects]
+    session_column = [o.get('session_id') for o in objects]
+
+    records = []
+    errors = []
+    for index, (item, poll_id, choice, source, timestamp, session_id) in enumerate(
+            zip(items, poll_column, choice_column, source_column, timestamp_column, session_column)):
+        if item is None:
+            errors.append({'index': index, 'error': 'Malformed item'})
+        elif poll_id is None:
+            errors.append({'index': index, 'error': 'Invalid poll_id: must be a string'})
+        elif poll_options[poll_id] is None:
+            errors.append({'index': index, 'error': f'Unknown poll: {poll_id}'})
+        elif choice not in poll_options[poll_id]:
+            errors.append({'index': index, 'error': f'Invalid choice: {choice}'})
+        elif sources is not None and source not in sources:
+            errors.append({'index': index, 'error': f'Invalid source: {source}'})
+        elif timestamp is None:
+            errors.append({'index': index, 'error': f"Invalid timestamp: {item.get('timestamp')} (expected RFC 3339)"})
+        elif session_id is not None and not (isinstance(session_id, str)
+                                             and len(session_id) <= MAX_SESSION_ID_LENGTH):
+            errors.append({'index': index,
+                           'error': f'Invalid session_id: must be a string of at most {MAX_SESSION_ID_LENGTH} characters'})
+        else:
+            records.append({
+                'index': index,
+                'poll_id': poll_id,
+                'choice': choice,
+                'source': source,
+                'timestamp': timestamp,
+                'session_id': session_id
+            })
+    return records, errors
+
+def normalise_timestamp(value):
+    """RFC 3339 timestamp as UTC isoformat, or None for anything else.
+
+    fromisoformat alone also takes forms Postgres can't parse (week dates,
+    ordinal dates, compact forms), which would fail the COPY and then every
+    journal replay of the record; only the one strict layout gets through.
+    Timestamps without an offset are taken as UTC.
+    """
+    if not isinstance(value, str) or not RFC3339_TIMESTAMP.fullmatch(value):
+        return None
+    try:
+        parsed = datetime.fromisoformat(value.replace('Z', '+00:00').replace('z', '+00:00'))
+    except ValueError:
+        return None
+    if parsed.tzinfo is None:
+        parsed = parsed.replace(tzinfo=timezone.utc)
+    return parsed.astimezone(timezone.utc).isoformat()
+
+def count_by_choice(records):
+    counts = {}
+    for record in records:
+        counts[record['choice']] = counts.get(record['choice'], 0) + 1
+    return counts
+
+def count_by_poll(records):
+    """{(poll_id, choice): count}"""
+    counts = {}
+    for record in records:
+        key = (record.get('poll_id', DEFAULT_POLL), record['choice'])
+        counts[key] = counts.get(key, 0) + 1
+    return counts
+
+def batch_response(records, errors, write_error=None, **extra):
+    """Per-batch acknowledgement: 200 all accepted, 207 partial, 400/500 none"""
+    if write_error is not None:
+        errors = sorted(errors + [{'index': r['index'], 'error': str(write_error)} for r in records],
+                        key=lambda error: error['index'])
+        records = []
+    body = {
+        'accepted': len(records),
+        'rejected': len(errors),
+        'counts': count_by_choice([r for r in records if r.get('poll_id', DEFAULT_POLL) == DEFAULT_POLL]),
+        'errors': errors,
+        **extra
+    }
+    other_polls = {}
+    for (poll_id, choice), count in count_by_poll(records).items():
+        if poll_id != DEFAULT_POLL:
+            other_polls.setdefault(poll_id, {})[choice] = count
+    if other_polls:
+        body['poll_counts'] = other_polls
+    if not errors:
+        status = 200
+    elif records:
+        status = 207
+    else:
+        status = 500 if write_error is not None else 400
+    return jsonify(body), status
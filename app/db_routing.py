@@ -0,0 +1,136 @@
+"""
+Read/write splitting for the database-backed voting app.
+
+Writes always go to the primary. Reads are spread over optional replicas
+(round-robin or lowest observed latency) and fall back to the primary when
+every replica is down or lagging more than the configured threshold.
+"""
+
+import itertools
+import threading
+import time
+
+# Lag is 0 when the replica has replayed everything it received, otherwise
+# the age of the last replayed transaction.
+REPLICATION_LAG_QUERY = """
+    SELECT CASE
+        WHEN pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn() THEN 0
+        ELSE COALESCE(EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp()), 0)
+    END
+"""
+
+def connect(config):
+    # psycopg2 is imported on first connect (during warm-up), not at app import
+    import psycopg2
+    return psycopg2.connect(**config)
+
+def parse_replica_hosts(value, primary_config):
+    """Turn "host1:5432,host2" into connection configs sharing the primary's credentials"""
+    replicas = []
+    for item in [h.strip() for h in value.split(',') if h.strip()]:
+        host, _, port = item.partition(':')
+        config = dict(primary_config)
+        config['host'] = host
+        config['port'] = int(port) if port else primary_config['port']
+        replicas.append(config)
+    return replicas
+
+class Replica:
+    def __init__(self, config):
+        self.config = config
+        self.name = f"{config['host']}:{config['port']}"
+        self.latency = None
+        self.lag = 0.0
+        self.lag_checked = 0.0
+        self.down_until = 0.0
+
+    def record_latency(self, seconds, alpha=0.2):
+        if self.latency is None:
+            self.latency = seconds
+        else:
+            self.latency = alpha * seconds + (1 - alpha) * self.latency
+
+class ReplicaRouter:
+    def __init__(self, primary_config, replica_configs, strategy='round_robin',
+                 max_lag=5.0, check_interval=5.0, retry_after=10.0, read_overrides=None):
+        self.primary_config = primary_config
+        # Extra connect() arguments for read connections, e.g. a statement_timeout
+        self.read_overrides = read_overrides or {}
+        self.replicas = [Replica(config) for config in replica_configs]
+        self.strategy = strategy
+        self.max_lag = max_lag
+        self.check_interval = check_interval
+        self.retry_after = retry_after
+        self.counter = itertools.count()
+        self.lock = threading.Lock()
+
+    def connect_primary(self):
+        return connect(self.primary_config)
+
+    def candidates(self):
+        """Replicas that are up and within the lag threshold, in preferred order"""
+        now = time.monotonic()
+        with self.lock:
+            # A lagging replica becomes a candidate again once its lag is due a recheck
+            usable = [r for r in self.replicas
+                      if r.down_until <= now
+                      and (r.lag <= self.max_lag or now - r.lag_checked >= self.check_interval)]
+            if not usable:
+                return []
+            if self.strategy == 'least_latency':
+                # Unmeasured replicas sort first so each gets probed once
+                return sorted(usable, key=lambda r: -1 if r.latency is None else r.latency)
+            start = next(self.counter) % len(usable)
+            return usable[start:] + usable[:start]
+
+    def check_lag(self, replica, conn):
+        cursor = conn.cursor()
+        cursor.execute(REPLICATION_LAG_QUERY)
+        lag = float(cursor.fetchone()[0] or 0)
+        cursor.close()
+        conn.rollback()
+        with self.lock:
+            replica.lag = lag
+            replica.lag_checked = time.monotonic()
+        return lag
+
+    def connect_read(self):
+        """Connection for read-only queries: a healthy replica, else the primary"""
+        for replica in self.candidates():
+            started = time.monotonic()
+            try:
+                conn = connect({**replica.config, **self.read_overrides})
+            except Exception as e:
+                print(f"Replica {replica.name} unavailable: {e}")
+                with self.lock:
+                    replica.down_until = time.monotonic() + self.retry_after
+                continue
+
+            replica.record_latency(time.monotonic() - started)
+            try:
+                if time.monotonic() - replica.lag_checked >= self.check_interval:
+                    if self.check_lag(replica, conn) > self.max_lag:
+                        print(f"Replica {replica.name} lagging {replica.lag:.1f}s, skipping")
+                        conn.close()
+                        continue
+            except Exception as e:
+                print(f"Replica {replica.name} lag check failed: {e}")
+                conn.close()
+                with self.lock:
+                    replica.down_until = time.monotonic() + self.retry_after
+                continue
+            return conn
+
+        return connect({**self.primary_config, **self.read_overrides})
+
+    def status(self):
+        now = time.monotonic()
+        return [
+            {
+                'replica': r.name,
+                'available': r.down_until <= now,
+                'lag_seconds': round(r.lag, 3),
+                'latency_ms': round(r.latency * 1000, 1) if r.latency is not None else None
+            }
+            for r in self.replicas
+        ]
@@ -0,0 +1,155 @@
+"""
+Non-blocking, sampled structured logging for the request paths.
+
+``print()`` on a request thread writes to stdout synchronously, and when the
+container runtime drains the log pipe slowly the worker thread blocks with
+it. EventLog puts records on a bounded queue instead; one background thread
+formats them as JSON lines and writes them out in batches. When the queue is
+full the record is dropped and counted rather than waited for.
+
+Every record has a category. LOG_SAMPLE_RATES (e.g. "results=0.01,vote=0.1,*=1")
+sets the share of info/debug records kept per category, decided with a single
+random() before anything is formatted. Errors are never sampled but are rate
+limited per (category, message): at most ``error_burst`` per
+``error_interval`` seconds, and the first one let through afterwards carries
+the number suppressed. LOG_LEVEL (debug, info, error) drops whole levels.
+"""
+
+import json
+import os
+import queue
+import random
+import sys
+import threading
+import time
+from datetime import datetime, timezone
+
+LEVELS = {'debug': 10, 'info': 20, 'error': 40}
+MAX_ERROR_KEYS = 1000
+
+def parse_rates(text):
+    """'results=0.01,vote=0.1' -> {'results': 0.01, 'vote': 0.1}"""
+    rates = {}
+    for part in text.split(','):
+        name, _, rate = part.partition('=')
+        if name.strip() and rate.strip():
+            rates[name.strip()] = float(rate)
+    return rates
+
+class EventLog:
+    def __init__(self, stream=None, level='info', rates=None, queue_size=10000,
+                 error_interval=10.0, error_burst=5):
+        self.stream = stream or sys.stdout
+        self.level = LEVELS[level]
+        self.rates = dict(rates or {})
+        self.default_rate = self.rates.pop('*', 1.0)
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.error_interval = error_interval
+        self.error_burst = error_burst
+        self.errors = {}  # (category, message) -> [window start, logged, suppressed]
+        # Approximate counters: updated without the lock on the hot path
+        self.dropped = 0
+        self.sampled_out = 0
+        self.suppressed = 0
+        self.written = 0
+        self.lock = threading.Lock()
+        self.writer = None
+
+    @classmethod
+    def from_env(cls):
+        return cls(level=os.getenv('LOG_LEVEL', 'info').lower(),
+                   rates=parse_rates(os.getenv('LOG_SAMPLE_RATES', '')),
+                   queue_size=int(os.getenv('LOG_QUEUE_SIZE', '10000')),
+                   error_interval=float(os.getenv('LOG_ERROR_INTERVAL', '10')),
+                   error_burst=int(os.getenv('LOG_ERROR_BURST', '5')))
+
+    def sampled(self, category):
+        rate = self.rates.get(category, self.default_rate)
+        if rate >= 1.0 or (rate > 0.0 and random.random() < rate):
+            return True
+        self.sampled_out += 1
+        return False
+
+    def debug(self, category, message, **fields):
+        if self.level <= LEVELS['debug'] and self.sampled(category):
+            self.put('debug', category, message, fields)
+
+    def event(self, category, message, **fields):
+        if self.level <= LEVELS['info'] and self.sampled(category):
+            self.put('info', category, message, fields)
+
+    def error(self, category, message, error=None, **fields):
+        now = time.monotonic()
+        key = (category, message)
+        suppressed = 0
+        with self.lock:
+            state = self.errors.get(key)
+            if state is None or now - state[0] >= self.error_interval:
+                suppressed = state[2] if state else 0
+                if state is None and len(self.errors) >= MAX_ERROR_KEYS:
+                    self.errors.clear()
+                state = self.errors[key] = [now, 0, 0]
+            if state[1] >= self.error_burst:
+                state[2] += 1
+                self.suppressed += 1
+                return
+            state[1] += 1
+        if error is not None:
+            fields['error'] = str(error)
+        if suppressed:
+            fields['suppressed'] = suppressed
+        self.put('error', category, message, fields)
+
+    def put(self, level, category, message, fields):
+        if self.writer is None:
+            self.start()
+        try:
+            self.queue.put_nowait((time.time(), level, category, message, fields))
+        except queue.Full:
+            self.dropped += 1
+
+    def start(self):
+        with self.lock:
+            if self.writer is None:
+                self.writer = threading.Thread(target=self.run, name='event-log', daemon=True)
+                self.writer.start()
+
+    def format(self, record):
+        timestamp, level, category, message, fields = record
+        return json.dumps({
+            'ts': datetime.fromtimestamp(timestamp, timezone.utc).isoformat(),
+            'level': level,
+            'category': category,
+            'msg': message,
+            **fields
+        }, default=str) + '\n'
+
+    def run(self):
+        while True:
+            batch = [self.queue.get()]
+            try:
+                while len(batch) < 512:
+                    batch.append(self.queue.get_nowait())
+            except queue.Empty:
+                pass
+            try:
+                self.stream.write(''.join(self.format(record) for record in batch))
+                self.stream.flush()
+            except Exception:
+                pass
+            self.written += len(batch)
+            for _ in batch:
+                self.queue.task_done()
+
+    def flush(self, timeout=5.0):
+        """Wait until queued records are written (shutdown, benchmarks)"""
+        deadline = time.monotonic() + timeout
+        while self.queue.unfinished_tasks and time.monotonic() < deadline:
+            time.sleep(0.01)
+
+    def depth(self):
+        return self.queue.qsize()
+
+    def stats(self):
+        return {'queued': self.depth(), 'written': self.written, 'dropped': self.dropped,
+                'sampled_out': self.sampled_out, 'errors_suppressed': self.suppressed}
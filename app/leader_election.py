@@ -0,0 +1,332 @@
+"""
+One poller per environment: leader election plus a shared snapshot store.
+
+Without coordination every replica polls the remote sources itself, so the
+load on the on-premises API and on Azure PostgreSQL grows with the number of
+pods. Here the replicas of an environment compete for a lease; the holder
+polls every source on an interval and publishes the results to a shared
+store, and every replica (the leader included) serves what is in that store.
+
+Leases:
+
+  RedisLease             SET NX PX with an owner token, renewed and released
+                         with compare-and-set scripts; a dead leader's lease
+                         expires after ``ttl`` seconds
+  PostgresAdvisoryLease  session-level pg_try_advisory_lock held on a
+                         dedicated connection; released as soon as that
+                         connection dies
+  LocalLease             flock() on a file: the stand-in for tests and single
+                         hosts, released the moment the holder exits
+
+Candidates retry every ``ttl / 3`` seconds, so a dead leader is replaced
+within about one lease TTL (immediately for the lock-based leases).
+
+Each source is stored with the time it was polled; a replica treats a
+source older than ``max_age`` as unavailable, so its SnapshotCache keeps
+serving the last good value flagged stale until a new leader publishes.
+All sources live in one snapshot, which a replica reads from the store at
+most once per ``read_ttl`` whichever source asks.
+
+PostgresSnapshotStore keeps its rows in ``shared_snapshots`` (schema
+migration 9) and reuses one connection instead of connecting per read.
+"""
+
+import fcntl
+import json
+import os
+import socket
+import threading
+import time
+import zlib
+
+def default_owner():
+    return f'{socket.gethostname()}:{os.getpid()}'
+
+class RedisLease:
+    RENEW = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('pexpire', KEYS[1], ARGV[2]) end return 0"
+    RELEASE = "if redis.call('get', KEYS[1]) == ARGV[1] then return redis.call('del', KEYS[1]) end return 0"
+
+    def __init__(self, client, key, ttl=5.0, owner=None):
+        self.client = client
+        self.key = f'leader:{key}'
+        self.ttl = ttl
+        self.owner = owner or default_owner()
+
+    def acquire(self):
+        return bool(self.client.set(self.key, self.owner, nx=True, px=int(self.ttl * 1000)))
+
+    def renew(self):
+        return bool(self.client.eval(self.RENEW, 1, self.key, self.owner, int(self.ttl * 1000)))
+
+    def release(self):
+        self.client.eval(self.RELEASE, 1, self.key, self.owner)
+
+    def holder(self):
+        return self.client.get(self.key)
+
+class PostgresAdvisoryLease:
+    def __init__(self, connect, key, ttl=5.0):
+        self.connect = connect
+        self.lock_id = zlib.crc32(f'leader:{key}'.encode())
+        self.ttl = ttl
+        self.conn = None
+
+    def acquire(self):
+        conn = self.connect()
+        if conn is None:
+            return False
+        conn.autocommit = True
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT pg_try_advisory_lock(%s)", (self.lock_id,))
+            acquired = cursor.fetchone()[0]
+        except Exception:
+            conn.close()
+            raise
+        if acquired:
+            self.conn = conn
+        else:
+            conn.close()
+        return acquired
+
+    def renew(self):
+        # The lock lives as long as the session; a dead connection means it is gone
+        try:
+            self.conn.cursor().execute("SELECT 1")
+            return True
+        except Exception:
+            self.release()
+            return False
+
+    def release(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+            self.conn = None
+
+    def holder(self):
+        return None
+
+class LocalLease:
+    def __init__(self, directory, key, ttl=5.0):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f'{key.replace("/", "_")}.lock')
+        self.ttl = ttl
+        self.file = None
+
+    def acquire(self):
+        lock_file = open(self.path, 'a+')
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except OSError:
+            lock_file.close()
+            return False
+        lock_file.seek(0)
+        lock_file.truncate()
+        lock_file.write(default_owner())
+        lock_file.flush()
+        self.file = lock_file
+        return True
+
+    def renew(self):
+        return self.file is not None
+
+    def release(self):
+        if self.file is not None:
+            self.file.close()
+            self.file = None
+
+    def holder(self):
+        try:
+            with open(self.path) as f:
+                return f.read() or None
+        except OSError:
+            return None
+
+class RedisSnapshotStore:
+    def __init__(self, client, key):
+        self.client = client
+        self.key = f'snapshot:{key}'
+
+    def publish(self, snapshot):
+        self.client.set(self.key, json.dumps(snapshot))
+
+    def read(self):
+        data = self.client.get(self.key)
+        return json.loads(data) if data else {}
+
+class PostgresSnapshotStore:
+    def __init__(self, connect, key):
+        self.connect = connect
+        self.key = key
+        self.conn = None
+        self.lock = threading.Lock()
+
+    def run(self, sql, params):
+        with self.lock:
+            if self.conn is None:
+                conn = self.connect()
+                if conn is None:
+                    raise ConnectionError("Snapshot store connection failed")
+                conn.autocommit = True
+                self.conn = conn
+            try:
+                cursor = self.conn.cursor()
+                cursor.execute(sql, params)
+                return cursor.fetchone() if cursor.description else None
+            except Exception:
+                # Reconnect on the next call rather than reuse a broken session
+                self.close_locked()
+                raise
+
+    def close_locked(self):
+        if self.conn is not None:
+            try:
+                self.conn.close()
+            except Exception:
+                pass
+            self.conn = None
+
+    def close(self):
+        with self.lock:
+            self.close_locked()
+
+    def publish(self, snapshot):
+        self.run('''
+            INSERT INTO shared_snapshots (key, snapshot) VALUES (%s, %s)
+            ON CONFLICT (key) DO UPDATE SET snapshot = EXCLUDED.snapshot, published_at = CURRENT_TIMESTAMP
+        ''', (self.key, json.dumps(snapshot)))
+
+    def read(self):
+        row = self.run("SELECT snapshot FROM shared_snapshots WHERE key = %s", (self.key,))
+        return row[0] if row else {}
+
+class FileSnapshotStore:
+    def __init__(self, directory, key):
+        os.makedirs(directory, exist_ok=True)
+        self.path = os.path.join(directory, f'{key.replace("/", "_")}.json')
+
+    def publish(self, snapshot):
+        tmp_path = f'{self.path}.{os.getpid()}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(snapshot, f)
+        os.replace(tmp_path, self.path)
+
+    def read(self):
+        try:
+            with open(self.path) as f:
+                return json.load(f)
+        except FileNotFoundError:
+            return {}
+
+class SharedPoller:
+    """Leader-elected polling of named sources into a shared store"""
+
+    def __init__(self, lease, store, sources, interval=1.0, max_age=None, read_ttl=None):
+        self.lease = lease
+        self.store = store
+        self.sources = sources  # name -> loader()
+        self.interval = interval
+        self.max_age = max_age if max_age is not None else 3 * interval + lease.ttl
+        self.read_ttl = read_ttl if read_ttl is not None else interval / 2
+        self.last_read = None  # (monotonic time, snapshot)
+        self.read_lock = threading.Lock()
+        self.store_reads = 0
+        self.is_leader = False
+        self.elections = 0
+        self.snapshot = {}
+        self.stopping = threading.Event()
+        self.thread = None
+
+    def campaign(self):
+        try:
+            if self.is_leader:
+                self.is_leader = self.lease.renew()
+                if not self.is_leader:
+                    print("⚠️ Lost the poller lease, following")
+            elif self.lease.acquire():
+                self.is_leader = True
+                self.elections += 1
+                print(f"✅ Elected cross-site poller ({self.lease.__class__.__name__})")
+        except Exception as e:
+            if self.is_leader:
+                print(f"⚠️ Poller lease renewal failed, following: {e}")
+            self.is_leader = False
+
+    def poll(self):
+        """Refresh every source; a failing one keeps its last published value and time"""
+        for name, loader in self.sources.items():
+            try:
+                self.snapshot[name] = {'value': loader(), 'polled_at': time.time(), 'by': default_owner()}
+            except Exception as e:
+                self.snapshot.setdefault(name, {})['error'] = str(e)
+        self.store.publish(self.snapshot)
+
+    def run(self):
+        next_campaign = 0.0
+        while not self.stopping.is_set():
+            now = time.monotonic()
+            if now >= next_campaign:
+                self.campaign()
+                next_campaign = now + self.lease.ttl / 3
+            if self.is_leader:
+                try:
+                    self.poll()
+                except Exception as e:
+                    print(f"⚠️ Publishing the shared snapshot failed: {e}")
+            self.stopping.wait(min(self.interval, self.lease.ttl / 3))
+
+    def start(self):
+        if self.thread is None:
+            # A new leader continues from what the previous one published
+            try:
+                self.snapshot = self.store.read() or {}
+            except Exception:
+                self.snapshot = {}
+            self.thread = threading.Thread(target=self.run, name='shared-poller', daemon=True)
+            self.thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        if self.is_leader:
+            self.is_leader = False
+            try:
+                self.lease.release()
+            except Exception:
+                pass
+
+    def shared(self):
+        """The published snapshot, read from the store at most once per read_ttl for every source"""
+        with self.read_lock:
+            now = time.monotonic()
+            if self.last_read is None or now - self.last_read[0] >= self.read_ttl:
+                self.store_reads += 1
+                self.last_read = (now, self.store.read())
+            return self.last_read[1]
+
+    def read(self, name):
+        """Latest published value of a source; raises when it is missing or older than max_age"""
+        entry = self.shared().get(name)
+        if not entry or 'value' not in entry:
+            raise LookupError(f"No shared snapshot for {name} yet")
+        age = time.time() - entry['polled_at']
+        if age > self.max_age:
+            raise TimeoutError(f"Shared snapshot for {name} is {age:.1f}s old")
+        return entry['value']
+
+    def status(self):
+        try:
+            holder = self.lease.holder()
+        except Exception:
+            holder = None
+        return {
+            'role': 'leader' if self.is_leader else 'follower',
+            'lease': self.lease.__class__.__name__,
+            'holder': holder,
+            'elections_won': self.elections,
+            'interval': self.interval,
+            'max_age': self.max_age,
+            'store_reads': self.store_reads
+        }
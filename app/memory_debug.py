@@ -0,0 +1,254 @@
+"""
+Opt-in memory debugging at /debug/memory, for attributing pod memory creep.
+
+Only registered when DEBUG_MEMORY_TOKEN is set, and every route requires
+that token (X-Admin-Token or Authorization: Bearer). Endpoints:
+
+  GET  /debug/memory           RSS, traced/peak bytes, GC counts, sizes of
+                               registered caches, pools and queues, and the
+                               per-route allocation statistics
+  POST /debug/memory/start     start tracemalloc (?frames=N stack depth)
+  POST /debug/memory/stop      stop tracemalloc and drop the baseline
+  GET  /debug/memory/top       top allocation sites (?limit=20&group=lineno|filename|traceback)
+  POST /debug/memory/snapshot  keep the current allocations as the baseline
+  GET  /debug/memory/diff      top allocation growth since the baseline
+
+While tracemalloc runs, a ``sample_rate`` share of requests also records the
+bytes the process allocated while serving it: ``retained`` (traced memory
+after minus before) and ``peak`` (highest traced memory during the request
+minus before). Traced memory is process-wide, so concurrent requests blur
+these figures; they are per-route trends, not exact costs.
+
+With tracemalloc stopped the request hooks are a single attribute check; with
+no token nothing is registered at all.
+"""
+
+import gc
+import os
+import random
+import resource
+import threading
+import time
+import tracemalloc
+
+from flask import g, jsonify, request
+
+from auth import authorized
+
+MAX_LIMIT = 500
+MAX_FRAMES = 100  # tracemalloc itself accepts up to 65535, at a heavy cost per allocation
+
+class BadArgument(ValueError):
+    """A query parameter the client got wrong (answered with 400)"""
+
+def rss_bytes():
+    """Current resident set size from /proc, or the peak RSS where /proc is missing"""
+    try:
+        with open('/proc/self/statm') as f:
+            return int(f.read().split()[1]) * os.sysconf('SC_PAGE_SIZE')
+    except (OSError, ValueError):
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss * 1024
+
+class RouteAllocations:
+    __slots__ = ('samples', 'retained', 'peak', 'max_peak')
+
+    def __init__(self):
+        self.samples = 0
+        self.retained = 0
+        self.peak = 0
+        self.max_peak = 0
+
+class MemoryDebug:
+    def __init__(self, token, sample_rate=0.01, frames=1):
+        self.token = token
+        self.sample_rate = sample_rate
+        self.frames = frames
+        self.components = {}
+        self.routes = {}
+        self.baseline = None
+        self.started_at = None
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls):
+        return cls(os.getenv('DEBUG_MEMORY_TOKEN'),
+                   sample_rate=float(os.getenv('DEBUG_MEMORY_SAMPLE_RATE', '0.01')),
+                   frames=int(os.getenv('DEBUG_MEMORY_FRAMES', '1')))
+
+    def register(self, name, size):
+        """Report size() (an int or a small dict) for a cache, pool or queue"""
+        self.components[name] = size
+
+    def start(self, frames=None):
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(frames or self.frames)
+            self.started_at = time.time()
+            with self.lock:
+                self.routes.clear()
+
+    def stop(self):
+        tracemalloc.stop()
+        self.baseline = None
+        self.started_at = None
+
+    def request_started(self):
+        if random.random() < self.sample_rate:
+            # The peak is process-wide: a sampled request restarts it for everyone
+            tracemalloc.reset_peak()
+            g.memory_before = tracemalloc.get_traced_memory()[0]
+
+    def request_finished(self, response):
+        before = g.pop('memory_before', None)
+        if before is not None and tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            with self.lock:
+                stats = self.routes.get(request.endpoint)
+                if stats is None:
+                    stats = self.routes[request.endpoint] = RouteAllocations()
+                stats.samples += 1
+                stats.retained += current - before
+                stats.peak += max(0, peak - before)
+                stats.max_peak = max(stats.max_peak, peak - before)
+        return response
+
+    def component_sizes(self):
+        sizes = {}
+        for name, size in self.components.items():
+            try:
+                sizes[name] = size()
+            except Exception as e:
+                sizes[name] = {'error': str(e)}
+        return sizes
+
+    def status(self):
+        body = {
+            'pid': os.getpid(),
+            'rss_bytes': rss_bytes(),
+            'tracing': tracemalloc.is_tracing(),
+            'gc': {'counts': gc.get_count(), 'objects': len(gc.get_objects()),
+                   'collections': [s['collections'] for s in gc.get_stats()]},
+            'components': self.component_sizes()
+        }
+        if tracemalloc.is_tracing():
+            current, peak = tracemalloc.get_traced_memory()
+            body.update({
+                'traced_bytes': current,
+                'traced_peak_bytes': peak,
+                'tracemalloc_overhead_bytes': tracemalloc.get_tracemalloc_memory(),
+                'traced_since': self.started_at,
+                'baseline': self.baseline is not None,
+                'sample_rate': self.sample_rate
+            })
+        with self.lock:
+            body['routes'] = {endpoint: {
+                'samples': s.samples,
+                'avg_retained_bytes': round(s.retained / s.samples),
+                'avg_peak_bytes': round(s.peak / s.samples),
+                'max_peak_bytes': s.max_peak
+            } for endpoint, s in self.routes.items()}
+        return body
+
+    @staticmethod
+    def format_stat(stat, group):
+        entry = {'site': stat.traceback.format() if group == 'traceback' else str(stat.traceback[0]),
+                 'bytes': stat.size, 'count': stat.count}
+        if isinstance(stat, tracemalloc.StatisticDiff):
+            entry.update({'bytes_diff': stat.size_diff, 'count_diff': stat.count_diff})
+        return entry
+
+    @staticmethod
+    def snapshot():
+        # Allocations by the tracer itself and import machinery are noise here
+        return tracemalloc.take_snapshot().filter_traces((
+            tracemalloc.Filter(False, tracemalloc.__file__),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap>'),
+            tracemalloc.Filter(False, '<frozen importlib._bootstrap_external>'),
+        ))
+
+    def init_app(self, app):
+        if not self.token:
+            return
+
+        @app.before_request
+        def memory_request_started():
+            if tracemalloc.is_tracing():
+                self.request_started()
+
+        @app.after_request
+        def memory_request_finished(response):
+            return self.request_finished(response)
+
+        def guarded(view):
+            def wrapper():
+                if not authorized(request, self.token):
+                    return jsonify({'error': 'Unauthorized'}), 401
+                try:
+                    return view()
+                except BadArgument as e:
+                    return jsonify({'error': str(e)}), 400
+            wrapper.__name__ = view.__name__
+            return wrapper
+
+        def int_argument(name, default, highest):
+            """?name= as an int from 1 to highest; raises BadArgument"""
+            value = request.args.get(name)
+            if not value:
+                return default
+            try:
+                number = int(value)
+            except ValueError:
+                number = 0
+            if not 1 <= number <= highest:
+                raise BadArgument(f"{name} must be an integer from 1 to {highest}")
+            return number
+
+        def arguments():
+            group = request.args.get('group', 'lineno')
+            if group not in ('lineno', 'filename', 'traceback'):
+                group = 'lineno'
+            return group, int_argument('limit', 20, MAX_LIMIT)
+
+        @app.route('/debug/memory')
+        @guarded
+        def debug_memory():
+            return jsonify(self.status())
+
+        @app.route('/debug/memory/start', methods=['POST'])
+        @guarded
+        def debug_memory_start():
+            self.start(int_argument('frames', None, MAX_FRAMES))
+            return jsonify({'tracing': True, 'frames': tracemalloc.get_traceback_limit()})
+
+        @app.route('/debug/memory/stop', methods=['POST'])
+        @guarded
+        def debug_memory_stop():
+            self.stop()
+            return jsonify({'tracing': False})
+
+        @app.route('/debug/memory/top')
+        @guarded
+        def debug_memory_top():
+            if not tracemalloc.is_tracing():
+                return jsonify({'error': 'tracemalloc is not running (POST /debug/memory/start)'}), 409
+            group, limit = arguments()
+            stats = self.snapshot().statistics(group)
+            return jsonify({'group': group, 'total_bytes': sum(s.size for s in stats),
+                            'top': [self.format_stat(s, group) for s in stats[:limit]]})
+
+        @app.route('/debug/memory/snapshot', methods=['POST'])
+        @guarded
+        def debug_memory_snapshot():
+            if not tracemalloc.is_tracing():
+                return jsonify({'error': 'tracemalloc is not running (POST /debug/memory/start)'}), 409
+            self.baseline = self.snapshot()
+            return jsonify({'baseline_bytes': sum(t.size for t in self.baseline.traces)})
+
+        @app.route('/debug/memory/diff')
+        @guarded
+        def debug_memory_diff():
+            if self.baseline is None or not tracemalloc.is_tracing():
+                return jsonify({'error': 'No baseline (POST /debug/memory/snapshot first)'}), 409
+            group, limit = arguments()
+            stats = self.snapshot().compare_to(self.baseline, group)
+            return jsonify({'group': group, 'growth_bytes': sum(s.size_diff for s in stats),
+                            'top': [self.format_stat(s, group) for s in stats[:limit]]})
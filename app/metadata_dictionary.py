@@ -0,0 +1,152 @@
+"""
+Dictionary encoding for repeated vote metadata.
+
+User agents and vote sources repeat across millions of votes but have few
+distinct values. With compact storage (migration 5) they are interned into
+the ``user_agents`` and ``vote_sources`` lookup tables and votes store small
+integer ids instead; the ``votes_expanded`` view joins them back so readers
+see the original columns. Id mappings are kept in an in-process LRU, so a
+write only pays a lookup round-trip the first time a value is seen.
+
+Rows written before compaction (or with compaction disabled) keep the text
+columns; ``backfill()`` converts them in id-range batches.
+"""
+
+import threading
+from collections import OrderedDict
+
+MAX_USER_AGENT_LENGTH = 512  # longer values are truncated before interning
+
+class LookupTable:
+    def __init__(self, table, column, capacity=4096):
+        self.table = table
+        self.column = column
+        self.capacity = capacity
+        self.cache = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+        # Insert unseen values and read back every id in one statement
+        self.resolve_sql = f'''
+            WITH input(value) AS (SELECT DISTINCT unnest(%s::text[])),
+            inserted AS (
+                INSERT INTO {table} ({column}) SELECT value FROM input
+                ON CONFLICT ({column}) DO NOTHING
+                RETURNING {column}, id
+            )
+            SELECT {column}, id FROM inserted
+            UNION ALL
+            SELECT t.{column}, t.id FROM {table} t JOIN input ON t.{column} = input.value
+        '''
+
+    def ids(self, values, query):
+        """Map values to ids; query(sql, params) -> rows runs the lookup on a cache miss"""
+        result = {}
+        missing = []
+        with self.lock:
+            for value in set(values):
+                if value is None:
+                    result[value] = None
+                elif value in self.cache:
+                    self.cache.move_to_end(value)
+                    result[value] = self.cache[value]
+                    self.hits += 1
+                else:
+                    missing.append(value)
+                    self.misses += 1
+        if missing:
+            for attempt in range(2):
+                rows = query(self.resolve_sql, (missing,))
+                found = dict(rows)
+                # A value inserted concurrently by another writer is invisible to
+                # this statement's snapshot; the retry reads it
+                if len(found) == len(missing) or attempt:
+                    break
+            with self.lock:
+                for value, value_id in found.items():
+                    self.cache[value] = value_id
+                    if len(self.cache) > self.capacity:
+                        self.cache.popitem(last=False)
+            result.update(found)
+        return result
+
+    def stats(self):
+        return {'cached': len(self.cache), 'hits': self.hits, 'misses': self.misses}
+
+class MetadataDictionary:
+    def __init__(self, capacity=4096):
+        self.user_agents = LookupTable('user_agents', 'user_agent', capacity)
+        self.sources = LookupTable('vote_sources', 'name', 64)
+
+    @staticmethod
+    def connection_query(conn):
+        """Lookup runner for a psycopg2 connection. Lookups commit on their own,
+        before the votes that use them: a cached id must never point at a
+        lookup row that was rolled back with a failed vote insert."""
+        def query(sql, params):
+            cursor = conn.cursor()
+            cursor.execute(sql, params)
+            rows = cursor.fetchall()
+            cursor.close()
+            conn.commit()
+            return rows
+        return query
+
+    def encode(self, records, query):
+        """(source_id, user_agent_id) per record dict with 'source' and 'user_agent'"""
+        agents = [(r.get('user_agent') or None) for r in records]
+        agents = [a[:MAX_USER_AGENT_LENGTH] if a else None for a in agents]
+        source_ids = self.sources.ids([r['source'] for r in records], query)
+        agent_ids = self.user_agents.ids(agents, query)
+        return [(source_ids[r['source']], agent_ids[a]) for r, a in zip(records, agents)]
+
+    def stats(self):
+        return {'user_agents': self.user_agents.stats(), 'sources': self.sources.stats()}
+
+def backfill(conn, batch_size=50000):
+    """Convert text user_agent/vote_source columns to ids, one committed id range at a time"""
+    cursor = conn.cursor()
+    cursor.execute('''
+        INSERT INTO user_agents (user_agent)
+        SELECT DISTINCT left(user_agent, %s) FROM votes
+        WHERE user_agent IS NOT NULL AND user_agent_id IS NULL
+        ON CONFLICT (user_agent) DO NOTHING
+    ''', (MAX_USER_AGENT_LENGTH,))
+    cursor.execute('''
+        INSERT INTO vote_sources (name)
+        SELECT DISTINCT vote_source FROM votes WHERE vote_source IS NOT NULL AND source_id IS NULL
+        ON CONFLICT (name) DO NOTHING
+    ''')
+    conn.commit()
+
+    # Keyset batches over the primary key: each pass reads forward from the last id
+    converted = 0
+    last_id = None
+    while True:
+        cursor.execute('''
+            SELECT MAX(id) FROM (
+                SELECT id FROM votes WHERE %(after)s IS NULL OR id > %(after)s ORDER BY id LIMIT %(size)s
+            ) batch
+        ''', {'after': last_id, 'size': batch_size})
+        end_id = cursor.fetchone()[0]
+        if end_id is None:
+            break
+        cursor.execute('''
+            UPDATE votes v
+            SET source_id = COALESCE(v.source_id, s.id),
+                vote_source = CASE WHEN COALESCE(v.source_id, s.id) IS NULL THEN v.vote_source END,
+                user_agent_id = COALESCE(v.user_agent_id, u.id),
+                user_agent = CASE WHEN COALESCE(v.user_agent_id, u.id) IS NULL THEN v.user_agent END
+            FROM votes o
+            LEFT JOIN vote_sources s ON s.name = o.vote_source
+            LEFT JOIN user_agents u ON u.user_agent = left(o.user_agent, %(max_length)s)
+            WHERE v.id = o.id
+              AND (%(after)s IS NULL OR v.id > %(after)s) AND v.id <= %(end)s
+              AND (v.vote_source IS NOT NULL OR v.user_agent IS NOT NULL)
+        ''', {'max_length': MAX_USER_AGENT_LENGTH, 'after': last_id, 'end': end_id})
+        converted += cursor.rowcount
+        conn.commit()
+        print(f"Compacted votes up to id {end_id} ({converted} rows so far)")
+        last_id = end_id
+    cursor.close()
+    return converted
@@ -0,0 +1,327 @@
+"""
+Versioned schema migrations for the votes database.
+
+Applied versions are recorded in ``schema_migrations``. On start-up a single
+``SELECT max(version)`` decides whether anything is pending, so a pod joining
+an already-migrated database runs no DDL at all. Pending migrations are
+applied in one transaction under an advisory lock, which keeps pods that
+start together from racing each other. Every migration is written to be
+safe against databases created before versioning existed.
+"""
+
+MIGRATIONS_LOCK_ID = 4_120_415  # pg_advisory_xact_lock key shared by all app pods
+
+MIGRATIONS = [
+    (1, 'votes table and summary view', [
+        '''
+        CREATE TABLE IF NOT EXISTS votes (
+            id SERIAL PRIMARY KEY,
+            vote_choice VARCHAR(10) NOT NULL CHECK (vote_choice IN ('cat', 'dog')),
+            vote_source VARCHAR(20) NOT NULL CHECK (vote_source IN ('azure', 'onprem')),
+            timestamp TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+            ip_address INET,
+            user_agent TEXT,
+            session_id VARCHAR(255)
+        )
+        ''',
+        '''
+        CREATE OR REPLACE VIEW vote_summary AS
+        SELECT
+            vote_choice,
+            COUNT(*) as total_votes,
+            COUNT(CASE WHEN vote_source = 'azure' THEN 1 END) as azure_votes,
+            COUNT(CASE WHEN vote_source = 'onprem' THEN 1 END) as onprem_votes,
+            ROUND(COUNT(*) * 100.0 / (SELECT COUNT(*) FROM votes), 2) as percentage
+        FROM votes
+        GROUP BY vote_choice
+        '''
+    ]),
+    (2, 'vote journal offsets', [
+        '''
+        CREATE TABLE IF NOT EXISTS vote_journal_offsets (
+            journal_id VARCHAR(255) PRIMARY KEY,
+            last_offset BIGINT NOT NULL
+        )
+        '''
+    ]),
+    (3, 'stream ids for tiered storage', [
+        "ALTER TABLE votes ADD COLUMN IF NOT EXISTS stream_id VARCHAR(32)",
+        "CREATE UNIQUE INDEX IF NOT EXISTS votes_stream_id_idx ON votes (stream_id)"
+    ]),
+    (4, 'abuse flag on burst votes', [
+        "ALTER TABLE votes ADD COLUMN IF NOT EXISTS abuse_flag VARCHAR(128)",
+        '''
+        CREATE OR REPLACE VIEW vote_summary_clean AS
+        SELECT
+            vote_choice,
+            COUNT(*) as total_votes,
+            COUNT(CASE WHEN vote_source = 'azure' THEN 1 END) as azure_votes,
+            COUNT(CASE WHEN vote_source = 'onprem' THEN 1 END) as onprem_votes
+        FROM votes
+        WHERE abuse_flag IS NULL
+        GROUP BY vote_choice
+        '''
+    ]),
+    (5, 'dictionary-encoded user agents and sources', [
+        "CREATE TABLE IF NOT EXISTS vote_sources (id SMALLSERIAL PRIMARY KEY, name VARCHAR(20) NOT NULL UNIQUE)",
+        "INSERT INTO vote_sources (name) VALUES ('azure'), ('onprem') ON CONFLICT (name) DO NOTHING",
+        "CREATE TABLE IF NOT EXISTS user_agents (id SERIAL PRIMARY KEY, user_agent TEXT NOT NULL UNIQUE)",
+        '''
+        ALTER TABLE votes
+            ADD COLUMN IF NOT EXISTS source_id SMALLINT REFERENCES vote_sources (id),
+            ADD COLUMN IF NOT EXISTS user_agent_id INTEGER REFERENCES user_agents (id),
+            ALTER COLUMN vote_source DROP NOT NULL
+        ''',
+        # Compact rows carry source_id instead; existing rows are not rescanned
+        '''
+        ALTER TABLE votes ADD CONSTRAINT votes_source_present
+            CHECK (vote_source IS NOT NULL OR source_id IS NOT NULL) NOT VALID
+        ''',
+        '''
+        CREATE OR REPLACE VIEW votes_expanded AS
+        SELECT
+            v.id,
+            v.vote_choice,
+            COALESCE(s.name, v.vote_source) as vote_source,
+            v.timestamp,
+            v.ip_address,
+            COALESCE(u.user_agent, v.user_agent) as user_agent,
+            v.session_id,
+            v.abuse_flag,
+            v.stream_id
+        FROM votes v
+        LEFT JOIN vote_sources s ON s.id = v.source_id
+        LEFT JOIN user_agents u ON u.id = v.user_agent_id
+        ''',
+        '''
+        CREATE OR REPLACE VIEW vote_summary AS
+        SELECT
+            vote_choice,
+            COUNT(*) as total_votes,
+            COUNT(CASE WHEN vote_source = 'azure' THEN 1 END) as azure_votes,
+            COUNT(CASE WHEN vote_source = 'onprem' THEN 1 END) as onprem_votes,
+            ROUND(COUNT(*) * 100.0 / (SELECT COUNT(*) FROM votes), 2) as percentage
+        FROM votes_expanded
+        GROUP BY vote_choice
+        ''',
+        '''
+        CREATE OR REPLACE VIEW vote_summary_clean AS
+        SELECT
+            vote_choice,
+            COUNT(*) as total_votes,
+            COUNT(CASE WHEN vote_source = 'azure' THEN 1 END) as azure_votes,
+            COUNT(CASE WHEN vote_source = 'onprem' THEN 1 END) as onprem_votes
+        FROM votes_expanded
+        WHERE abuse_flag IS NULL
+        GROUP BY vote_choice
+        '''
+    ]),
+    (6, 'polls with arbitrary options', [
+        '''
+        CREATE TABLE IF NOT EXISTS polls (
+            poll_id VARCHAR(64) PRIMARY KEY,
+            title TEXT,
+            created_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
+        CREATE TABLE IF NOT EXISTS poll_options (
+            poll_id VARCHAR(64) NOT NULL REFERENCES polls (poll_id) ON DELETE CASCADE,
+            option VARCHAR(64) NOT NULL,
+            position SMALLINT NOT NULL DEFAULT 0,
+            PRIMARY KEY (poll_id, option)
+        )
+        ''',
+        "INSERT INTO polls (poll_id, title) VALUES ('cat-vs-dog', 'Cats or dogs?') ON CONFLICT (poll_id) DO NOTHING",
+        '''
+        INSERT INTO poll_options (poll_id, option, position)
+        VALUES ('cat-vs-dog', 'cat', 0), ('cat-vs-dog', 'dog', 1)
+        ON CONFLICT (poll_id, option) DO NOTHING
+        ''',
+        # Views pin the vote_choice type; they are recreated below
+        "DROP VIEW IF EXISTS vote_summary, vote_summary_clean, votes_expanded",
+        # Constant default: no table rewrite, existing votes belong to the original poll
+        "ALTER TABLE votes ADD COLUMN IF NOT EXISTS poll_id VARCHAR(64) NOT NULL DEFAULT 'cat-vs-dog'",
+        # Widening a varchar is catalog-only; the fixed cat/dog CHECK becomes a
+        # catalog foreign key, not validated against existing rows
+        '''
+        ALTER TABLE votes
+            ALTER COLUMN vote_choice TYPE VARCHAR(64),
+            DROP CONSTRAINT IF EXISTS votes_vote_choice_check,
+            ADD CONSTRAINT votes_poll_option_fkey FOREIGN KEY (poll_id, vote_choice)
+                REFERENCES poll_options (poll_id, option) NOT VALID
+        ''',
+        "CREATE INDEX IF NOT EXISTS votes_poll_choice_idx ON votes (poll_id, vote_choice)",
+        '''
+        CREATE VIEW votes_expanded AS
+        SELECT
+            v.id,
+            v.vote_choice,
+            COALESCE(s.name, v.vote_source) as vote_source,
+            v.timestamp,
+            v.ip_address,
+            COALESCE(u.user_agent, v.user_agent) as user_agent,
+            v.session_id,
+            v.abuse_flag,
+            v.stream_id,
+            v.poll_id
+        FROM votes v
+        LEFT JOIN vote_sources s ON s.id = v.source_id
+        LEFT JOIN user_agents u ON u.id = v.user_agent_id
+        ''',
+        # Percentages are per poll; a poll_id filter is pushed below the window
+        '''
+        CREATE OR REPLACE VIEW poll_summary AS
+        SELECT
+            poll_id,
+            vote_choice,
+            COUNT(*) as total_votes,
+            COUNT(CASE WHEN vote_source = 'azure' THEN 1 END) as azure_votes,
+            COUNT(CASE WHEN vote_source = 'onprem' THEN 1 END) as onprem_votes,
+            ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER (PARTITION BY poll_id), 2) as percentage
+        FROM votes_expanded
+        GROUP BY poll_id, vote_choice
+        ''',
+        '''
+        CREATE VIEW vote_summary AS
+        SELECT vote_choice, total_votes, azure_votes, onprem_votes, percentage
+        FROM poll_summary
+        WHERE poll_id = 'cat-vs-dog'
+        ''',
+        '''
+        CREATE VIEW vote_summary_clean AS
+        SELECT
+            vote_choice,
+            COUNT(*) as total_votes,
+            COUNT(CASE WHEN vote_source = 'azure' THEN 1 END) as azure_votes,
+            COUNT(CASE WHEN vote_source = 'onprem' THEN 1 END) as onprem_votes
+        FROM votes_expanded
+        WHERE abuse_flag IS NULL AND poll_id = 'cat-vs-dog'
+        GROUP BY vote_choice
+        '''
+    ]),
+    # Bucketed consistency checks (scripts/check_vote_consistency.py) read
+    # divergent time ranges instead of the whole table
+    (7, 'timestamp index for bucketed consistency checks', [
+        "CREATE INDEX IF NOT EXISTS votes_timestamp_idx ON votes (timestamp)"
+    ]),
+    # The apps now generate time-ordered ids themselves (see vote_ids); the
+    # column default only serves writers that don't, such as older pods
+    # during a rollout, in the same layout as worker 127 of site 7
+    (8, 'application-generated sortable vote ids', [
+        "DROP VIEW IF EXISTS vote_summary, vote_summary_clean, poll_summary, votes_expanded",
+        # Rewrites the table and its primary key index once; existing ids keep their values
+        "ALTER TABLE votes ALTER COLUMN id DROP DEFAULT, ALTER COLUMN id TYPE BIGINT",
+        "DROP SEQUENCE IF EXISTS votes_id_seq",
+        "CREATE SEQUENCE IF NOT EXISTS vote_id_sequence MINVALUE 0 MAXVALUE 4095 START 0 CYCLE",
+        '''
+        CREATE OR REPLACE FUNCTION vote_id() RETURNS BIGINT LANGUAGE sql VOLATILE AS $$
+            SELECT ((floor(extract(epoch FROM clock_timestamp()) * 1000)::bigint - 1704067200000) << 22)
+                   | (1023 << 12) | nextval('vote_id_sequence')
+        $$
+        ''',
+        "ALTER TABLE votes ALTER COLUMN id SET DEFAULT vote_id()",
+        # Same views as migration 6, over the BIGINT id
+        '''
+        CREATE VIEW votes_expanded AS
+        SELECT
+            v.id,
+            v.vote_choice,
+            COALESCE(s.name, v.vote_source) as vote_source,
+            v.timestamp,
+            v.ip_address,
+            COALESCE(u.user_agent, v.user_agent) as user_agent,
+            v.session_id,
+            v.abuse_flag,
+            v.stream_id,
+            v.poll_id
+        FROM votes v
+        LEFT JOIN vote_sources s ON s.id = v.source_id
+        LEFT JOIN user_agents u ON u.id = v.user_agent_id
+        ''',
+        '''
+        CREATE VIEW poll_summary AS
+        SELECT
+            poll_id,
+            vote_choice,
+            COUNT(*) as total_votes,
+            COUNT(CASE WHEN vote_source = 'azure' THEN 1 END) as azure_votes,
+            COUNT(CASE WHEN vote_source = 'onprem' THEN 1 END) as onprem_votes,
+            ROUND(COUNT(*) * 100.0 / SUM(COUNT(*)) OVER (PARTITION BY poll_id), 2) as percentage
+        FROM votes_expanded
+        GROUP BY poll_id, vote_choice
+        ''',
+        '''
+        CREATE VIEW vote_summary AS
+        SELECT vote_choice, total_votes, azure_votes, onprem_votes, percentage
+        FROM poll_summary
+        WHERE poll_id = 'cat-vs-dog'
+        ''',
+        '''
+        CREATE VIEW vote_summary_clean AS
+        SELECT
+            vote_choice,
+            COUNT(*) as total_votes,
+            COUNT(CASE WHEN vote_source = 'azure' THEN 1 END) as azure_votes,
+            COUNT(CASE WHEN vote_source = 'onprem' THEN 1 END) as onprem_votes
+        FROM votes_expanded
+        WHERE abuse_flag IS NULL AND poll_id = 'cat-vs-dog'
+        GROUP BY vote_choice
+        '''
+    ]),
+    # COORDINATION=postgres (leader_election): the snapshot the elected poller
+    # publishes for the other replicas
+    (9, 'shared snapshots for the cross-site poller', [
+        '''
+        CREATE TABLE IF NOT EXISTS shared_snapshots (
+            key VARCHAR(255) PRIMARY KEY,
+            snapshot JSONB NOT NULL,
+            published_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+        )
+        '''
+    ]),
+]
+
+def current_version(cursor):
+    """Highest applied version, or 0 when the migrations table doesn't exist yet"""
+    cursor.execute("SELECT to_regclass('schema_migrations') IS NOT NULL")
+    if not cursor.fetchone()[0]:
+        return 0
+    cursor.execute("SELECT COALESCE(MAX(version), 0) FROM schema_migrations")
+    return cursor.fetchone()[0]
+
+def migrate(conn, migrations=MIGRATIONS):
+    """Apply pending migrations; returns the list of versions applied"""
+    latest = max(version for version, _, _ in migrations)
+    cursor = conn.cursor()
+    try:
+        if current_version(cursor) >= latest:
+            conn.rollback()
+            return []
+
+        cursor.execute("SELECT pg_advisory_xact_lock(%s)", (MIGRATIONS_LOCK_ID,))
+        cursor.execute('''
+            CREATE TABLE IF NOT EXISTS schema_migrations (
+                version INTEGER PRIMARY KEY,
+                description TEXT NOT NULL,
+                applied_at TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+            )
+        ''')
+        # Another pod may have finished while we waited for the lock
+        applied_version = current_version(cursor)
+        applied = []
+        for version, description, statements in migrations:
+            if version <= applied_version:
+                continue
+            for statement in statements:
+                cursor.execute(statement)
+            cursor.execute("INSERT INTO schema_migrations (version, description) VALUES (%s, %s)",
+                           (version, description))
+            applied.append(version)
+        conn.commit()
+        return applied
+    except Exception:
+        conn.rollback()
+        raise
+    finally:
+        cursor.close()
@@ -0,0 +1,86 @@
+"""
+Pooled psycopg 3 access with server-side prepared statements and pipelining.
+
+Connections come from a psycopg_pool pool with ``prepare_threshold = 0``, so
+every statement is prepared on its first execution and reused for the life
+of that pooled connection: Postgres parses and plans each query once per
+connection instead of once per request. ``pipeline()`` sends several
+statements (e.g. the vote insert and the summary read that follows it) in a
+single network round-trip. Results use the binary protocol, which avoids
+text parsing of the integer counts.
+"""
+
+from psycopg import Connection
+from psycopg_pool import ConnectionPool
+
+class PipelinedPostgres:
+    def __init__(self, config, min_size=1, max_size=10, timeout=5.0, name='postgres'):
+        self.pool = ConnectionPool(
+            kwargs={'dbname' if k == 'database' else k: v for k, v in config.items()},
+            min_size=min_size,
+            max_size=max_size,
+            timeout=timeout,
+            configure=self.configure,
+            name=name,
+            open=False
+        )
+
+    @staticmethod
+    def configure(conn: Connection):
+        # Each statement is its own implicit transaction; no COMMIT round-trip
+        conn.autocommit = True
+        conn.prepare_threshold = 0
+
+    def open(self, wait=False):
+        self.pool.open(wait=wait)
+
+    def wait(self, timeout=30.0):
+        """Block until min_size connections are open, e.g. during warm-up"""
+        self.pool.wait(timeout=timeout)
+
+    def query(self, sql, params=None):
+        """Run one prepared statement and return its rows"""
+        with self.pool.connection() as conn:
+            cursor = conn.cursor(binary=True)
+            cursor.execute(sql, params, prepare=True)
+            return cursor.fetchall() if cursor.description else []
+
+    def pipeline(self, statements):
+        """Run [(sql, params), ...] in one round-trip; returns rows per statement.
+
+        Statements run in a single transaction so a failing insert also
+        discards the reads queued behind it.
+        """
+        with self.pool.connection() as conn:
+            with conn.pipeline(), conn.transaction():
+                cursors = []
+                for sql, params in statements:
+                    cursor = conn.cursor(binary=True)
+                    cursor.execute(sql, params, prepare=True)
+                    cursors.append(cursor)
+            return [cursor.fetchall() if cursor.description else [] for cursor in cursors]
+
+    def copy(self, sql, rows, statements=()):
+        """COPY rows in with one streamed statement, then run follow-up statements.
+
+        Rows are sent with write_row(), i.e. in COPY's default text format, so
+        sql must not ask for FORMAT csv or binary. Follow-ups (e.g. the summary read) share the COPY's transaction and
+        connection; returns rows per follow-up statement.
+        """
+        with self.pool.connection() as conn:
+            with conn.transaction():
+                with conn.cursor().copy(sql) as copy:
+                    for row in rows:
+                        copy.write_row(row)
+                results = []
+                for follow_sql, params in statements:
+                    cursor = conn.cursor(binary=True)
+                    cursor.execute(follow_sql, params, prepare=True)
+                    results.append(cursor.fetchall() if cursor.description else [])
+            return results
+
+    def stats(self):
+        return self.pool.get_stats()
+
+    def close(self):
+        self.pool.close()
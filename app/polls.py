@@ -0,0 +1,136 @@
+"""
+Poll catalog, per-poll counter keys and hot-poll snapshots.
+
+Every vote names a poll (``poll_id``, default ``cat-vs-dog``) and one of
+that poll's options. The catalog of polls and options lives in the store
+(``polls``/``poll_options`` tables, or a Redis hash) and is cached in memory:
+validating a vote is a dict lookup whatever the number of polls. The cache
+reloads every ``ttl`` seconds, after ``invalidate()`` (e.g. when a poll is
+created) and when a vote names a poll it hasn't seen, at most once per
+``miss_interval`` so made-up poll ids can't turn into a reload storm.
+
+Redis counters of the default poll keep their original ``votes:<option>``
+keys. Other polls put the poll id in a hash tag, ``votes:{<poll_id>}:<option>``,
+so all counters of one poll share a Redis Cluster slot (one MGET/MULTI per
+poll) while different polls spread across the cluster.
+
+Result snapshots are kept per poll in an LRU of SnapshotCaches, so only the
+polls being watched hold memory and a poll's summary query runs at most
+once per cache TTL however many clients poll it.
+"""
+
+import threading
+import time
+from collections import OrderedDict
+
+from snapshot_cache import SnapshotCache
+
+DEFAULT_POLL = 'cat-vs-dog'
+DEFAULT_OPTIONS = ('cat', 'dog')
+MAX_POLL_ID_LENGTH = 64  # polls.poll_id is VARCHAR(64)
+MAX_OPTION_LENGTH = 64   # poll_options.option and votes.vote_choice are VARCHAR(64)
+MAX_OPTIONS = 32
+
+def counter_key(poll_id, option, source=None):
+    """Redis counter for an option, optionally per vote source"""
+    scope = '' if poll_id == DEFAULT_POLL else f'{{{poll_id}}}:'
+    return f'votes:{scope}{source}:{option}' if source else f'votes:{scope}{option}'
+
+def valid_poll_id(poll_id):
+    return (isinstance(poll_id, str) and 0 < len(poll_id) <= MAX_POLL_ID_LENGTH
+            and all(c.isalnum() or c in '-_' for c in poll_id))
+
+def parse_poll(payload):
+    """(poll_id, options) from a POST /api/polls body; raises ValueError"""
+    if not isinstance(payload, dict):
+        raise ValueError('Body must be {"poll_id": ..., "options": [...]}')
+    poll_id = payload.get('poll_id')
+    if not valid_poll_id(poll_id):
+        raise ValueError(f"poll_id must be 1-{MAX_POLL_ID_LENGTH} letters, digits, '-' or '_'")
+    options = payload.get('options')
+    if not isinstance(options, list) or not all(isinstance(o, str) for o in options):
+        raise ValueError("options must be a list of strings")
+    options = [o.strip().lower() for o in options]
+    if not 2 <= len(options) <= MAX_OPTIONS or len(set(options)) != len(options):
+        raise ValueError(f"A poll needs 2-{MAX_OPTIONS} distinct options")
+    if not all(0 < len(o) <= MAX_OPTION_LENGTH for o in options):
+        raise ValueError(f"Options must be 1-{MAX_OPTION_LENGTH} characters")
+    return poll_id, options
+
+class PollCatalog:
+    def __init__(self, loader, ttl=30.0, miss_interval=1.0):
+        self.loader = loader
+        self.ttl = ttl
+        self.miss_interval = miss_interval
+        # The default poll works before (and without) a successful load
+        self.catalog = {DEFAULT_POLL: DEFAULT_OPTIONS}
+        self.loaded_at = 0.0
+        self.last_attempt = 0.0
+        self.lock = threading.Lock()
+
+    def reload(self):
+        self.last_attempt = time.monotonic()
+        try:
+            catalog = {poll_id: tuple(options) for poll_id, options in self.loader().items()}
+        except Exception as e:
+            print(f"Poll catalog reload failed, keeping {len(self.catalog)} cached polls: {e}")
+            return
+        catalog.setdefault(DEFAULT_POLL, self.catalog.get(DEFAULT_POLL, DEFAULT_OPTIONS))
+        with self.lock:
+            self.catalog = catalog
+            self.loaded_at = self.last_attempt
+
+    def polls(self):
+        """{poll_id: (option, ...)} for every known poll"""
+        if time.monotonic() - self.loaded_at > self.ttl and time.monotonic() - self.last_attempt > self.miss_interval:
+            self.reload()
+        return self.catalog
+
+    def options(self, poll_id):
+        """Options of a poll, or None if there is no such poll"""
+        options = self.polls().get(poll_id)
+        if options is None and valid_poll_id(poll_id) and time.monotonic() - self.last_attempt > self.miss_interval:
+            # Possibly created on another pod since the last reload
+            self.reload()
+            options = self.catalog.get(poll_id)
+        return options
+
+    def invalidate(self):
+        self.loaded_at = 0.0
+        self.last_attempt = 0.0
+
+class PollSnapshots:
+    """LRU of per-poll SnapshotCaches; loader(poll_id) returns the poll's summary"""
+
+    def __init__(self, loader, maxsize=1000, **cache_settings):
+        self.loader = loader
+        self.maxsize = maxsize
+        self.cache_settings = cache_settings
+        self.caches = OrderedDict()
+        self.created = 0
+        self.lock = threading.Lock()
+
+    def get(self, poll_id):
+        with self.lock:
+            cache = self.caches.get(poll_id)
+            if cache is None:
+                cache = self.caches[poll_id] = SnapshotCache(lambda: self.loader(poll_id),
+                                                             name=f'poll {poll_id}', **self.cache_settings)
+                # Versions restart with each cache; the generation tells an evicted
+                # and re-created cache apart when keying serialized responses
+                self.created += 1
+                cache.generation = self.created
+                if len(self.caches) > self.maxsize:
+                    self.caches.popitem(last=False)
+            else:
+                self.caches.move_to_end(poll_id)
+            return cache
+
+    def invalidate(self, poll_id):
+        with self.lock:
+            cache = self.caches.get(poll_id)
+        if cache is not None:
+            cache.invalidate()
+
+    def stats(self):
+        return {'cached_polls': len(self.caches), 'max_polls': self.maxsize}
@@ -0,0 +1,225 @@
+"""
+Saturation signals for autoscaling: how busy a worker is, not how hot its CPU is.
+
+The voting apps spend most of a request waiting on Postgres, Redis or the
+on-prem API, so CPU barely moves while requests queue. This module keeps,
+per worker process:
+
+  in_flight            requests currently being handled
+  worker_utilization   busy thread-seconds / available thread-seconds over
+                       the last ``window`` seconds (1.0 = every thread busy)
+  dependencies         EWMA latency, in-flight calls and error rate per
+                       dependency (fed by AdmissionController.guard or track())
+  pools                connection pool size, waiting requests and average
+                       wait per pool since the previous reading
+  queues               pending write backlog (vote journal, tiered stream)
+
+The request hooks do a lock, a counter update and at most one ring append
+per second; pools and queues are only read when /metrics/saturation is
+scraped. ``saturation`` is the highest of utilization, pool pressure and
+queue pressure, a single number to put a HorizontalPodAutoscaler target on.
+``?format=prometheus`` returns the same values in Prometheus text format.
+"""
+
+import os
+import threading
+import time
+from collections import deque
+from contextlib import contextmanager
+
+from flask import Response, jsonify, request
+
+class DependencyStats:
+    __slots__ = ('latency', 'in_flight', 'calls', 'errors', 'error_rate')
+
+    def __init__(self):
+        self.latency = None
+        self.in_flight = 0
+        self.calls = 0
+        self.errors = 0
+        self.error_rate = 0.0
+
+class Saturation:
+    def __init__(self, threads=1, window=60, alpha=0.2, queue_target=1000):
+        self.threads = threads
+        self.window = window
+        self.alpha = alpha
+        self.queue_target = queue_target
+        self.in_flight = 0
+        self.requests = 0
+        self.busy = 0.0  # integral of in_flight over time, in thread-seconds
+        self.last_change = time.monotonic()
+        self.history = deque([(self.last_change, 0.0)], maxlen=window + 1)
+        self.dependencies = {}
+        self.pools = {}
+        self.queues = {}
+        self.lock = threading.Lock()
+
+    def advance(self, now):
+        """Integrate busy time up to now; snapshot it at most once per second"""
+        self.busy += self.in_flight * (now - self.last_change)
+        self.last_change = now
+        if now - self.history[-1][0] >= 1.0:
+            self.history.append((now, self.busy))
+
+    def request_started(self):
+        with self.lock:
+            self.advance(time.monotonic())
+            self.in_flight += 1
+            self.requests += 1
+
+    def request_finished(self):
+        with self.lock:
+            self.advance(time.monotonic())
+            self.in_flight = max(0, self.in_flight - 1)
+
+    def observe(self, dependency, seconds, ok=True):
+        with self.lock:
+            stats = self.dependencies.get(dependency)
+            if stats is None:
+                stats = self.dependencies[dependency] = DependencyStats()
+            stats.latency = seconds if stats.latency is None else \
+                self.alpha * seconds + (1 - self.alpha) * stats.latency
+            stats.error_rate = self.alpha * (0.0 if ok else 1.0) + (1 - self.alpha) * stats.error_rate
+            stats.calls += 1
+            stats.errors += 0 if ok else 1
+
+    @contextmanager
+    def track(self, dependency):
+        """Time a dependency call that isn't already behind AdmissionController.guard"""
+        with self.lock:
+            stats = self.dependencies.setdefault(dependency, DependencyStats())
+            stats.in_flight += 1
+        started = time.monotonic()
+        ok = False
+        try:
+            yield
+            ok = True
+        finally:
+            with self.lock:
+                stats.in_flight -= 1
+            self.observe(dependency, time.monotonic() - started, ok)
+
+    def pool(self, name, get_stats):
+        """Register a psycopg_pool-style pool: get_stats() -> pool_size, requests_waiting, requests_wait_ms, ..."""
+        self.pools[name] = {'get_stats': get_stats, 'last': None}
+
+    def queue(self, name, depth):
+        """Register a pending-write queue: depth() -> number of items waiting"""
+        self.queues[name] = depth
+
+    def utilization(self):
+        with self.lock:
+            now = time.monotonic()
+            self.advance(now)
+            since, busy_then = self.history[0]
+            elapsed = now - since
+            return (self.busy - busy_then) / (self.threads * elapsed) if elapsed > 0 else 0.0
+
+    def pool_stats(self, name):
+        pool = self.pools[name]
+        stats = pool['get_stats']()
+        last, pool['last'] = pool['last'], stats
+        waits = stats.get('requests_num', 0) - (last or {}).get('requests_num', 0)
+        wait_ms = stats.get('requests_wait_ms', 0) - (last or {}).get('requests_wait_ms', 0)
+        size = stats.get('pool_size', 0)
+        return {
+            'size': size,
+            'max_size': stats.get('pool_max'),
+            'available': stats.get('pool_available', 0),
+            'waiting': stats.get('requests_waiting', 0),
+            'avg_wait_ms': round(wait_ms / waits, 2) if waits > 0 else 0.0,
+            'in_use': size - stats.get('pool_available', 0)
+        }
+
+    def snapshot(self):
+        utilization = self.utilization()
+        with self.lock:
+            dependencies = {name: {
+                'latency_ms': round(s.latency * 1000, 2) if s.latency is not None else None,
+                'in_flight': s.in_flight,
+                'calls': s.calls,
+                'errors': s.errors,
+                'error_rate': round(s.error_rate, 3)
+            } for name, s in self.dependencies.items()}
+            in_flight, total = self.in_flight, self.requests
+
+        pools, queues = {}, {}
+        for name in self.pools:
+            try:
+                pools[name] = self.pool_stats(name)
+            except Exception as e:
+                pools[name] = {'error': str(e)}
+        for name, depth in self.queues.items():
+            try:
+                queues[name] = depth()
+            except Exception:
+                queues[name] = None
+
+        # Each signal scaled so 1.0 means "add capacity"
+        pressure = [utilization]
+        for stats in pools.values():
+            if stats.get('max_size'):
+                pressure.append((stats['in_use'] + stats['waiting']) / stats['max_size'])
+        pressure += [depth / self.queue_target for depth in queues.values() if depth is not None]
+        return {
+            'pid': os.getpid(),
+            'saturation': round(max(pressure), 3),
+            'in_flight': in_flight,
+            'threads': self.threads,
+            'worker_utilization': round(utilization, 3),
+            'window_seconds': self.window,
+            'requests': total,
+            'dependencies': dependencies,
+            'pools': pools,
+            'queues': queues
+        }
+
+    def prometheus(self, snapshot, prefix='voting_app'):
+        pid = snapshot['pid']
+        lines = []
+
+        def metric(name, value, help_text, labels=None, kind='gauge'):
+            if value is None:
+                return
+            if not any(line.startswith(f'# HELP {prefix}_{name} ') for line in lines):
+                lines.append(f'# HELP {prefix}_{name} {help_text}')
+                lines.append(f'# TYPE {prefix}_{name} {kind}')
+            label_text = ','.join(f'{k}="{v}"' for k, v in {'pid': pid, **(labels or {})}.items())
+            lines.append(f'{prefix}_{name}{{{label_text}}} {value}')
+
+        metric('saturation', snapshot['saturation'], 'Highest of utilization, pool and queue pressure (1 = add capacity)')
+        metric('in_flight_requests', snapshot['in_flight'], 'Requests being handled by this worker')
+        metric('worker_utilization', snapshot['worker_utilization'], 'Busy share of worker threads over the window')
+        metric('requests_total', snapshot['requests'], 'Requests handled by this worker', kind='counter')
+        for name, stats in snapshot['dependencies'].items():
+            labels = {'dependency': name}
+            if stats['latency_ms'] is not None:
+                metric('dependency_latency_seconds', stats['latency_ms'] / 1000, 'EWMA latency of dependency calls', labels)
+            metric('dependency_in_flight', stats['in_flight'], 'Dependency calls in progress', labels)
+            metric('dependency_error_rate', stats['error_rate'], 'EWMA share of failed dependency calls', labels)
+        for name, stats in snapshot['pools'].items():
+            labels = {'pool': name}
+            for key in ('size', 'in_use', 'waiting'):
+                metric(f'pool_{key}', stats.get(key), f'Connection pool {key.replace("_", " ")}', labels)
+            if 'avg_wait_ms' in stats:
+                metric('pool_wait_seconds', stats['avg_wait_ms'] / 1000, 'Average wait for a pooled connection', labels)
+        for name, depth in snapshot['queues'].items():
+            metric('queue_depth', depth, 'Pending writes not yet in the system of record', {'queue': name})
+        return '\n'.join(lines) + '\n'
+
+    def init_app(self, app):
+        @app.before_request
+        def count_request():
+            self.request_started()
+
+        @app.teardown_request
+        def finish_request(exc=None):
+            self.request_finished()
+
+        @app.route('/metrics/saturation')
+        def saturation_metrics():
+            snapshot = self.snapshot()
+            if request.args.get('format') == 'prometheus':
+                return Response(self.prometheus(snapshot), mimetype='text/plain; version=0.0.4')
+            return jsonify(snapshot)
@@ -0,0 +1,81 @@
+"""
+Pre-serialized JSON responses for endpoints that are polled far more often than they change.
+
+A result poll used to rebuild its dict and run it through ``jsonify`` on
+every request. Here the payload is built and encoded once per snapshot key
+(e.g. the summary cache version), together with a gzipped copy and an ETag,
+and every later poll for the same key only wraps the cached bytes in a
+Response. Clients that send the ETag back get a bodiless 304.
+
+orjson is used when installed (several times faster than the stdlib
+encoder and emits bytes directly); otherwise json.dumps with compact
+separators.
+"""
+
+import gzip
+import hashlib
+import json
+import threading
+from collections import OrderedDict
+from decimal import Decimal
+
+from flask import Response, request
+
+try:
+    import orjson
+except ImportError:
+    orjson = None
+
+def encode_default(value):
+    return float(value) if isinstance(value, Decimal) else str(value)
+
+def dumps(payload):
+    """JSON-encode to bytes with the fastest encoder available"""
+    if orjson:
+        return orjson.dumps(payload, default=encode_default, option=orjson.OPT_NON_STR_KEYS)
+    return json.dumps(payload, separators=(',', ':'), default=encode_default).encode()
+
+class SerializedSnapshots:
+    def __init__(self, maxsize=16, min_gzip_bytes=256):
+        self.maxsize = maxsize
+        self.min_gzip_bytes = min_gzip_bytes
+        self.entries = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def entry(self, key, build):
+        with self.lock:
+            entry = self.entries.get(key)
+            if entry is not None:
+                self.entries.move_to_end(key)
+                self.hits += 1
+                return entry
+        # Concurrent misses may both serialize; the result is identical
+        body = dumps(build())
+        entry = (
+            body,
+            gzip.compress(body, 6, mtime=0) if len(body) >= self.min_gzip_bytes else None,
+            f'"{hashlib.blake2b(body, digest_size=8).hexdigest()}"'
+        )
+        with self.lock:
+            self.misses += 1
+            self.entries[key] = entry
+            if len(self.entries) > self.maxsize:
+                self.entries.popitem(last=False)
+        return entry
+
+    def response(self, key, build, status=200):
+        """Response for a snapshot key; build() -> payload is only called when the key is new"""
+        body, gzipped, etag = self.entry(key, build)
+        headers = {'ETag': etag, 'Vary': 'Accept-Encoding', 'Cache-Control': 'no-cache'}
+        if status == 200 and etag in request.headers.get('If-None-Match', ''):
+            return Response(status=304, headers=headers)
+        if gzipped is not None and 'gzip' in request.headers.get('Accept-Encoding', ''):
+            headers['Content-Encoding'] = 'gzip'
+            body = gzipped
+        return Response(body, status=status, mimetype='application/json', headers=headers)
+
+    def stats(self):
+        return {'entries': len(self.entries), 'hits': self.hits, 'misses': self.misses,
+                'encoder': 'orjson' if orjson else 'json'}
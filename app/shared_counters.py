@@ -0,0 +1,128 @@
+"""
+Vote counters shared by every worker process through a memory-mapped file.
+
+The file holds one stripe per process. Each stripe is padded to a cache line
+and is only ever written by the process that holds its byte-range lock, so
+increments need no cross-process atomics: a per-process lock serialises the
+threads of that worker, and readers sum the aligned 64-bit slots of all
+stripes. Totals survive worker restarts (a new worker inherits a free stripe
+and its counts) and can be snapshotted to disk to survive container restarts.
+"""
+
+import fcntl
+import json
+import mmap
+import os
+import struct
+import threading
+import time
+
+MAGIC = b'VOTECNT1'
+HEADER_BYTES = 64
+CACHE_LINE = 64
+
+class SharedCounters:
+    def __init__(self, path, names=('cat', 'dog'), stripes=64,
+                 snapshot_path=None, snapshot_interval=30.0):
+        self.path = path
+        self.names = list(names)
+        self.index = {name: i for i, name in enumerate(self.names)}
+        self.stripes = stripes
+        self.stripe_bytes = -(-len(self.names) * 8 // CACHE_LINE) * CACHE_LINE
+        self.size = HEADER_BYTES + self.stripes * self.stripe_bytes
+        self.snapshot_path = snapshot_path
+        self.snapshot_interval = snapshot_interval
+        self.lock = threading.Lock()
+
+        self.fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o600)
+        self.initialise()
+        self.map = mmap.mmap(self.fd, self.size)
+        self.slots = memoryview(self.map)[HEADER_BYTES:].cast('q')
+        self.stripe = self.claim_stripe()
+        self.base = self.stripe * (self.stripe_bytes // 8)
+
+    def initialise(self):
+        """Create the layout once; seed it from the last snapshot on a fresh file"""
+        fcntl.lockf(self.fd, fcntl.LOCK_EX, HEADER_BYTES, 0)
+        try:
+            header = os.pread(self.fd, HEADER_BYTES, 0)
+            if header[:8] == MAGIC:
+                names = header[16:].rstrip(b'\0').decode().split(',')
+                stripes = struct.unpack_from('<q', header, 8)[0]
+                if names != self.names or stripes != self.stripes:
+                    raise ValueError(f"{self.path} has layout {names}/{stripes}, expected {self.names}/{self.stripes}")
+                return
+
+            os.ftruncate(self.fd, self.size)
+            seed = self.load_snapshot()
+            # Snapshot totals go into the last stripe, which workers claim last
+            base = HEADER_BYTES + (self.stripes - 1) * self.stripe_bytes
+            for name, value in seed.items():
+                if name in self.index:
+                    os.pwrite(self.fd, struct.pack('<q', int(value)), base + self.index[name] * 8)
+            encoded_names = ','.join(self.names).encode()
+            if len(encoded_names) > HEADER_BYTES - 16:
+                raise ValueError("Counter names do not fit in the header")
+            os.pwrite(self.fd, MAGIC + struct.pack('<q', self.stripes) + encoded_names, 0)
+            os.fsync(self.fd)
+        finally:
+            fcntl.lockf(self.fd, fcntl.LOCK_UN, HEADER_BYTES, 0)
+
+    def claim_stripe(self):
+        """Lock a free stripe; the kernel releases it when this process exits"""
+        for stripe in range(self.stripes):
+            start = HEADER_BYTES + stripe * self.stripe_bytes
+            try:
+                fcntl.lockf(self.fd, fcntl.LOCK_EX | fcntl.LOCK_NB, self.stripe_bytes, start)
+                return stripe
+            except OSError:
+                continue
+        raise RuntimeError(f"All {self.stripes} counter stripes in {self.path} are in use")
+
+    def increment(self, name, amount=1):
+        slot = self.base + self.index[name]
+        with self.lock:
+            self.slots[slot] += amount
+
+    def get(self, name):
+        i = self.index[name]
+        step = self.stripe_bytes // 8
+        return sum(self.slots[stripe * step + i] for stripe in range(self.stripes))
+
+    def totals(self):
+        return {name: self.get(name) for name in self.names}
+
+    def load_snapshot(self):
+        if not self.snapshot_path or not os.path.exists(self.snapshot_path):
+            return {}
+        try:
+            with open(self.snapshot_path) as f:
+                return json.load(f)
+        except (OSError, ValueError) as e:
+            print(f"Ignoring unreadable counter snapshot: {e}")
+            return {}
+
+    def snapshot(self):
+        tmp_path = f'{self.snapshot_path}.tmp'
+        with open(tmp_path, 'w') as f:
+            json.dump(self.totals(), f)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp_path, self.snapshot_path)
+
+    def start_snapshots(self):
+        # Only the worker holding stripe 0 writes snapshots
+        if not self.snapshot_path or self.stripe != 0:
+            return None
+
+        def loop():
+            while True:
+                time.sleep(self.snapshot_interval)
+                try:
+                    self.snapshot()
+                except OSError as e:
+                    print(f"Counter snapshot failed: {e}")
+
+        thread = threading.Thread(target=loop, daemon=True)
+        thread.start()
+        return thread
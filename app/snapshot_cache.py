@@ -0,0 +1,87 @@
+"""
+Stale-while-revalidate snapshots for read endpoints.
+
+A read returns the cached snapshot while it is younger than ``ttl``. After
+that a single background refresh is started and the caller waits at most
+``soft_timeout`` for it: a healthy backend answers in time and the caller
+gets fresh data, a slow or failing one leaves the caller with the last good
+snapshot, flagged stale with its age. Only the very first load, when there
+is nothing to fall back to, waits longer for the backend, and even that is
+capped at ``first_load_timeout``.
+"""
+
+import threading
+import time
+
+class SnapshotCache:
+    def __init__(self, loader, ttl=0.5, soft_timeout=0.2, first_load_timeout=2.0, name='snapshot'):
+        self.loader = loader
+        self.ttl = ttl
+        self.soft_timeout = soft_timeout
+        self.first_load_timeout = first_load_timeout
+        self.name = name
+        self.value = None
+        self.version = 0  # bumped whenever the value changes, e.g. to key serialized responses
+        self.loaded_at = 0.0
+        self.fresh_until = 0.0
+        self.last_error = None
+        self.refreshing = None
+        self.lock = threading.Lock()
+
+    def refresh(self, done):
+        try:
+            value = self.loader()
+            with self.lock:
+                self.version += value != self.value
+                self.value = value
+                self.loaded_at = time.monotonic()
+                self.fresh_until = self.loaded_at + self.ttl
+                self.last_error = None
+        except Exception as e:
+            print(f"Revalidating {self.name} failed: {e}")
+            with self.lock:
+                self.last_error = e
+        finally:
+            with self.lock:
+                self.refreshing = None
+            done.set()
+
+    def get(self):
+        """Return (value, stale, age_seconds); raises only if nothing was ever loaded in time"""
+        return self.get_versioned()[:3]
+
+    def get_versioned(self):
+        """get() plus the version of the returned value"""
+        with self.lock:
+            now = time.monotonic()
+            if self.value is not None and now < self.fresh_until:
+                return self.value, False, now - self.loaded_at, self.version
+            done = self.refreshing
+            if done is None:
+                done = self.refreshing = threading.Event()
+                threading.Thread(target=self.refresh, args=(done,), daemon=True).start()
+            have_value = self.value is not None
+
+        finished = done.wait(self.soft_timeout if have_value else self.first_load_timeout)
+
+        with self.lock:
+            if self.value is None:
+                if not finished:
+                    raise TimeoutError(f"{self.name} did not load within {self.first_load_timeout}s")
+                raise self.last_error or TimeoutError(f"{self.name} is not available yet")
+            now = time.monotonic()
+            return self.value, now >= self.fresh_until, now - self.loaded_at, self.version
+
+    def put(self, value):
+        """Store a value obtained elsewhere, e.g. a summary read piggybacked on a write"""
+        with self.lock:
+            self.version += value != self.value
+            self.value = value
+            self.loaded_at = time.monotonic()
+            self.fresh_until = self.loaded_at + self.ttl
+            self.last_error = None
+
+    def invalidate(self):
+        """Force the next read to revalidate, e.g. after a local write"""
+        with self.lock:
+            self.fresh_until = 0.0
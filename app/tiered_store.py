@@ -0,0 +1,249 @@
+"""
+Tiered vote storage: Redis counters for the hot path, Postgres for the record.
+
+A vote increments its Redis counters and appends the full record to a Redis
+Stream in one MULTI block, so totals are read-your-write immediately. A
+consumer group drains the stream into the Postgres ``votes`` table in
+batches; the stream entry id is stored with each row so a redelivered entry
+is never inserted twice. A reconciler periodically compares the counters with
+Postgres aggregates while the stream is drained and repairs any drift.
+Counters are kept per poll (see polls.counter_key).
+"""
+
+import os
+import socket
+import threading
+import time
+
+from polls import DEFAULT_OPTIONS, DEFAULT_POLL, counter_key
+
+SUMMARY_QUERY = """
+    SELECT poll_id, vote_choice, vote_source, COUNT(*)
+    FROM votes_expanded
+    GROUP BY poll_id, vote_choice, vote_source
+"""
+
+class TieredVoteStore:
+    def __init__(self, redis_client, connect, polls=None, sources=('azure', 'onprem'),
+                 stream_key='votes:stream', group='vote-writers', batch_size=500, metadata=None, ids=None):
+        self.redis = redis_client
+        self.connect = connect
+        self.metadata = metadata
+        # Gives entries queued before records carried a vote id one (see vote_ids)
+        self.ids = ids
+        # polls() -> {poll_id: options}, e.g. PollCatalog.polls
+        self.polls = polls or (lambda: {DEFAULT_POLL: DEFAULT_OPTIONS})
+        self.sources = list(sources)
+        self.stream_key = stream_key
+        self.group = group
+        self.consumer = f'{socket.gethostname()}-{os.getpid()}'
+        self.batch_size = batch_size
+        self.last_drift = {}
+
+    def poll_keys(self, poll_id, options):
+        keys = [counter_key(poll_id, option) for option in options]
+        keys += [counter_key(poll_id, option, source) for source in self.sources for option in options]
+        return keys
+
+    def counter_keys(self):
+        return [key for poll_id, options in self.polls().items() for key in self.poll_keys(poll_id, options)]
+
+    def ensure_group(self):
+        try:
+            self.redis.xgroup_create(self.stream_key, self.group, id='0', mkstream=True)
+        except Exception as e:
+            if 'BUSYGROUP' not in str(e):
+                raise
+
+    def seed_counters(self):
+        """Initialise missing counters from Postgres so totals include pre-existing votes"""
+        counts = self.postgres_counts()
+        pipe = self.redis.pipeline(transaction=False)
+        for key in self.counter_keys():
+            pipe.setnx(key, counts.get(key, 0))
+        pipe.execute()
+
+    def record_vote(self, record):
+        """Count a vote in Redis and queue the full record for Postgres"""
+        poll_id = record.get('poll_id', DEFAULT_POLL)
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.incr(counter_key(poll_id, record['choice']))
+        pipe.incr(counter_key(poll_id, record['choice'], record['source']))
+        pipe.xadd(self.stream_key, {k: '' if v is None else str(v) for k, v in record.items()})
+        pipe.execute()
+
+    def record_votes(self, records):
+        """Count a batch of votes with one INCRBY per key in a single MULTI"""
+        increments = {}
+        for record in records:
+            poll_id = record.get('poll_id', DEFAULT_POLL)
+            for key in (counter_key(poll_id, record['choice']),
+                        counter_key(poll_id, record['choice'], record['source'])):
+                increments[key] = increments.get(key, 0) + 1
+        pipe = self.redis.pipeline(transaction=True)
+        for key, amount in increments.items():
+            pipe.incrby(key, amount)
+        for record in records:
+            pipe.xadd(self.stream_key, {k: '' if v is None else str(v) for k, v in record.items()})
+        pipe.execute()
+
+    def get_summary(self, poll_id=DEFAULT_POLL, options=None):
+        """Rows shaped like the vote_summary view: (choice, total, azure, onprem, percentage)"""
+        options = options or self.polls().get(poll_id, ())
+        keys = self.poll_keys(poll_id, options)
+        counts = dict(zip(keys, [int(v or 0) for v in self.redis.mget(keys)])) if keys else {}
+        grand_total = sum(counts[counter_key(poll_id, option)] for option in options)
+
+        rows = []
+        for option in sorted(options):
+            total = counts[counter_key(poll_id, option)]
+            if not total:
+                continue
+            rows.append((
+                option,
+                total,
+                counts.get(counter_key(poll_id, option, 'azure'), 0),
+                counts.get(counter_key(poll_id, option, 'onprem'), 0),
+                round(total * 100.0 / grand_total, 2)
+            ))
+        return rows
+
+    def write_batch(self, entries):
+        from psycopg2.extras import execute_values
+
+        vote_ids = [int(f['id']) if f.get('id') else self.ids.next() for _, f in entries]
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            if self.metadata:
+                # Compact layout: lookup ids instead of the repeated text columns
+                ids = self.metadata.encode([f for _, f in entries], self.metadata.connection_query(conn))
+                execute_values(cursor, '''
+                    INSERT INTO votes (id, vote_choice, source_id, timestamp, ip_address, user_agent_id, session_id,
+                                       abuse_flag, stream_id, poll_id)
+                    VALUES %s
+                    ON CONFLICT (stream_id) DO NOTHING
+                ''', [
+                    (vote_id, f['choice'], source_id, f['timestamp'], f.get('ip') or None,
+                     user_agent_id, f.get('session_id') or None, f.get('abuse_flag') or None, entry_id,
+                     f.get('poll_id') or DEFAULT_POLL)
+                    for vote_id, (entry_id, f), (source_id, user_agent_id) in zip(vote_ids, entries, ids)
+                ])
+            else:
+                execute_values(cursor, '''
+                    INSERT INTO votes (id, vote_choice, vote_source, timestamp, ip_address, user_agent, session_id,
+                                       abuse_flag, stream_id, poll_id)
+                    VALUES %s
+                    ON CONFLICT (stream_id) DO NOTHING
+                ''', [
+                    (vote_id, f['choice'], f['source'], f['timestamp'], f.get('ip') or None,
+                     f.get('user_agent'), f.get('session_id') or None, f.get('abuse_flag') or None, entry_id,
+                     f.get('poll_id') or DEFAULT_POLL)
+                    for vote_id, (entry_id, f) in zip(vote_ids, entries)
+                ])
+            conn.commit()
+        finally:
+            conn.close()
+
+    def drain_once(self, block_ms=1000):
+        """Move one batch from the stream to Postgres; returns the number written"""
+        # Reclaim entries a crashed consumer left pending, then read new ones
+        claimed = self.redis.xautoclaim(self.stream_key, self.group, self.consumer,
+                                        min_idle_time=30000, start_id='0-0',
+                                        count=self.batch_size)
+        entries = claimed[1] if claimed else []
+        if not entries:
+            response = self.redis.xreadgroup(self.group, self.consumer, {self.stream_key: '>'},
+                                             count=self.batch_size, block=block_ms)
+            entries = response[0][1] if response else []
+        entries = [(entry_id, fields) for entry_id, fields in entries if fields]
+        if not entries:
+            return 0
+
+        self.write_batch(entries)
+        ids = [entry_id for entry_id, _ in entries]
+        pipe = self.redis.pipeline(transaction=True)
+        pipe.xack(self.stream_key, self.group, *ids)
+        pipe.xdel(self.stream_key, *ids)
+        pipe.execute()
+        return len(entries)
+
+    def postgres_counts(self):
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute(SUMMARY_QUERY)
+            counts = {}
+            for poll_id, choice, source, count in cursor.fetchall():
+                total_key = counter_key(poll_id, choice)
+                counts[total_key] = counts.get(total_key, 0) + count
+                counts[counter_key(poll_id, choice, source)] = count
+            cursor.close()
+            return counts
+        finally:
+            conn.close()
+
+    def stream_drained(self):
+        stream = self.redis.xinfo_stream(self.stream_key)
+        for group in self.redis.xinfo_groups(self.stream_key):
+            if group['name'] == self.group:
+                return (group['pending'] == 0
+                        and group['last-delivered-id'] == stream['last-generated-id'])
+        return stream['length'] == 0
+
+    def reconcile(self, repair=True):
+        """Compare Redis counters with Postgres and optionally repair drift.
+
+        Runs only while the stream is fully drained; the counters are WATCHed
+        so a vote arriving mid-check aborts the repair until the next round.
+        """
+        keys = self.counter_keys()
+        with self.redis.pipeline(transaction=True) as pipe:
+            pipe.watch(*keys)
+            if not self.stream_drained():
+                return None
+            hot = dict(zip(keys, [int(v or 0) for v in pipe.mget(keys)]))
+            durable = self.postgres_counts()
+            drift = {key: hot[key] - durable.get(key, 0)
+                     for key in keys if hot[key] != durable.get(key, 0)}
+            self.last_drift = drift
+            if drift and repair:
+                pipe.multi()
+                for key in drift:
+                    pipe.set(key, durable.get(key, 0))
+                try:
+                    pipe.execute()
+                    print(f"Reconciled Redis counters with Postgres: {drift}")
+                except Exception as e:
+                    print(f"Reconciliation retried next round: {e}")
+            return drift
+
+    def start(self, reconcile_interval=60.0, repair=True):
+        self.ensure_group()
+
+        def consume():
+            while True:
+                try:
+                    self.drain_once()
+                except Exception as e:
+                    print(f"Vote stream consumer error: {e}")
+                    time.sleep(1)
+
+        def reconcile_loop():
+            while True:
+                time.sleep(reconcile_interval)
+                try:
+                    self.reconcile(repair)
+                except Exception as e:
+                    print(f"Reconciliation error: {e}")
+
+        threading.Thread(target=consume, daemon=True).start()
+        if reconcile_interval > 0:
+            threading.Thread(target=reconcile_loop, daemon=True).start()
+
+    def status(self):
+        try:
+            pending = self.redis.xlen(self.stream_key)
+        except Exception:
+            pending = None
+        return {'mode': 'tiered', 'stream_backlog': pending, 'last_drift': self.last_drift}
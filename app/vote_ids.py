@@ -0,0 +1,70 @@
+"""
+Time-ordered 64-bit vote ids generated in-process (Snowflake layout).
+
+    | 41 bits: ms since EPOCH_MS | 3 bits: site | 7 bits: worker | 12 bits: sequence |
+
+Ids fit the BIGINT primary key and sort by creation time. They need no
+sequence round-trip, so batches go out in a single COPY/INSERT, and a time
+range is an id range on the primary key index. Azure and
+on-premises databases write disjoint site bits, so their rows merge without
+remapping.
+
+Each process needs a worker number no other live writer of the same site
+uses: set VOTE_ID_WORKER (0-126), e.g. from a StatefulSet ordinal. There is
+no fallback: two processes sharing a worker hand out the same ids, which the
+primary key then refuses, so from_env fails at startup instead of guessing.
+Worker 127 of site 7 belongs to the database's own vote_id() default
+(migration 8), used by writers that don't supply an id.
+
+Rows from before migration 8 keep their small SERIAL ids, which sort before
+every generated id, so keyset batches over ``id`` (metadata_dictionary.backfill)
+still walk the table in insertion order.
+"""
+
+import os
+import threading
+import time
+
+EPOCH_MS = 1_704_067_200_000  # 2024-01-01T00:00:00Z
+SITE_BITS = 3
+WORKER_BITS = 7
+SEQUENCE_BITS = 12
+MAX_WORKER = (1 << WORKER_BITS) - 2  # the last worker is reserved for the database default
+SEQUENCE_MASK = (1 << SEQUENCE_BITS) - 1
+
+SITES = {'onprem': 0, 'azure': 1}
+
+class VoteIdGenerator:
+    def __init__(self, site, worker):
+        if not 0 <= site < (1 << SITE_BITS) or not 0 <= worker <= MAX_WORKER:
+            raise ValueError(f"Vote id site must be 0-{(1 << SITE_BITS) - 1} and worker 0-{MAX_WORKER}")
+        self.site = site
+        self.worker = worker
+        self.node = (site << WORKER_BITS | worker) << SEQUENCE_BITS
+        self.last_ms = 0
+        self.sequence = 0
+        self.lock = threading.Lock()
+
+    @classmethod
+    def from_env(cls, source):
+        """Site from VOTE_ID_SITE or the vote source, worker from VOTE_ID_WORKER (required)"""
+        worker = os.getenv('VOTE_ID_WORKER', '')
+        if not worker.strip().isdigit():
+            raise ValueError(f"VOTE_ID_WORKER must be set to this process's own worker number "
+                             f"(0-{MAX_WORKER}), got {worker!r}")
+        return cls(site=int(os.getenv('VOTE_ID_SITE', SITES.get(source, 0))), worker=int(worker))
+
+    def next(self):
+        with self.lock:
+            # A clock that steps back keeps counting from the last millisecond
+            now = max(int(time.time() * 1000) - EPOCH_MS, self.last_ms)
+            if now > self.last_ms:
+                self.last_ms = now
+                self.sequence = 0
+            elif self.sequence < SEQUENCE_MASK:
+                self.sequence += 1
+            else:
+                # Sequence exhausted within one millisecond: borrow the next one
+                self.last_ms += 1
+                self.sequence = 0
+            return self.last_ms << (SITE_BITS + WORKER_BITS + SEQUENCE_BITS) | self.node | self.sequence
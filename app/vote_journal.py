@@ -0,0 +1,376 @@
+"""
+Durable local journal for votes that could not reach the primary store.
+
+Votes are appended to segment files as ``<offset> <crc32> <json>`` lines and
+made durable with group-committed fsyncs, so an outage of Postgres or Redis
+does not lose votes and a single fsync covers every vote that arrived in the
+same flush window. A background replayer pushes journaled votes to the
+store in bulk once it recovers. The store records the last replayed offset in
+the same transaction as the votes, which makes replay exactly-once across
+crashes and restarts. A record the store refuses outright (bad data rather
+than an outage) is moved to the slot's quarantine file so it can't hold up
+the rest of the backlog.
+"""
+
+import fcntl
+import json
+import mmap
+import os
+import socket
+import threading
+import time
+import zlib
+
+from polls import DEFAULT_POLL, counter_key
+
+SEGMENT_SUFFIX = '.log'
+QUARANTINE_FILE = 'quarantine.rejected'
+
+def encode_record(offset, record):
+    payload = json.dumps(record, separators=(',', ':'))
+    return f"{offset} {zlib.crc32(payload.encode()):08x} {payload}\n".encode()
+
+def decode_record(line):
+    """Return (offset, record) or None for a torn or corrupt line"""
+    try:
+        offset, crc, payload = line.rstrip(b'\n').split(b' ', 2)
+        if not line.endswith(b'\n') or int(crc, 16) != zlib.crc32(payload):
+            return None
+        return int(offset), json.loads(payload)
+    except ValueError:
+        return None
+
+class VoteJournal:
+    def __init__(self, directory, journal_id=None, segment_bytes=16 * 1024 * 1024,
+                 fsync_interval=0.005, fsync_batch=256, use_mmap=False):
+        self.segment_bytes = segment_bytes
+        self.fsync_interval = fsync_interval
+        self.fsync_batch = fsync_batch
+        self.use_mmap = use_mmap
+
+        self.directory, slot = self.claim_slot(directory)
+        self.journal_id = self.load_journal_id(f"{journal_id or socket.gethostname()}-{slot}")
+
+        self.lock = threading.Lock()
+        self.cond = threading.Condition(self.lock)
+        self.pending = 0
+        self.closed = False
+        self.replayed_offset = 0
+        self.quarantined = 0
+
+        self.recover()
+        self.durable_offset = self.next_offset - 1
+
+        self.flusher = threading.Thread(target=self.flush_loop, daemon=True)
+        self.flusher.start()
+
+    def claim_slot(self, directory):
+        """Take an exclusive per-process slot so several workers can share one volume"""
+        slot = 0
+        while True:
+            path = os.path.join(directory, f'slot-{slot}')
+            os.makedirs(path, exist_ok=True)
+            lock_file = open(os.path.join(path, 'lock'), 'w')
+            try:
+                fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except OSError:
+                lock_file.close()
+                slot += 1
+                continue
+            self.lock_file = lock_file
+            return path, slot
+
+    def load_journal_id(self, default):
+        """Reuse the id this slot was created with, so replay offsets survive pod restarts.
+
+        The hostname of a Deployment pod changes on every restart; keying the
+        store's offset by it would replay already-applied votes under a new id.
+        """
+        path = os.path.join(self.directory, 'journal-id')
+        try:
+            with open(path) as f:
+                stored = f.read().strip()
+            if stored:
+                return stored
+        except FileNotFoundError:
+            pass
+        tmp = path + '.tmp'
+        with open(tmp, 'w') as f:
+            f.write(default)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, path)
+        dir_fd = os.open(self.directory, os.O_RDONLY)
+        try:
+            os.fsync(dir_fd)
+        finally:
+            os.close(dir_fd)
+        return default
+
+    def segments(self):
+        names = [n for n in os.listdir(self.directory) if n.endswith(SEGMENT_SUFFIX)]
+        return sorted(os.path.join(self.directory, n) for n in names)
+
+    def segment_path(self, first_offset):
+        return os.path.join(self.directory, f'{first_offset:020d}{SEGMENT_SUFFIX}')
+
+    def recover(self):
+        """Find the next offset and cut off any torn record left by a crash"""
+        segments = self.segments()
+        self.next_offset = 1
+        if segments:
+            path = segments[-1]
+            self.next_offset = int(os.path.basename(path)[:-len(SEGMENT_SUFFIX)])
+            valid_bytes = 0
+            with open(path, 'rb') as f:
+                for line in f:
+                    entry = decode_record(line)
+                    if entry is None or entry[0] != self.next_offset:
+                        break
+                    valid_bytes += len(line)
+                    self.next_offset += 1
+            with open(path, 'r+b') as f:
+                f.truncate(valid_bytes)
+            self.file = open(path, 'ab')
+        else:
+            self.file = open(self.segment_path(self.next_offset), 'ab')
+
+    def append(self, record, wait=True):
+        """Journal one vote; with wait=True return only after it has been fsynced"""
+        with self.cond:
+            offset = self.next_offset
+            self.file.write(encode_record(offset, record))
+            self.next_offset += 1
+            self.pending += 1
+            if self.file.tell() >= self.segment_bytes:
+                self.sync_locked()
+                self.file.close()
+                self.file = open(self.segment_path(self.next_offset), 'ab')
+            elif self.pending >= self.fsync_batch:
+                self.cond.notify_all()
+
+            if wait:
+                while self.durable_offset < offset and not self.closed:
+                    self.cond.wait()
+        return offset
+
+    def sync_locked(self):
+        if self.pending:
+            self.file.flush()
+            os.fsync(self.file.fileno())
+            self.pending = 0
+            self.durable_offset = self.next_offset - 1
+            self.cond.notify_all()
+
+    def flush_loop(self):
+        while True:
+            with self.cond:
+                if self.closed:
+                    return
+                if self.pending < self.fsync_batch:
+                    self.cond.wait(self.fsync_interval)
+                try:
+                    self.sync_locked()
+                except OSError as e:
+                    print(f"Vote journal fsync error: {e}")
+
+    def read_lines(self, path):
+        with open(path, 'rb') as f:
+            if self.use_mmap and os.fstat(f.fileno()).st_size:
+                with mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mm:
+                    for line in iter(mm.readline, b''):
+                        yield line
+            else:
+                yield from f
+
+    def read_batches(self, start_offset, batch_size):
+        """Yield lists of (offset, record) for durable records at or after start_offset"""
+        last_offset = self.durable_offset
+        segments = self.segments()
+        batch = []
+        for index, path in enumerate(segments):
+            # Skip segments that end before start_offset
+            if index + 1 < len(segments):
+                next_first = int(os.path.basename(segments[index + 1])[:-len(SEGMENT_SUFFIX)])
+                if next_first <= start_offset:
+                    continue
+            for line in self.read_lines(path):
+                entry = decode_record(line)
+                if entry is None or entry[0] > last_offset:
+                    break
+                if entry[0] < start_offset:
+                    continue
+                batch.append(entry)
+                if len(batch) >= batch_size:
+                    yield batch
+                    batch = []
+        if batch:
+            yield batch
+
+    def release(self, offset):
+        """Delete segments whose records have all been replayed"""
+        with self.lock:
+            current = self.file.name
+            segments = self.segments()
+            for index, path in enumerate(segments[:-1]):
+                next_first = int(os.path.basename(segments[index + 1])[:-len(SEGMENT_SUFFIX)])
+                if next_first - 1 <= offset and path != current:
+                    os.remove(path)
+
+    def replay(self, sink, batch_size=500):
+        """Push un-replayed votes to the sink; returns the number replayed"""
+        committed = sink.committed_offset(self.journal_id)
+        replayed = 0
+        for batch in self.read_batches(committed + 1, batch_size):
+            last_offset = batch[-1][0]
+            try:
+                sink.apply(self.journal_id, [record for _, record in batch], last_offset)
+            except Exception as e:
+                if not sink.rejects(e):
+                    raise
+                self.apply_each(sink, batch)
+            committed = last_offset
+            replayed += len(batch)
+        self.replayed_offset = committed
+        self.release(committed)
+        return replayed
+
+    def apply_each(self, sink, batch):
+        """Apply a refused batch record by record, quarantining the ones the sink rejects"""
+        for offset, record in batch:
+            try:
+                sink.apply(self.journal_id, [record], offset)
+            except Exception as e:
+                if not sink.rejects(e):
+                    raise
+                self.quarantine(offset, record, e)
+                # Skip it: advance the committed offset past the record
+                sink.apply(self.journal_id, [], offset)
+
+    def quarantine(self, offset, record, error):
+        """Keep a rejected record for inspection, durably, before replay moves past it"""
+        with open(os.path.join(self.directory, QUARANTINE_FILE), 'ab') as f:
+            f.write(encode_record(offset, {'record': record, 'error': str(error)}))
+            f.flush()
+            os.fsync(f.fileno())
+        self.quarantined += 1
+        print(f"Quarantined journaled vote {offset} the store rejected: {error}")
+
+    def backlog(self):
+        return max(0, self.durable_offset - self.replayed_offset)
+
+    def start_replayer(self, sink, interval=5.0, batch_size=500):
+        def loop():
+            while not self.closed:
+                if self.durable_offset > self.replayed_offset:
+                    try:
+                        replayed = self.replay(sink, batch_size)
+                        if replayed:
+                            print(f"Replayed {replayed} journaled votes")
+                    except Exception as e:
+                        print(f"Vote journal replay deferred: {e}")
+                time.sleep(interval)
+
+        thread = threading.Thread(target=loop, daemon=True)
+        thread.start()
+        return thread
+
+    def close(self):
+        with self.cond:
+            self.sync_locked()
+            self.closed = True
+            self.cond.notify_all()
+            self.file.close()
+        self.lock_file.close()
+
+class PostgresJournalSink:
+    """Bulk-inserts journaled votes and advances the offset in one transaction"""
+
+    def __init__(self, connect, metadata=None, ids=None):
+        self.connect = connect
+        self.metadata = metadata
+        # Records journaled before vote ids were generated in-process get one here
+        self.ids = ids
+
+    def committed_offset(self, journal_id):
+        # vote_journal_offsets comes from migration 2
+        conn = self.connect()
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT last_offset FROM vote_journal_offsets WHERE journal_id = %s",
+                           (journal_id,))
+            row = cursor.fetchone()
+            conn.commit()
+            return row[0] if row else 0
+        finally:
+            conn.close()
+
+    def rejects(self, error):
+        """True for errors about the records themselves, which no retry will fix"""
+        import psycopg2
+        return isinstance(error, (psycopg2.DataError, psycopg2.IntegrityError, KeyError, TypeError, ValueError))
+
+    def apply(self, journal_id, records, last_offset):
+        from psycopg2.extras import execute_values
+
+        vote_ids = [r.get('id') or self.ids.next() for r in records]
+        conn = self.connect()
+        try:
+            if not records:
+                cursor = conn.cursor()
+            elif self.metadata:
+                # Compact layout (see metadata_dictionary): lookup ids instead of text
+                ids = self.metadata.encode(records, self.metadata.connection_query(conn))
+                cursor = conn.cursor()
+                execute_values(
+                    cursor,
+                    "INSERT INTO votes (id, vote_choice, source_id, timestamp, ip_address, user_agent_id, session_id, "
+                    "abuse_flag, poll_id) VALUES %s ON CONFLICT (id) DO NOTHING",
+                    [(vote_id, r['choice'], source_id, r['timestamp'], r.get('ip'), user_agent_id, r.get('session_id'),
+                      r.get('abuse_flag'), r.get('poll_id', DEFAULT_POLL))
+                     for vote_id, r, (source_id, user_agent_id) in zip(vote_ids, records, ids)]
+                )
+            else:
+                cursor = conn.cursor()
+                execute_values(
+                    cursor,
+                    "INSERT INTO votes (id, vote_choice, vote_source, timestamp, ip_address, user_agent, session_id, "
+                    "abuse_flag, poll_id) VALUES %s ON CONFLICT (id) DO NOTHING",
+                    [(vote_id, r['choice'], r['source'], r['timestamp'], r.get('ip'), r.get('user_agent'),
+                      r.get('session_id'), r.get('abuse_flag'), r.get('poll_id', DEFAULT_POLL))
+                     for vote_id, r in zip(vote_ids, records)]
+                )
+            cursor.execute('''
+                INSERT INTO vote_journal_offsets (journal_id, last_offset) VALUES (%s, %s)
+                ON CONFLICT (journal_id) DO UPDATE SET last_offset = EXCLUDED.last_offset
+            ''', (journal_id, last_offset))
+            conn.commit()
+        finally:
+            conn.close()
+
+class RedisJournalSink:
+    """Adds journaled votes to the Redis counters and advances the offset atomically"""
+
+    def __init__(self, client):
+        self.client = client
+
+    def offset_key(self, journal_id):
+        return f'journal:{journal_id}:offset'
+
+    def committed_offset(self, journal_id):
+        return int(self.client.get(self.offset_key(journal_id)) or 0)
+
+    def rejects(self, error):
+        return isinstance(error, (KeyError, TypeError, ValueError))
+
+    def apply(self, journal_id, records, last_offset):
+        counts = {}
+        for record in records:
+            key = counter_key(record.get('poll_id', DEFAULT_POLL), record['choice'])
+            counts[key] = counts.get(key, 0) + 1
+
+        pipe = self.client.pipeline(transaction=True)
+        for key, count in counts.items():
+            pipe.incrby(key, count)
+        pipe.set(self.offset_key(journal_id), last_offset)
+        pipe.execute()
@@ -0,0 +1,263 @@
+"""
+Streaming distinct-voter and heavy-hitter estimates in bounded memory.
+
+Every accepted vote updates a handful of fixed-size sketches instead of
+being counted from the ``votes`` table later:
+
+  HyperLogLog       distinct voters (ip + user agent) overall, per choice,
+                    per source and per time bucket; 4 KiB each, ~1.6% error
+  Count-Min Sketch  approximate vote counts per IP / user agent
+  Space-Saving      the top-K IPs and user agents, ranked by the CMS counts
+
+One 64-bit hash per value feeds every sketch. All sketches merge by
+register max / counter sum, so per-pod sketches can be exported with
+``to_dict()`` and combined with ``merge()`` across pods or environments.
+With a Redis client the distinct-voter counts are kept in Redis with
+``PFADD`` instead, so every pod sharing that Redis contributes to the same
+estimates; the bucket window is combined with ``PFMERGE``.
+"""
+
+import base64
+import hashlib
+import threading
+import time
+from array import array
+from datetime import datetime
+
+def hash64(value):
+    return int.from_bytes(hashlib.blake2b(value.encode(), digest_size=8).digest(), 'big')
+
+class HyperLogLog:
+    def __init__(self, p=12):
+        self.p = p
+        self.m = 1 << p
+        self.registers = bytearray(self.m)
+
+    def add_hash(self, h):
+        index = h >> (64 - self.p)
+        rest = (h << self.p) & 0xFFFFFFFFFFFFFFFF
+        rank = 65 - rest.bit_length() if rest else 65 - self.p
+        if rank > self.registers[index]:
+            self.registers[index] = rank
+
+    def count(self):
+        m = self.m
+        alpha = 0.7213 / (1 + 1.079 / m)
+        estimate = alpha * m * m / sum(2.0 ** -r for r in self.registers)
+        zeros = self.registers.count(0)
+        if estimate <= 2.5 * m and zeros:
+            # Small-range correction: linear counting
+            from math import log
+            estimate = m * log(m / zeros)
+        return int(round(estimate))
+
+    def merge(self, other):
+        self.registers = bytearray(max(a, b) for a, b in zip(self.registers, other.registers))
+
+class CountMinSketch:
+    def __init__(self, width=2048, depth=4):
+        self.width = width
+        self.depth = depth
+        self.table = array('I', bytes(4 * width * depth))
+
+    def cells(self, h):
+        # Double hashing: depth indexes derived from the two halves of one hash
+        h1, h2 = h & 0xFFFFFFFF, (h >> 32) | 1
+        return [row * self.width + (h1 + row * h2) % self.width for row in range(self.depth)]
+
+    def add_hash(self, h, amount=1):
+        cells = self.cells(h)
+        for cell in cells:
+            self.table[cell] += amount
+        return min(self.table[cell] for cell in cells)
+
+    def estimate_hash(self, h):
+        return min(self.table[cell] for cell in self.cells(h))
+
+    def merge(self, other):
+        for i, value in enumerate(other.table):
+            self.table[i] += value
+
+class HeavyHitters:
+    """Space-Saving candidate set of size k, counted with a Count-Min Sketch"""
+
+    def __init__(self, k=20, width=2048, depth=4):
+        self.k = k
+        self.sketch = CountMinSketch(width, depth)
+        self.top = {}
+
+    def add(self, key, h=None, amount=1):
+        count = self.sketch.add_hash(hash64(key) if h is None else h, amount)
+        if key in self.top or len(self.top) < self.k:
+            self.top[key] = count
+            return
+        coldest = min(self.top, key=self.top.get)
+        if count > self.top[coldest]:
+            del self.top[coldest]
+            self.top[key] = count
+
+    def items(self):
+        return sorted(self.top.items(), key=lambda item: -item[1])
+
+    def merge(self, other):
+        self.sketch.merge(other.sketch)
+        for key in set(self.top) | set(other.top):
+            self.top[key] = self.sketch.estimate_hash(hash64(key))
+        self.top = dict(self.items()[:self.k])
+
+class VoterAnalytics:
+    def __init__(self, bucket_seconds=3600, buckets=24, k=20, max_keys=256,
+                 redis_client=None, prefix='voters'):
+        self.bucket_seconds = bucket_seconds
+        self.buckets = buckets
+        self.k = k
+        self.max_keys = max_keys
+        self.redis = redis_client
+        self.prefix = prefix
+        self.distinct = {}
+        self.ips = HeavyHitters(k)
+        self.user_agents = HeavyHitters(k)
+        self.votes = 0
+        self.current_bucket = None
+        self.lock = threading.Lock()
+
+    def bucket_start(self, timestamp):
+        return int(timestamp // self.bucket_seconds * self.bucket_seconds)
+
+    def distinct_keys(self, choice, source, timestamp):
+        return ['all', f'choice:{choice}', f'source:{source}',
+                f'bucket:{self.bucket_start(timestamp)}']
+
+    def observe(self, choice, source, ip, user_agent, timestamp=None):
+        """Record one accepted vote; never raises into the vote path"""
+        try:
+            timestamp = time.time() if timestamp is None else timestamp
+            ip = ip or ''
+            user_agent = user_agent or ''
+            voter = hash64(f'{ip}|{user_agent}')
+            keys = self.distinct_keys(choice, source, timestamp)
+            with self.lock:
+                self.votes += 1
+                self.ips.add(ip)
+                self.user_agents.add(user_agent)
+                if not self.redis:
+                    for key in keys:
+                        self.sketch_for(key).add_hash(voter)
+                    if keys[-1] != self.current_bucket:
+                        self.current_bucket = keys[-1]
+                        self.expire_buckets(timestamp)
+            if self.redis:
+                member = f'{voter:016x}'
+                pipe = self.redis.pipeline(transaction=False)
+                for key in keys:
+                    pipe.pfadd(f'{self.prefix}:hll:{key}', member)
+                pipe.expire(f'{self.prefix}:hll:{keys[-1]}', self.bucket_seconds * (self.buckets + 1))
+                pipe.execute()
+        except Exception as e:
+            print(f"Voter analytics update failed: {e}")
+
+    def observe_records(self, records):
+        """Record vote dicts (choice, source, ip, user_agent, ISO timestamp) from a batch"""
+        for record in records:
+            try:
+                timestamp = datetime.fromisoformat(str(record['timestamp']).replace('Z', '+00:00')).timestamp()
+            except (KeyError, ValueError):
+                timestamp = None
+            self.observe(record['choice'], record.get('source'), record.get('ip'),
+                         record.get('user_agent'), timestamp)
+
+    def sketch_for(self, key):
+        sketch = self.distinct.get(key)
+        if sketch is None:
+            if len(self.distinct) >= self.max_keys + self.buckets:
+                # Bounded memory: unknown keys beyond the cap share one sketch
+                key = 'overflow'
+                sketch = self.distinct.get(key)
+            if sketch is None:
+                sketch = self.distinct[key] = HyperLogLog()
+        return sketch
+
+    def expire_buckets(self, now):
+        oldest = self.bucket_start(now) - (self.buckets - 1) * self.bucket_seconds
+        for key in [k for k in self.distinct if k.startswith('bucket:') and int(k[7:]) < oldest]:
+            del self.distinct[key]
+
+    def bucket_keys(self, now):
+        start = self.bucket_start(now)
+        return [f'bucket:{start - i * self.bucket_seconds}' for i in range(self.buckets)]
+
+    def distinct_counts(self):
+        now = time.time()
+        if self.redis:
+            hll_keys = [k for k in self.redis.scan_iter(f'{self.prefix}:hll:*')
+                        if not k.endswith(':window')]
+            counts = {k[len(self.prefix) + 5:]: self.redis.pfcount(k) for k in hll_keys}
+            # PFMERGE folds the destination's old registers in too, so start from empty
+            window_key = f'{self.prefix}:hll:window'
+            pipe = self.redis.pipeline(transaction=True)
+            pipe.delete(window_key)
+            pipe.pfmerge(window_key, *[f'{self.prefix}:hll:{k}' for k in self.bucket_keys(now)])
+            pipe.pfcount(window_key)
+            counts['window'] = pipe.execute()[-1]
+            return counts
+
+        with self.lock:
+            self.expire_buckets(now)
+            counts = {key: sketch.count() for key, sketch in self.distinct.items()}
+            window = HyperLogLog()
+            for key in self.bucket_keys(now):
+                if key in self.distinct:
+                    window.merge(self.distinct[key])
+        counts['window'] = window.count()
+        return counts
+
+    def summary(self):
+        counts = self.distinct_counts()
+        with self.lock:
+            top_ips = self.ips.items()
+            top_user_agents = self.user_agents.items()
+            votes = self.votes
+        group = lambda prefix: {k[len(prefix):]: v for k, v in counts.items() if k.startswith(prefix)}
+        return {
+            'distinct_voters': counts.get('all', 0),
+            'distinct_voters_window': counts.get('window', 0),
+            'window_hours': self.buckets * self.bucket_seconds / 3600,
+            'by_choice': group('choice:'),
+            'by_source': group('source:'),
+            'by_bucket': {time.strftime('%Y-%m-%dT%H:%M:%SZ', time.gmtime(int(k))): v
+                          for k, v in sorted(group('bucket:').items())},
+            'top_ips': [{'ip': k, 'votes': v} for k, v in top_ips],
+            'top_user_agents': [{'user_agent': k, 'votes': v} for k, v in top_user_agents],
+            'votes_observed': votes,
+            'store': 'redis' if self.redis else 'local',
+            'memory_bytes': self.memory_bytes()
+        }
+
+    def memory_bytes(self):
+        sketch_bytes = 2 * self.ips.sketch.table.itemsize * len(self.ips.sketch.table)
+        return sketch_bytes + sum(len(s.registers) for s in self.distinct.values())
+
+    def to_dict(self):
+        """Serialized local sketches, for merging into another instance"""
+        encode = lambda data: base64.b64encode(bytes(data)).decode()
+        with self.lock:
+            return {
+                'distinct': {k: encode(s.registers) for k, s in self.distinct.items()},
+                'ips': {'table': encode(self.ips.sketch.table), 'top': self.ips.top},
+                'user_agents': {'table': encode(self.user_agents.sketch.table), 'top': self.user_agents.top},
+                'votes': self.votes
+            }
+
+    def merge(self, payload):
+        """Fold sketches exported by to_dict() on another pod or environment into this one"""
+        with self.lock:
+            for key, registers in payload['distinct'].items():
+                other = HyperLogLog()
+                other.registers = bytearray(base64.b64decode(registers))
+                self.sketch_for(key).merge(other)
+            for mine, theirs in ((self.ips, payload['ips']), (self.user_agents, payload['user_agents'])):
+                other = HeavyHitters(self.k)
+                other.sketch.table = array('I', base64.b64decode(theirs['table']))
+                other.top = dict(theirs['top'])
+                mine.merge(other)
+            self.votes += payload['votes']
@@ -0,0 +1,67 @@
+"""
+Background warm-up so a new pod is ready before it takes traffic.
+
+Start-up work (schema migrations, opening pool connections, priming the
+result caches) runs as named steps on a background thread instead of at
+import time. ``/ready`` answers 503 until every step has run, so a
+Kubernetes readiness probe keeps the pod out of the Service until its first
+real request no longer pays for connection setup. A failing step is
+reported in ``/ready`` but doesn't block readiness: the apps already
+degrade gracefully when a backend is down.
+"""
+
+import threading
+import time
+
+from flask import jsonify
+
+class Warmup:
+    def __init__(self, name='app'):
+        self.name = name
+        self.steps = []
+        self.results = {}
+        self.started_at = None
+        self.ready_at = None
+        self.ready = threading.Event()
+        self.lock = threading.Lock()
+
+    def step(self, name, fn):
+        self.steps.append((name, fn))
+
+    def run(self):
+        for name, fn in self.steps:
+            started = time.monotonic()
+            try:
+                fn()
+                self.results[name] = {'ok': True}
+            except Exception as e:
+                print(f"⚠️ Warm-up step '{name}' failed: {e}")
+                self.results[name] = {'ok': False, 'error': str(e)}
+            self.results[name]['seconds'] = round(time.monotonic() - started, 3)
+        self.ready_at = time.monotonic()
+        self.ready.set()
+        print(f"✅ {self.name} warm-up finished in {self.ready_at - self.started_at:.2f}s")
+
+    def start(self):
+        """Start the steps once; later calls are no-ops"""
+        with self.lock:
+            if self.started_at is not None:
+                return
+            self.started_at = time.monotonic()
+        threading.Thread(target=self.run, name=f'{self.name}-warmup', daemon=True).start()
+
+    def status(self):
+        body = {'status': 'ready' if self.ready.is_set() else 'warming', 'steps': self.results}
+        if self.ready_at is not None:
+            body['warmup_seconds'] = round(self.ready_at - self.started_at, 3)
+        return body
+
+    def init_app(self, app):
+        """Register /ready and start warming on the first request (WSGI servers skip __main__)"""
+        @app.before_request
+        def start_warmup():
+            self.start()
+
+        @app.route('/ready')
+        def ready():
+            return jsonify(self.status()), 200 if self.ready.is_set() else 503
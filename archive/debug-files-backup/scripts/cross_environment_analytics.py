@@ -5,11 +5,109 @@ Aggregates votes from both Azure and On-premises PostgreSQL databases
 """
 
 import psycopg2
+import argparse
+import csv
+import io
 import json
-from typing import Dict, List, Any
+import sys
+from typing import Dict, List, Any, Iterator, Optional
 import os
 from datetime import datetime
 
+EXPORT_COLUMNS = ['environment', 'id', 'vote_option', 'source', 'timestamp']
+EXPORT_BATCH_SIZE = int(os.getenv('EXPORT_BATCH_SIZE', '5000'))
+
+def iter_vote_batches(config: Dict[str, Any], environment: str,
+                      since: Optional[str] = None, until: Optional[str] = None,
+                      after_id: int = 0, batch_size: int = EXPORT_BATCH_SIZE) -> Iterator[List[Dict[str, Any]]]:
+    """Stream raw votes in id order through a named (server-side) cursor.
+
+    Only one batch is held in memory at a time, so the cost is constant
+    regardless of table size. Rows are ordered by id so a caller can resume
+    from the last id it has durably written.
+    """
+    conditions = ['id > %s']
+    params: List[Any] = [after_id]
+    if since:
+        conditions.append('timestamp >= %s')
+        params.append(since)
+    if until:
+        conditions.append('timestamp < %s')
+        params.append(until)
+
+    conn = psycopg2.connect(**config)
+    try:
+        cursor = conn.cursor(name=f'vote_export_{environment}')
+        cursor.itersize = batch_size
+        cursor.execute(f"""
+            SELECT id, vote_option, source, timestamp
+            FROM votes
+            WHERE {' AND '.join(conditions)}
+            ORDER BY id
+        """, params)
+
+        while True:
+            rows = cursor.fetchmany(batch_size)
+            if not rows:
+                break
+            yield [
+                {
+                    'environment': environment,
+                    'id': row[0],
+                    'vote_option': row[1],
+                    'source': row[2],
+                    'timestamp': row[3].isoformat() if row[3] else None
+                }
+                for row in rows
+            ]
+
+        cursor.close()
+    finally:
+        conn.close()
+
+def format_batch(batch: List[Dict[str, Any]], fmt: str) -> str:
+    """Serialize one batch of exported votes as CSV rows or JSON lines"""
+    if fmt == 'jsonl':
+        return ''.join(json.dumps(row) + '\n' for row in batch)
+    buffer = io.StringIO()
+    writer = csv.DictWriter(buffer, fieldnames=EXPORT_COLUMNS)
+    writer.writerows(batch)
+    return buffer.getvalue()
+
+def export_votes(configs: Dict[str, Dict[str, Any]], fmt: str = 'csv',
+                 since: Optional[str] = None, until: Optional[str] = None,
+                 checkpoint: Optional[Dict[str, int]] = None,
+                 include_header: bool = True) -> Iterator[tuple]:
+    """Yield (environment, last_id, row_count, chunk) for every batch across environments.
+
+    ``checkpoint`` maps environment name to the last id already exported;
+    export resumes strictly after it.
+    """
+    checkpoint = checkpoint or {}
+    if fmt == 'csv' and include_header:
+        yield None, None, 0, ','.join(EXPORT_COLUMNS) + '\n'
+
+    for environment, config in configs.items():
+        after_id = int(checkpoint.get(environment, 0))
+        for batch in iter_vote_batches(config, environment, since, until, after_id):
+            yield environment, batch[-1]['id'], len(batch), format_batch(batch, fmt)
+
+def load_checkpoint(path: str) -> Dict[str, int]:
+    """Read a checkpoint file written by a previous export run"""
+    if not path or not os.path.exists(path):
+        return {}
+    with open(path) as f:
+        return json.load(f)
+
+def save_checkpoint(path: str, checkpoint: Dict[str, int]):
+    """Atomically persist the last exported id per environment"""
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'w') as f:
+        json.dump(checkpoint, f)
+        f.flush()
+        os.fsync(f.fileno())
+    os.replace(tmp_path, path)
+
 class CrossEnvironmentAnalytics:
     def __init__(self):
         # On-premises database configuration
@@ -30,6 +128,11 @@ class CrossEnvironmentAnalytics:
             'password': 'SecureVotingPassword123!'
         }
 
+        self.environments = {
+            'onprem': self.onprem_config,
+            'azure': self.azure_config
+        }
+
     def get_database_connection(self, config: Dict[str, Any]):
         """Create database connection with error handling"""
         try:
@@ -138,9 +241,63 @@ class CrossEnvironmentAnalytics:
             }
         }
 
+    def export(self, output, environment: str = 'all', fmt: str = 'csv',
+               since: Optional[str] = None, until: Optional[str] = None,
+               checkpoint_path: Optional[str] = None) -> int:
+        """Stream raw votes to a file object, checkpointing after every batch"""
+        configs = self.environments if environment == 'all' else {environment: self.environments[environment]}
+        checkpoint = load_checkpoint(checkpoint_path)
+        exported = 0
+
+        # Only write the CSV header when starting fresh, not when resuming
+        for env, last_id, count, chunk in export_votes(configs, fmt, since, until, checkpoint,
+                                                include_header=not checkpoint):
+            output.write(chunk)
+            if env is None:
+                continue
+            exported += count
+            if checkpoint_path:
+                # The data must be durable before the checkpoint that points past it
+                output.flush()
+                try:
+                    os.fsync(output.fileno())
+                except (AttributeError, OSError, io.UnsupportedOperation):
+                    pass  # not a real file (e.g. a pipe or in-memory buffer)
+                checkpoint[env] = last_id
+                save_checkpoint(checkpoint_path, checkpoint)
+
+        output.flush()
+        return exported
+
 def main():
     """Main function for command line usage"""
+    parser = argparse.ArgumentParser(description='Cross-environment voting analytics')
+    subparsers = parser.add_subparsers(dest='command')
+
+    export_parser = subparsers.add_parser('export', help='Stream raw votes as CSV or JSONL')
+    export_parser.add_argument('--env', default='all', choices=['all', 'onprem', 'azure'])
+    export_parser.add_argument('--format', default='csv', choices=['csv', 'jsonl'])
+    export_parser.add_argument('--since', help='Only votes at or after this timestamp')
+    export_parser.add_argument('--until', help='Only votes before this timestamp')
+    export_parser.add_argument('--checkpoint', help='File used to resume an interrupted export')
+    export_parser.add_argument('--output', help='Output file (default: stdout)')
+
+    args = parser.parse_args()
     analytics = CrossEnvironmentAnalytics()
+
+    if args.command == 'export':
+        # Append when resuming so earlier batches are kept
+        mode = 'a' if args.checkpoint and os.path.exists(args.checkpoint) else 'w'
+        output = open(args.output, mode, newline='') if args.output else sys.stdout
+        try:
+            exported = analytics.export(output, args.env, args.format,
+                                        args.since, args.until, args.checkpoint)
+        finally:
+            if args.output:
+                output.close()
+        print(f"Exported {exported} votes", file=sys.stderr)
+        return
+
     results = analytics.get_cross_environment_analytics()
     print(json.dumps(results, indent=2))
 
@@ -4,70 +4,164 @@ Cross-Environment Analytics Web API
 Provides REST endpoint for hybrid cloud voting analytics
 """
 
-from flask import Flask, jsonify, render_template_string
+from flask import Flask, Response, jsonify, render_template_string, request, stream_with_context
 import psycopg2
+import psycopg2.pool
 import json
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, wait
 from datetime import datetime
 import os
 
+from cross_environment_analytics import export_votes
+
 app = Flask(__name__)
 
-class HybridAnalytics:
-    def __init__(self):
-        # Database configurations
-        self.databases = {
-            'onprem': {
-                'host': os.getenv('ONPREM_DB_HOST', '66.242.207.21'),
-                'port': int(os.getenv('ONPREM_DB_PORT', 5432)),
-                'database': 'voting_app',
-                'user': 'votinguser',
-                'password': 'secure_password_123'
-            },
-            'azure': {
-                'host': os.getenv('AZURE_DB_HOST', 'postgres-cat-dog-voting.postgres.database.azure.com'),
-                'port': int(os.getenv('AZURE_DB_PORT', 5432)),
-                'database': 'voting_app',
-                'user': 'votinguser',
-                'password': 'SecureVotingPassword123!'
-            }
+# Environments to aggregate, e.g. "onprem,azure,edge". Each name reads its
+# connection settings from <NAME>_DB_HOST / _DB_PORT / _DB_NAME / _DB_USER /
+# _DB_PASSWORD, falling back to the defaults below.
+ANALYTICS_ENVIRONMENTS = os.getenv('ANALYTICS_ENVIRONMENTS', 'onprem,azure')
+ANALYTICS_TIMEOUT = float(os.getenv('ANALYTICS_TIMEOUT', '3'))
+ANALYTICS_CACHE_TTL = float(os.getenv('ANALYTICS_CACHE_TTL', '5'))
+ANALYTICS_POOL_SIZE = int(os.getenv('ANALYTICS_POOL_SIZE', '4'))
+
+DEFAULT_DATABASES = {
+    'onprem': {
+        'host': '66.242.207.21',
+        'port': 5432,
+        'database': 'voting_app',
+        'user': 'votinguser',
+        'password': 'secure_password_123'
+    },
+    'azure': {
+        'host': 'postgres-cat-dog-voting.postgres.database.azure.com',
+        'port': 5432,
+        'database': 'voting_app',
+        'user': 'votinguser',
+        'password': 'SecureVotingPassword123!'
+    }
+}
+
+# One pass over votes: per-option, per-source and grand-total rows are
+# distinguished by GROUPING() instead of running three separate scans.
+AGGREGATE_QUERY = """
+    SELECT vote_option, source, COUNT(*),
+           GROUPING(vote_option), GROUPING(source)
+    FROM votes
+    GROUP BY GROUPING SETS ((vote_option), (source), ())
+"""
+
+def load_database_configs() -> dict:
+    """Build connection settings for every configured environment"""
+    databases = {}
+    for name in [n.strip() for n in ANALYTICS_ENVIRONMENTS.split(',') if n.strip()]:
+        defaults = DEFAULT_DATABASES.get(name, DEFAULT_DATABASES['onprem'])
+        prefix = name.upper()
+        databases[name] = {
+            'host': os.getenv(f'{prefix}_DB_HOST', defaults['host']),
+            'port': int(os.getenv(f'{prefix}_DB_PORT', defaults['port'])),
+            'database': os.getenv(f'{prefix}_DB_NAME', defaults['database']),
+            'user': os.getenv(f'{prefix}_DB_USER', defaults['user']),
+            'password': os.getenv(f'{prefix}_DB_PASSWORD', defaults['password']),
+            'connect_timeout': max(1, int(ANALYTICS_TIMEOUT)),
+            'options': f'-c statement_timeout={int(ANALYTICS_TIMEOUT * 1000)}'
         }
+    return databases
+
+class HybridAnalytics:
+    def __init__(self, databases: dict = None):
+        self.databases = databases or load_database_configs()
+        self.pools = {}
+        self.pool_lock = threading.Lock()
+        self.executor = ThreadPoolExecutor(max_workers=max(2, len(self.databases) * 2))
+        self.cache = None
+        self.cache_time = 0.0
+        self.cache_lock = threading.Lock()
+
+    def get_pool(self, env_name: str):
+        """Lazily create a connection pool for an environment"""
+        with self.pool_lock:
+            pool = self.pools.get(env_name)
+            if pool is None:
+                pool = psycopg2.pool.ThreadedConnectionPool(
+                    0, ANALYTICS_POOL_SIZE, **self.databases[env_name])
+                self.pools[env_name] = pool
+            return pool
 
     def get_environment_data(self, env_name: str) -> dict:
         """Get data from a specific environment database"""
-        config = self.databases[env_name]
-        
+        conn = None
+        pool = None
+        broken = False
+        started = time.monotonic()
+
         try:
-            conn = psycopg2.connect(**config)
+            pool = self.get_pool(env_name)
+            conn = pool.getconn()
             cursor = conn.cursor()
-            
-            # Get vote counts
-            cursor.execute("SELECT vote_option, COUNT(*) FROM votes GROUP BY vote_option")
-            vote_counts = {row[0]: row[1] for row in cursor.fetchall()}
-            
-            # Get total votes
-            cursor.execute("SELECT COUNT(*) FROM votes")
-            total_votes = cursor.fetchone()[0]
-            
-            # Get votes by source
-            cursor.execute("SELECT source, COUNT(*) FROM votes GROUP BY source")
-            by_source = {row[0]: row[1] for row in cursor.fetchall()}
-            
-            conn.close()
-            
+
+            cursor.execute(AGGREGATE_QUERY)
+            vote_counts = {}
+            by_source = {}
+            total_votes = 0
+            for option, source, count, option_grouped, source_grouped in cursor.fetchall():
+                if option_grouped and source_grouped:
+                    total_votes = count
+                elif source_grouped:
+                    vote_counts[option] = count
+                else:
+                    by_source[source] = count
+
+            cursor.close()
+            conn.rollback()
+
             return {
                 'status': 'healthy',
                 'vote_counts': vote_counts,
                 'total_votes': total_votes,
                 'by_source': by_source,
+                'query_ms': round((time.monotonic() - started) * 1000, 1),
                 'timestamp': datetime.now().isoformat()
             }
-            
+
         except Exception as e:
+            broken = True
             return {
                 'status': 'error',
                 'error': str(e),
                 'timestamp': datetime.now().isoformat()
             }
+        finally:
+            if conn is not None:
+                pool.putconn(conn, close=broken)
+
+    def collect(self) -> dict:
+        """Query every environment concurrently, keeping partial results on timeout"""
+        futures = {name: self.executor.submit(self.get_environment_data, name)
+                   for name in self.databases}
+        wait(futures.values(), timeout=ANALYTICS_TIMEOUT)
+
+        results = {}
+        for name, future in futures.items():
+            if future.done():
+                results[name] = future.result()
+            else:
+                results[name] = {
+                    'status': 'timeout',
+                    'error': f'No response within {ANALYTICS_TIMEOUT}s',
+                    'timestamp': datetime.now().isoformat()
+                }
+        return results
+
+    def get_all_environment_data(self) -> dict:
+        """Return per-environment data, served from cache between dashboard refreshes"""
+        with self.cache_lock:
+            if self.cache is not None and time.monotonic() - self.cache_time < ANALYTICS_CACHE_TTL:
+                return self.cache
+            self.cache = self.collect()
+            self.cache_time = time.monotonic()
+            return self.cache
 
 analytics = HybridAnalytics()
 
@@ -80,16 +174,15 @@ def health():
 def get_analytics():
     """Get cross-environment analytics"""
     
-    # Get data from both environments
-    onprem_data = analytics.get_environment_data('onprem')
-    azure_data = analytics.get_environment_data('azure')
+    # Get data from all environments
+    environments = analytics.get_all_environment_data()
     
     # Calculate totals
     total_cats = 0
     total_dogs = 0
     total_votes = 0
     
-    for data in [onprem_data, azure_data]:
+    for data in environments.values():
         if data['status'] == 'healthy':
             total_cats += data['vote_counts'].get('cat', 0)
             total_dogs += data['vote_counts'].get('dog', 0)
@@ -103,17 +196,53 @@ def get_analytics():
             'cat_percentage': round((total_cats / max(total_votes, 1)) * 100, 1),
             'dog_percentage': round((total_dogs / max(total_votes, 1)) * 100, 1)
         },
-        'environments': {
-            'onprem': onprem_data,
-            'azure': azure_data
-        },
+        'environments': environments,
         'hybrid_status': {
-            'onprem_healthy': onprem_data['status'] == 'healthy',
-            'azure_healthy': azure_data['status'] == 'healthy'
+            f'{name}_healthy': data['status'] == 'healthy'
+            for name, data in environments.items()
         },
+        'partial': any(data['status'] != 'healthy' for data in environments.values()),
         'timestamp': datetime.now().isoformat()
     })
 
+@app.route('/api/export')
+def api_export():
+    """Stream raw votes as CSV or JSONL.
+
+    Query parameters: env (name or 'all'), format (csv|jsonl), since, until,
+    and after=env:id[,env:id] to resume from the last id a client received.
+    """
+    env = request.args.get('env', 'all')
+    fmt = request.args.get('format', 'csv')
+    if fmt not in ('csv', 'jsonl'):
+        return jsonify({'error': 'format must be csv or jsonl'}), 400
+    if env != 'all' and env not in analytics.databases:
+        return jsonify({'error': f'Unknown environment: {env}'}), 400
+
+    try:
+        checkpoint = {}
+        for item in filter(None, request.args.get('after', '').split(',')):
+            name, last_id = item.split(':', 1)
+            checkpoint[name] = int(last_id)
+    except ValueError:
+        return jsonify({'error': 'after must look like env:id[,env:id]'}), 400
+
+    names = list(analytics.databases) if env == 'all' else [env]
+    # Exports are long-running scans; drop the dashboard statement_timeout
+    configs = {
+        name: {k: v for k, v in analytics.databases[name].items() if k != 'options'}
+        for name in names
+    }
+
+    def generate():
+        for _, _, _, chunk in export_votes(configs, fmt, request.args.get('since'),
+                                           request.args.get('until'), checkpoint,
+                                           include_header=not checkpoint):
+            yield chunk
+
+    mimetype = 'application/x-ndjson' if fmt == 'jsonl' else 'text/csv'
+    return Response(stream_with_context(generate()), mimetype=mimetype)
+
 @app.route('/')
 def dashboard():
     """Analytics dashboard"""
@@ -1,119 +1,359 @@
 import os
+import sys
 import json
-import psycopg2
-import requests
+import atexit
 from flask import Flask, request, jsonify, render_template_string
 
+# Shared helpers live alongside the other apps in app/
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), 'app'))
+
+from admission import AdmissionController, Overloaded
+from saturation import Saturation
+from event_log import EventLog
+from leader_election import (SharedPoller, RedisLease, PostgresAdvisoryLease, LocalLease,
+                             RedisSnapshotStore, PostgresSnapshotStore, FileSnapshotStore)
+from snapshot_cache import SnapshotCache
+from warmup import Warmup
+from voter_sketches import VoterAnalytics
+from abuse_detector import AbuseDetector
+from batch_votes import BatchTooLarge, parse_batch, validate_batch, count_by_choice, batch_response
+from polls import DEFAULT_OPTIONS, DEFAULT_POLL, PollCatalog
+from memory_debug import MemoryDebug
+
 app = Flask(__name__)
 
-def get_azure_db_connection():
+# Admission control for Azure PostgreSQL and the on-prem API (ADMISSION_CONTROL=true to enable)
+admission = AdmissionController(
+    {'vote': 'vote', 'vote_batch': 'vote', 'index': 'page', 'api_results': 'results', 'health': 'health', 'ready': 'health',
+     'voter_analytics_summary': 'results', 'abuse_stats': 'results'},
+    cacheable=('index', 'api_results', 'health'),
+    enabled=os.getenv('ADMISSION_CONTROL', 'false').lower() == 'true',
+    strategy=os.getenv('ADMISSION_STRATEGY', 'aimd'),
+    initial_limit=int(os.getenv('ADMISSION_INITIAL_LIMIT', '20')),
+    max_limit=int(os.getenv('ADMISSION_MAX_LIMIT', '200')),
+    target_latency=float(os.getenv('ADMISSION_TARGET_LATENCY_MS', '500')) / 1000
+)
+admission.init_app(app)
+
+# Saturation signals at /metrics/saturation for autoscaling on busy workers
+# rather than CPU; SATURATION_THREADS is the request threads per worker process
+saturation = Saturation(threads=int(os.getenv('SATURATION_THREADS', '1')),
+                        window=int(os.getenv('SATURATION_WINDOW_SECONDS', '60')),
+                        queue_target=int(os.getenv('SATURATION_QUEUE_TARGET', '1000')))
+saturation.init_app(app)
+admission.track = saturation.track
+
+# Request-path logging goes through a bounded queue to a background writer,
+# sampled per category (LOG_LEVEL, LOG_SAMPLE_RATES, see event_log)
+log = EventLog.from_env()
+saturation.queue('event_log', log.depth)
+
+AZURE_DB_CONFIG = {
+    'host': os.getenv('AZURE_DB_HOST', 'postgres-cat-dog-voting.postgres.database.azure.com'),
+    'port': int(os.getenv('AZURE_DB_PORT', '5432')),
+    'database': 'postgres',
+    'user': 'adminuser',
+    'password': 'ComplexPassword123!',
+    'sslmode': os.getenv('AZURE_DB_SSLMODE', 'require'),
+    'connect_timeout': int(os.getenv('DB_CONNECT_TIMEOUT', '5'))
+}
+
+READ_VOTES_SQL = "SELECT vote_option, vote_count FROM vote_option ORDER BY vote_option"
+UPDATE_VOTE_SQL = """
+    UPDATE vote_option 
+    SET vote_count = vote_count + 1 
+    WHERE LOWER(vote_option) = LOWER(%s)
+"""
+# Batch counts as parallel arrays: one statement however many votes arrive
+UPDATE_VOTES_SQL = """
+    UPDATE vote_option o
+    SET vote_count = o.vote_count + v.amount
+    FROM unnest(%s::text[], %s::int[]) AS v(option, amount)
+    WHERE LOWER(o.vote_option) = LOWER(v.option)
+"""
+
+# On-premises results API (overridable to point at a stand-in, see load-tests/fault_proxy.py)
+ONPREM_API_URL = os.getenv('ONPREM_API_URL', 'http://66.242.207.21:31514/api/results')
+ONPREM_API_TIMEOUT = float(os.getenv('ONPREM_API_TIMEOUT', '5'))
+
+# Streaming distinct-voter / top IP and user agent sketches (VOTER_ANALYTICS=local)
+voter_analytics = None
+if os.getenv('VOTER_ANALYTICS', 'off') != 'off':
+    voter_analytics = VoterAnalytics(
+        bucket_seconds=int(os.getenv('VOTER_ANALYTICS_BUCKET_SECONDS', '3600')),
+        buckets=int(os.getenv('VOTER_ANALYTICS_BUCKETS', '24')),
+        k=int(os.getenv('VOTER_ANALYTICS_TOP_K', '20'))
+    )
+
+# Burst detection on the vote path. vote_option only holds counters, so with
+# ABUSE_DETECTION=tag flagged votes are counted and reported by /api/analytics/abuse;
+# reject answers 429 instead
+abuse_detector = None
+if os.getenv('ABUSE_DETECTION', 'off') != 'off':
+    abuse_detector = AbuseDetector(
+        window_seconds=float(os.getenv('ABUSE_WINDOW_SECONDS', '60')),
+        limits={'ip': int(os.getenv('ABUSE_IP_LIMIT', '60')),
+                'session': int(os.getenv('ABUSE_SESSION_LIMIT', '20')),
+                'user_agent': int(os.getenv('ABUSE_USER_AGENT_LIMIT', '600'))},
+        max_keys=int(os.getenv('ABUSE_MAX_KEYS', '50000')),
+        action=os.getenv('ABUSE_DETECTION')
+    )
+
+# Largest batch accepted by POST /votes/batch
+VOTE_BATCH_MAX = int(os.getenv('VOTE_BATCH_MAX', '1000'))
+
+# DB_DRIVER=psycopg uses a psycopg 3 pool with prepared statements and pipelines
+# the vote update with the count read; the default keeps psycopg2
+pg = None
+if os.getenv('DB_DRIVER', 'psycopg2') == 'psycopg':
+    from pg_pipeline import PipelinedPostgres
+    pg = PipelinedPostgres(
+        {**AZURE_DB_CONFIG, 'options': f"-c statement_timeout={os.getenv('DB_STATEMENT_TIMEOUT_MS', '2000')}"},
+        min_size=int(os.getenv('DB_POOL_MIN', '1')),
+        max_size=int(os.getenv('DB_POOL_MAX', '10'))
+    )
+    pg.open()
+    saturation.pool('azure-db', pg.stats)
+
+def get_azure_db_connection(statement_timeout_ms=None, connect_timeout=None):
     """Direct connection to Azure PostgreSQL database"""
     try:
-        return psycopg2.connect(
-            host='postgres-cat-dog-voting.postgres.database.azure.com',
-            port=5432,
-            database='postgres',
-            user='adminuser',
-            password='ComplexPassword123!',
-            sslmode='require'
-        )
+        import psycopg2  # not needed at all with DB_DRIVER=psycopg
+        
+        options = {}
+        if statement_timeout_ms:
+            options['options'] = f'-c statement_timeout={statement_timeout_ms}'
+        if connect_timeout:
+            options['connect_timeout'] = connect_timeout
+        return psycopg2.connect(**{**AZURE_DB_CONFIG, **options})
     except Exception as e:
-        print(f"❌ Error connecting to Azure PostgreSQL: {e}")
+        log.error('azure-db', 'connection failed', error=e)
         return None
 
-def get_onprem_votes():
-    """Get votes from on-premises environment via API"""
-    try:
-        # Try to get on-premises votes from the API
-        response = requests.get('http://66.242.207.21:31514/api/results', timeout=5)
-        if response.status_code == 200:
-            data = response.json()
-            return data.get('onprem_votes', {'cat': 0, 'dog': 0})
+# Older vote_option rows spell the options in the plural
+OPTION_ALIASES = {'cats': 'cat', 'dogs': 'dog'}
+
+def votes_from_rows(rows):
+    """Map vote_option rows (either spelling) to {option: count}"""
+    votes = {}
+    for option, count in rows:
+        if option:
+            option = OPTION_ALIASES.get(option.lower(), option.lower())
+            votes[option] = votes.get(option, 0) + count
+    return votes
+
+def combine_votes(*sources):
+    """Per-option totals over every option any source reports"""
+    totals = {}
+    for votes in sources:
+        for option, count in votes.items():
+            totals[option] = totals.get(option, 0) + count
+    return totals
+
+def load_onprem_votes():
+    """Fetch votes from the on-premises API; raises on failure"""
+    import requests  # first used by the warm-up refresh, not at import
+    
+    with admission.guard('onprem'):
+        response = requests.get(ONPREM_API_URL, timeout=ONPREM_API_TIMEOUT)
+    if response.status_code != 200:
+        raise RuntimeError(f"On-premises API returned status {response.status_code}")
+    return response.json().get('onprem_votes', dict.fromkeys(DEFAULT_OPTIONS, 0))
+
+def load_azure_votes():
+    """Read vote counts from Azure PostgreSQL with a bounded query time; raises on failure"""
+    with admission.guard('azure-db'):
+        if pg:
+            rows = pg.query(READ_VOTES_SQL)
         else:
-            print(f"⚠️ On-premises API returned status {response.status_code}")
-            return {'cat': 0, 'dog': 0}
+            azure_conn = get_azure_db_connection(int(os.getenv('READ_STATEMENT_TIMEOUT_MS', '2000')))
+            if not azure_conn:
+                raise ConnectionError("Azure PostgreSQL connection failed")
+            try:
+                cursor = azure_conn.cursor()
+                cursor.execute(READ_VOTES_SQL)
+                rows = cursor.fetchall()
+                cursor.close()
+            finally:
+                azure_conn.close()
+    
+    votes = votes_from_rows(rows)
+    log.debug('azure-db', 'votes loaded', rows=len(rows), votes=votes)
+    return votes
+
+# Last good results per source, served (flagged stale) while a backend is slow or down
+cache_settings = {
+    'ttl': float(os.getenv('READ_CACHE_TTL', '0.5')),
+    'soft_timeout': float(os.getenv('READ_SOFT_TIMEOUT_MS', '200')) / 1000,
+    # Cold start: wait no longer than a read query is allowed to run
+    'first_load_timeout': float(os.getenv('READ_FIRST_LOAD_TIMEOUT_MS', os.getenv('READ_STATEMENT_TIMEOUT_MS', '2000'))) / 1000
+}
+# COORDINATION=redis|postgres|local elects one replica per environment
+# (COORDINATION_KEY) to poll both sources and publish them to a shared store;
+# every replica then reads that store instead of the remote sources
+COORDINATION = os.getenv('COORDINATION', 'off')
+shared_poller = None
+if COORDINATION != 'off':
+    coordination_key = os.getenv('COORDINATION_KEY', 'azure-voting-app:azure')
+    lease_ttl = float(os.getenv('COORDINATION_LEASE_SECONDS', '5'))
+    if COORDINATION == 'redis':
+        import redis
+        coordination_redis = redis.Redis(host=os.getenv('REDIS_HOST', 'localhost'),
+                                         port=int(os.getenv('REDIS_PORT', '6379')),
+                                         decode_responses=True, socket_timeout=lease_ttl / 3)
+        lease = RedisLease(coordination_redis, coordination_key, lease_ttl)
+        snapshot_store = RedisSnapshotStore(coordination_redis, coordination_key)
+    elif COORDINATION == 'postgres':
+        # Lease checks and snapshot reads must fail well within one lease TTL;
+        # shared_snapshots comes from schema migration 9
+        def coordination_connection():
+            return get_azure_db_connection(statement_timeout_ms=int(lease_ttl * 1000 / 3),
+                                           connect_timeout=max(2, int(lease_ttl / 3)))
+        lease = PostgresAdvisoryLease(coordination_connection, coordination_key, lease_ttl)
+        snapshot_store = PostgresSnapshotStore(coordination_connection, coordination_key)
+    else:
+        coordination_dir = os.getenv('COORDINATION_DIR', '/tmp/voting-app-coordination')
+        lease = LocalLease(coordination_dir, coordination_key, lease_ttl)
+        snapshot_store = FileSnapshotStore(coordination_dir, coordination_key)
+    shared_poller = SharedPoller(lease, snapshot_store,
+                                 {'azure': load_azure_votes, 'onprem': load_onprem_votes},
+                                 interval=float(os.getenv('COORDINATION_POLL_INTERVAL', '1')))
+    # Hand the lease over at once on a graceful shutdown instead of letting it expire
+    atexit.register(shared_poller.stop)
+
+def shared_source(name):
+    def load():
+        with admission.guard('shared-snapshot'):
+            return shared_poller.read(name)
+    return load
+
+azure_votes_cache = SnapshotCache(shared_source('azure') if shared_poller else load_azure_votes,
+                                  name='Azure votes', **cache_settings)
+onprem_votes_cache = SnapshotCache(shared_source('onprem') if shared_poller else load_onprem_votes,
+                                   name='on-premises votes', **cache_settings)
+
+# vote_option has no poll column, so this app serves the default poll only;
+# its options are whatever vote_option rows exist
+catalog = PollCatalog(lambda: {DEFAULT_POLL: tuple(azure_votes_cache.get()[0]) or DEFAULT_OPTIONS},
+                      ttl=float(os.getenv('POLL_CATALOG_TTL', '30')))
+
+# Open pool connections and load both caches before /ready reports ready
+warmup = Warmup('Azure voting app')
+if pg:
+    warmup.step('postgres pool', lambda: pg.wait(float(os.getenv('DB_POOL_WAIT_TIMEOUT', '10'))))
+if shared_poller:
+    warmup.step('cross-site poller', shared_poller.start)
+warmup.step('Azure votes', azure_votes_cache.get)
+warmup.step('on-premises votes', onprem_votes_cache.get)
+warmup.init_app(app)
+
+# Opt-in tracemalloc surface at /debug/memory (DEBUG_MEMORY_TOKEN)
+memory_debug = MemoryDebug.from_env()
+memory_debug.register('admission_last_good', lambda: {
+    'routes': len(admission.last_good), 'bytes': sum(len(body) for body, _, _ in admission.last_good.values())})
+memory_debug.register('event_log', log.depth)
+if pg:
+    memory_debug.register('azure_db_pool', pg.stats)
+if abuse_detector:
+    memory_debug.register('abuse_windows', lambda: {d: len(w) for d, w in abuse_detector.windows.items()})
+if shared_poller:
+    memory_debug.register('shared_snapshot_sources', lambda: len(shared_poller.snapshot))
+memory_debug.init_app(app)
+
+def read_cached_votes(cache):
+    """Return (votes, freshness) from a snapshot cache; zeros only if never loaded"""
+    try:
+        votes, stale, age = cache.get()
+        return votes, {'stale': stale, 'age': round(age, 3)}
+    except Overloaded:
+        raise
     except Exception as e:
-        print(f"⚠️ Could not fetch on-premises votes: {e}")
-        return {'cat': 0, 'dog': 0}
+        log.error('cache', 'no snapshot available', error=e, cache=cache.name)
+        return dict.fromkeys(catalog.polls()[DEFAULT_POLL], 0), {'stale': True, 'age': None}
+
+def get_onprem_votes():
+    """Get votes from on-premises environment via API"""
+    return read_cached_votes(onprem_votes_cache)
 
 def get_azure_votes():
     """Get votes from Azure PostgreSQL database"""
-    try:
-        azure_conn = get_azure_db_connection()
-        if not azure_conn:
-            return {'cat': 0, 'dog': 0}
-        
-        cursor = azure_conn.cursor()
-        cursor.execute("SELECT vote_option, vote_count FROM vote_option ORDER BY vote_option")
-        rows = cursor.fetchall()
-        
-        votes = {'cat': 0, 'dog': 0}
-        print("📊 Azure PostgreSQL rows:")
-        for option, count in rows:
-            print(f"  Azure row: option='{option}', count={count}")
-            if option and option.lower() in ['cat', 'cats']:
-                votes['cat'] = count
-            elif option and option.lower() in ['dog', 'dogs']:
-                votes['dog'] = count
-        
-        cursor.close()
-        azure_conn.close()
-        print(f"✅ Azure votes: {votes}")
-        return votes
-        
-    except Exception as e:
-        print(f"❌ Error getting Azure votes: {e}")
-        return {'cat': 0, 'dog': 0}
+    return read_cached_votes(azure_votes_cache)
 
 def save_vote_to_azure(vote_option):
     """Save a vote to Azure PostgreSQL database"""
     try:
-        azure_conn = get_azure_db_connection()
-        if not azure_conn:
-            return False
-        
-        cursor = azure_conn.cursor()
-        
-        # Update the vote count
-        cursor.execute("""
-            UPDATE vote_option 
-            SET vote_count = vote_count + 1 
-            WHERE LOWER(vote_option) = LOWER(%s)
-        """, (vote_option,))
-        
-        azure_conn.commit()
-        cursor.close()
-        azure_conn.close()
-        print(f"✅ Saved vote for {vote_option} to Azure PostgreSQL")
+        with admission.guard('azure-db'):
+            if pg:
+                # Update and re-read the counts in one round-trip, refreshing the read cache
+                _, rows = pg.pipeline([(UPDATE_VOTE_SQL, (vote_option,)), (READ_VOTES_SQL, None)])
+                azure_votes_cache.put(votes_from_rows(rows))
+            else:
+                azure_conn = get_azure_db_connection()
+                if not azure_conn:
+                    raise ConnectionError("Azure PostgreSQL connection failed")
+                
+                cursor = azure_conn.cursor()
+                
+                # Update the vote count
+                cursor.execute(UPDATE_VOTE_SQL, (vote_option,))
+                
+                azure_conn.commit()
+                cursor.close()
+                azure_conn.close()
+                azure_votes_cache.invalidate()
         return True
         
+    except Overloaded:
+        raise
     except Exception as e:
-        print(f"❌ Error saving vote to Azure: {e}")
+        log.error('vote', 'saving vote failed', error=e)
         return False
 
+def save_votes_to_azure(counts):
+    """Apply a batch of {option: count} to Azure PostgreSQL in one UPDATE; raises on failure"""
+    params = (list(counts), list(counts.values()))
+    with admission.guard('azure-db'):
+        if pg:
+            _, rows = pg.pipeline([(UPDATE_VOTES_SQL, params), (READ_VOTES_SQL, None)])
+            azure_votes_cache.put(votes_from_rows(rows))
+            return
+        
+        azure_conn = get_azure_db_connection()
+        if not azure_conn:
+            raise ConnectionError("Azure database connection failed")
+        try:
+            cursor = azure_conn.cursor()
+            cursor.execute(UPDATE_VOTES_SQL, params)
+            azure_conn.commit()
+            cursor.close()
+        finally:
+            azure_conn.close()
+    azure_votes_cache.invalidate()
+
 @app.route('/api/results')
 def api_results():
     """API endpoint for getting cross-environment vote results"""
     
     # Get Azure votes directly from Azure PostgreSQL
-    azure_votes = get_azure_votes()
+    azure_votes, azure_freshness = get_azure_votes()
     
     # Get on-premises votes from API
-    onprem_votes = get_onprem_votes()
+    onprem_votes, onprem_freshness = get_onprem_votes()
     
     # Calculate totals
-    total_cat = azure_votes['cat'] + onprem_votes['cat']
-    total_dog = azure_votes['dog'] + onprem_votes['dog']
+    totals = combine_votes(azure_votes, onprem_votes)
     
     result = {
         'environment': 'azure',
         'azure_votes': azure_votes,
         'onprem_votes': onprem_votes,
-        'votes': {'cat': total_cat, 'dog': total_dog},
-        'total_votes': total_cat + total_dog
+        'votes': totals,
+        'total_votes': sum(totals.values()),
+        'stale': azure_freshness['stale'] or onprem_freshness['stale'],
+        'freshness': {'azure': azure_freshness, 'onprem': onprem_freshness}
     }
     
-    print(f"📊 Azure API result: {result}")
+    log.event('results', 'results served', total_votes=result['total_votes'], stale=result['stale'])
     return jsonify(result)
 
 @app.route('/vote', methods=['POST'])
@@ -122,34 +362,114 @@ def vote():
     try:
         data = request.get_json()
         vote_option = data.get('vote')
+        poll_id = data.get('poll_id') or DEFAULT_POLL
         
-        if vote_option not in ['cat', 'dog']:
+        options = catalog.options(poll_id) if isinstance(poll_id, str) else None
+        if options is None:
+            return jsonify({'status': 'error', 'message': f'Unknown poll: {poll_id}'}), 404
+        if vote_option not in options:
             return jsonify({'status': 'error', 'message': 'Invalid vote option'}), 400
         
+        if abuse_detector:
+            session_id = data.get('session_id')
+            abuse_flag = abuse_detector.check(request.remote_addr, session_id if isinstance(session_id, str) else None,
+                                              request.headers.get('User-Agent', ''), vote_option)
+            if abuse_detector.rejects(abuse_flag):
+                return jsonify({'status': 'error', 'message': 'Too many votes, slow down', 'flag': abuse_flag}), 429
+        
         # Save vote to Azure PostgreSQL
         success = save_vote_to_azure(vote_option)
         
         if success:
-            print(f"✅ Vote for {vote_option} saved to Azure database")
+            log.event('vote', 'vote saved', choice=vote_option)
+            if voter_analytics:
+                voter_analytics.observe(vote_option, 'azure', request.remote_addr,
+                                        request.headers.get('User-Agent', ''))
             return jsonify({'status': 'success', 'vote': vote_option})
         else:
             return jsonify({'status': 'error', 'message': 'Failed to save vote'}), 500
             
+    except Overloaded:
+        raise
     except Exception as e:
-        print(f"❌ Error in vote endpoint: {e}")
+        log.error('vote', 'vote endpoint failed', error=e)
         return jsonify({'status': 'error', 'message': str(e)}), 500
 
+@app.route('/votes/batch', methods=['POST'])
+def vote_batch():
+    """Bulk ingestion for edge aggregators: JSON array or NDJSON of votes"""
+    try:
+        items = parse_batch(request, VOTE_BATCH_MAX)
+    except BatchTooLarge as e:
+        return jsonify({'status': 'error', 'message': str(e), 'max_batch': VOTE_BATCH_MAX}), 413
+    except ValueError as e:
+        return jsonify({'status': 'error', 'message': str(e)}), 400
+    
+    records, errors = validate_batch(items, catalog.options, None, 'azure')
+    # A batch arrives from one aggregator address, so only per-session bursts count
+    if abuse_detector:
+        accepted = []
+        for record in records:
+            flag = abuse_detector.check(session_id=record['session_id'], choice=record['choice'])
+            if abuse_detector.rejects(flag):
+                errors.append({'index': record['index'], 'error': f'Rejected as burst voting ({flag})'})
+            else:
+                accepted.append(record)
+        records = accepted
+        errors.sort(key=lambda error: error['index'])
+    if not records:
+        return batch_response(records, errors)
+    
+    try:
+        save_votes_to_azure(count_by_choice(records))
+    except Overloaded:
+        raise
+    except Exception as e:
+        log.error('vote_batch', 'saving batch failed', error=e, votes=len(records))
+        return batch_response(records, errors, write_error=e)
+    
+    log.event('vote_batch', 'batch saved', votes=len(records))
+    if voter_analytics:
+        ip = request.remote_addr
+        user_agent = request.headers.get('User-Agent', '')
+        voter_analytics.observe_records([{**r, 'ip': ip, 'user_agent': user_agent} for r in records])
+    return batch_response(records, errors)
+
+@app.route('/api/analytics/abuse')
+def abuse_stats():
+    """Burst detector state: flagged votes per choice, tracked keys, current offenders"""
+    if not abuse_detector:
+        return jsonify({'error': 'Abuse detection disabled (set ABUSE_DETECTION=tag or reject)'}), 404
+    return jsonify(abuse_detector.stats())
+
+@app.route('/api/analytics/voters')
+def voter_analytics_summary():
+    """Distinct voters and top IPs/user agents from the streaming sketches"""
+    if not voter_analytics:
+        return jsonify({'error': 'Voter analytics disabled (set VOTER_ANALYTICS=local)'}), 404
+    if request.args.get('format') == 'sketch':
+        return jsonify(voter_analytics.to_dict())
+    return jsonify(voter_analytics.summary())
+
 @app.route('/health')
 def health():
     """Health check endpoint"""
     try:
         # Test database connection
-        azure_conn = get_azure_db_connection()
-        if azure_conn:
-            azure_conn.close()
-            return jsonify({'status': 'healthy', 'database': 'connected'})
-        else:
-            return jsonify({'status': 'unhealthy', 'database': 'disconnected'}), 500
+        # Raise inside the guard so a failed connect counts against the limiter
+        with admission.guard('azure-db'):
+            azure_conn = get_azure_db_connection()
+            if not azure_conn:
+                raise ConnectionError("Azure PostgreSQL connection failed")
+        azure_conn.close()
+        status = {'status': 'healthy', 'database': 'connected'}
+        if shared_poller:
+            status['coordination'] = shared_poller.status()
+        return jsonify(status)
+    except Overloaded:
+        raise
+    except ConnectionError:
+        return jsonify({'status': 'unhealthy', 'database': 'disconnected'}), 500
     except Exception as e:
         return jsonify({'status': 'unhealthy', 'error': str(e)}), 500
 
@@ -158,11 +478,12 @@ def index():
     """Main voting interface with cross-environment display"""
     
     # Get current vote data
-    azure_votes = get_azure_votes()
-    onprem_votes = get_onprem_votes()
-    total_cat = azure_votes['cat'] + onprem_votes['cat']
-    total_dog = azure_votes['dog'] + onprem_votes['dog']
-    total_votes = total_cat + total_dog
+    azure_votes, _ = get_azure_votes()
+    onprem_votes, _ = get_onprem_votes()
+    totals = combine_votes(azure_votes, onprem_votes)
+    total_cat = totals.get('cat', 0)
+    total_dog = totals.get('dog', 0)
+    total_votes = sum(totals.values())
     
     html_template = '''
     <!DOCTYPE html>
@@ -408,10 +729,10 @@ def index():
         html_template,
         total_cat=total_cat,
         total_dog=total_dog,
-        azure_cat=azure_votes['cat'],
-        azure_dog=azure_votes['dog'],
-        onprem_cat=onprem_votes['cat'],
-        onprem_dog=onprem_votes['dog'],
+        azure_cat=azure_votes.get('cat', 0),
+        azure_dog=azure_votes.get('dog', 0),
+        onprem_cat=onprem_votes.get('cat', 0),
+        onprem_dog=onprem_votes.get('dog', 0),
         total_votes=total_votes
     )
 
@@ -419,4 +740,5 @@ if __name__ == '__main__':
     print("🚀 Starting Azure cross-environment voting app...")
     print("🔗 Connects to: Azure PostgreSQL + On-premises API")
     print("💾 Saves votes to: Azure PostgreSQL Database")
+    warmup.start()
     app.run(host='0.0.0.0', port=5000)
\ No newline at end of file
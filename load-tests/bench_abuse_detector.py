@@ -0,0 +1,94 @@
+#!/usr/bin/env python3
+"""
+Overhead of the sliding-window abuse detector on the vote path.
+
+Simulates N distinct clients (IP + session + user agent) voting at a steady
+rate, plus a few scripted clients that burst well over the limits, and
+reports per-check latency, memory held by the detector and how many of the
+scripted vs. normal votes were flagged. Time is simulated so a long window
+can be covered in a few seconds of wall clock.
+
+Usage:
+    python load-tests/bench_abuse_detector.py [--clients 10000] [--votes 500000] [--max-keys 50000]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from abuse_detector import AbuseDetector
+
+USER_AGENTS = [f'Mozilla/5.0 (browser {i})' for i in range(200)]
+
+def make_clients(count):
+    return [(f'10.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}', f'session-{i}', random.choice(USER_AGENTS))
+            for i in range(count)]
+
+def run(check, clients, bots, votes, duration):
+    """Replay votes spread over `duration` simulated seconds; returns per-check ns samples"""
+    samples = []
+    flagged_normal = flagged_bot = bot_votes = 0
+    step = duration / votes
+    now = 0.0
+    for i in range(votes):
+        if bots and i % 50 == 0:
+            ip, session, agent = random.choice(bots)
+            is_bot = True
+            bot_votes += 1
+        else:
+            ip, session, agent = random.choice(clients)
+            is_bot = False
+        started = time.perf_counter_ns()
+        flag = check(ip, session, agent, 'cat', now=now)
+        samples.append(time.perf_counter_ns() - started)
+        if flag:
+            if is_bot:
+                flagged_bot += 1
+            else:
+                flagged_normal += 1
+        now += step
+    return samples, flagged_normal, flagged_bot, bot_votes
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure abuse detector overhead at many distinct clients')
+    parser.add_argument('--clients', type=int, default=10000)
+    parser.add_argument('--bots', type=int, default=5)
+    parser.add_argument('--votes', type=int, default=500000)
+    parser.add_argument('--duration', type=float, default=600, help='simulated seconds the votes span')
+    parser.add_argument('--max-keys', type=int, default=50000)
+    args = parser.parse_args()
+
+    random.seed(1)
+    clients = make_clients(args.clients)
+    bots = [(f'192.168.0.{i}', f'bot-{i}', 'python-requests/2.31') for i in range(args.bots)]
+
+    detector = AbuseDetector(max_keys=args.max_keys)
+    samples, flagged_normal, flagged_bot, bot_votes = run(detector.check, clients, bots, args.votes, args.duration)
+
+    # Memory in a separate pass: tracemalloc slows every allocation down
+    tracemalloc.start()
+    traced = AbuseDetector(max_keys=args.max_keys)
+    traced_samples = run(traced.check, clients, bots, args.votes, args.duration)[0]
+    traced_samples.clear()
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+
+    # Same loop without the detector, to subtract the harness cost
+    empty, _, _, _ = run(lambda *args, **kwargs: None, clients, bots, min(args.votes, 100000), args.duration)
+
+    samples.sort()
+    print(f"{args.clients} clients, {args.bots} scripted, {args.votes} votes over {args.duration:g}s simulated")
+    print(f"  check       p50={statistics.median(samples) / 1000:6.2f} us  p99={samples[int(len(samples) * 0.99)] / 1000:6.2f} us"
+          f"  (harness {statistics.median(empty) / 1000:.2f} us)")
+    print(f"  memory      {memory / 1024 / 1024:.1f} MiB for {sum(len(w) for w in detector.windows.values())} tracked keys"
+          f" ({detector.evicted} evicted)")
+    print(f"  flagged     scripted {flagged_bot}/{bot_votes}   normal {flagged_normal}/{args.votes - bot_votes}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,154 @@
+#!/usr/bin/env python3
+"""
+Storage cost of the wide vs. dictionary-encoded (COMPACT_METADATA) vote rows.
+
+Builds the real schema (all migrations) in two throwaway schemas, writes the
+same votes into each with the app's batch path, and reports:
+
+  table size    pg_total_relation_size of votes (heap + indexes + TOAST)
+  WAL           bytes of WAL generated by the inserts
+  throughput    votes/s including the lookup-table round-trips on misses
+  summary       latency of the vote_summary read the results page makes
+
+User agents are drawn from a realistic pool (a few hundred distinct strings
+of ~120 bytes), which is where the saving comes from. Also times backfill()
+converting the wide table in place.
+
+Usage:
+    python load-tests/bench_compact_metadata.py --dsn "host=localhost dbname=voting_app user=votinguser password=..." [--votes 200000]
+"""
+
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+import psycopg2
+from psycopg2.extras import execute_values
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from metadata_dictionary import MetadataDictionary, backfill
+from migrations import migrate
+
+USER_AGENTS = [
+    f'Mozilla/5.0 (Windows NT 10.0; Win64; x64) AppleWebKit/537.36 (KHTML, like Gecko) '
+    f'Chrome/{100 + i % 30}.0.{i}.0 Safari/537.36'
+    for i in range(300)
+]
+
+WIDE_SQL = '''INSERT INTO votes (vote_choice, vote_source, timestamp, ip_address, user_agent, session_id)
+              VALUES %s'''
+COMPACT_SQL = '''INSERT INTO votes (vote_choice, source_id, timestamp, ip_address, user_agent_id, session_id)
+                 VALUES %s'''
+
+def make_votes(count):
+    random.seed(1)
+    return [{
+        'choice': random.choice(('cat', 'dog')),
+        'source': random.choice(('azure', 'onprem')),
+        'timestamp': '2026-01-01T00:00:00Z',
+        'ip': f'10.0.{i >> 8 & 255}.{i & 255}',
+        'user_agent': random.choice(USER_AGENTS),
+        'session_id': f'session-{i % 5000}'
+    } for i in range(count)]
+
+def wal_lsn(cursor):
+    cursor.execute("SELECT pg_current_wal_lsn()")
+    return cursor.fetchone()[0]
+
+def wal_since(cursor, lsn):
+    cursor.execute("SELECT pg_wal_lsn_diff(pg_current_wal_lsn(), %s)", (lsn,))
+    return int(cursor.fetchone()[0])
+
+def create_schema(conn, schema):
+    cursor = conn.cursor()
+    cursor.execute(f"CREATE SCHEMA {schema}")
+    cursor.execute(f"SET search_path TO {schema}")
+    conn.commit()
+    migrate(conn)
+
+def write(conn, votes, batch_size, metadata=None):
+    """Insert votes in batches the way store_votes does; returns elapsed seconds"""
+    cursor = conn.cursor()
+    started = time.perf_counter()
+    for start in range(0, len(votes), batch_size):
+        batch = votes[start:start + batch_size]
+        if metadata:
+            ids = metadata.encode(batch, metadata.connection_query(conn))
+            rows = [(v['choice'], source_id, v['timestamp'], v['ip'], user_agent_id, v['session_id'])
+                    for v, (source_id, user_agent_id) in zip(batch, ids)]
+            execute_values(cursor, COMPACT_SQL, rows, page_size=batch_size)
+        else:
+            rows = [(v['choice'], v['source'], v['timestamp'], v['ip'], v['user_agent'], v['session_id'])
+                    for v in batch]
+            execute_values(cursor, WIDE_SQL, rows, page_size=batch_size)
+        conn.commit()
+    return time.perf_counter() - started
+
+def measure(conn, schema, votes, batch_size, metadata=None):
+    create_schema(conn, schema)
+    cursor = conn.cursor()
+    lsn = wal_lsn(cursor)
+    elapsed = write(conn, votes, batch_size, metadata)
+    wal = wal_since(cursor, lsn)
+    cursor.execute("SELECT pg_total_relation_size('votes')")
+    size = cursor.fetchone()[0]
+    samples = []
+    for _ in range(20):
+        started = time.perf_counter()
+        cursor.execute("SELECT * FROM vote_summary ORDER BY vote_choice")
+        cursor.fetchall()
+        samples.append(time.perf_counter() - started)
+    conn.commit()
+    return {'size': size, 'wal': wal, 'rate': len(votes) / elapsed, 'summary': statistics.median(samples)}
+
+def report(name, result, count):
+    print(f"{name:<8} table={result['size'] / 1024 / 1024:8.1f} MiB ({result['size'] / count:6.1f} B/vote)"
+          f"  WAL={result['wal'] / 1024 / 1024:8.1f} MiB  {result['rate']:8.0f} votes/s"
+          f"  summary p50={result['summary'] * 1000:7.1f} ms")
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare wide and dictionary-encoded vote storage')
+    parser.add_argument('--dsn', default=os.getenv('BENCH_DATABASE_URL', 'host=localhost dbname=voting_app'))
+    parser.add_argument('--votes', type=int, default=200000)
+    parser.add_argument('--batch-size', type=int, default=1000)
+    args = parser.parse_args()
+
+    votes = make_votes(args.votes)
+    prefix = f'bench_compact_{os.getpid()}'
+    conn = psycopg2.connect(args.dsn)
+    try:
+        wide = measure(conn, f'{prefix}_wide', votes, args.batch_size)
+        metadata = MetadataDictionary()
+        compact = measure(conn, f'{prefix}_compact', votes, args.batch_size, metadata)
+
+        print(f"{args.votes} votes, {len(USER_AGENTS)} distinct user agents, batches of {args.batch_size}")
+        report('wide', wide, args.votes)
+        report('compact', compact, args.votes)
+        print(f"         saved {(1 - compact['size'] / wide['size']) * 100:.0f}% table size,"
+              f" {(1 - compact['wal'] / wide['wal']) * 100:.0f}% WAL;"
+              f" lookup cache {metadata.stats()['user_agents']}")
+
+        # Convert the wide table in place, as the backfill script would
+        cursor = conn.cursor()
+        cursor.execute(f"SET search_path TO {prefix}_wide")
+        conn.commit()
+        lsn = wal_lsn(cursor)
+        started = time.perf_counter()
+        converted = backfill(conn, batch_size=50000)
+        print(f"backfill {converted} rows in {time.perf_counter() - started:.1f}s,"
+              f" WAL={wal_since(cursor, lsn) / 1024 / 1024:.1f} MiB")
+        conn.commit()
+    finally:
+        conn.rollback()
+        cursor = conn.cursor()
+        for suffix in ('wide', 'compact'):
+            cursor.execute(f"DROP SCHEMA IF EXISTS {prefix}_{suffix} CASCADE")
+        conn.commit()
+        conn.close()
+
+if __name__ == '__main__':
+    main()
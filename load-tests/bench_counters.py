@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Microbenchmark for the vote counter backends used by app/app.py:
+the per-process dict, the shared-memory SharedCounters and Redis INCR.
+
+Usage:
+    python load-tests/bench_counters.py [--ops 200000] [--threads 4] [--processes 4]
+
+Redis is skipped when REDIS_HOST/REDIS_PORT is not reachable.
+"""
+
+import argparse
+import multiprocessing
+import os
+import sys
+import tempfile
+import threading
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from shared_counters import SharedCounters
+
+def run_threads(increment, ops, threads):
+    per_thread = ops // threads
+
+    def work():
+        for i in range(per_thread):
+            increment('cat' if i & 1 else 'dog')
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return time.perf_counter() - started
+
+def report(name, ops, elapsed, total):
+    print(f"{name:<28} {ops / elapsed:>12,.0f} ops/s  {elapsed / ops * 1e9:>8.0f} ns/op  total={total}")
+
+def bench_dict(ops, threads):
+    votes = {'cat': 0, 'dog': 0}
+    lock = threading.Lock()
+
+    def increment(name):
+        with lock:
+            votes[name] += 1
+
+    elapsed = run_threads(increment, ops, threads)
+    report('dict + lock (1 process)', ops, elapsed, sum(votes.values()))
+
+def bench_shared(path, ops, threads):
+    counters = SharedCounters(path)
+    elapsed = run_threads(counters.increment, ops, threads)
+    report('shared memory (1 process)', ops, elapsed, sum(counters.totals().values()))
+
+def shared_worker(path, ops, threads, barrier, results):
+    counters = SharedCounters(path)
+    barrier.wait()
+    results.put(run_threads(counters.increment, ops, threads))
+
+def bench_shared_processes(path, ops, threads, processes):
+    barrier = multiprocessing.Barrier(processes)
+    results = multiprocessing.Queue()
+    workers = [multiprocessing.Process(target=shared_worker,
+                                       args=(path, ops // processes, threads, barrier, results))
+               for _ in range(processes)]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join()
+    elapsed = max(results.get() for _ in workers)
+    total = sum(SharedCounters(path).totals().values())
+    report(f'shared memory ({processes} processes)', ops, elapsed, total)
+
+def bench_redis(ops, threads):
+    try:
+        import redis
+        client = redis.Redis(host=os.environ.get('REDIS_HOST', 'localhost'),
+                             port=int(os.environ.get('REDIS_PORT', 6379)))
+        client.ping()
+    except Exception as e:
+        print(f"{'redis INCR':<28} skipped ({e})")
+        return
+
+    client.delete('bench:cat', 'bench:dog')
+    elapsed = run_threads(lambda name: client.incr(f'bench:{name}'), ops, threads)
+    total = int(client.get('bench:cat') or 0) + int(client.get('bench:dog') or 0)
+    report('redis INCR', ops, elapsed, total)
+    client.delete('bench:cat', 'bench:dog')
+
+def main():
+    parser = argparse.ArgumentParser(description='Benchmark vote counter backends')
+    parser.add_argument('--ops', type=int, default=200000)
+    parser.add_argument('--threads', type=int, default=4)
+    parser.add_argument('--processes', type=int, default=4)
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(dir='/dev/shm' if os.path.isdir('/dev/shm') else None) as tmp:
+        bench_dict(args.ops, args.threads)
+        bench_shared(os.path.join(tmp, 'single'), args.ops, args.threads)
+        bench_shared_processes(os.path.join(tmp, 'multi'), args.ops, args.threads, args.processes)
+        bench_redis(min(args.ops, 20000), args.threads)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,225 @@
+#!/usr/bin/env python3
+"""
+Latency, throughput and errors of a voting app while its dependencies degrade.
+
+Starts the app with its dependencies routed through fault_proxy stand-ins:
+
+  onprem     HttpFaultProxy serving a stub on-premises /api/results
+             (ONPREM_API_URL), always present
+  postgres   TcpFaultProxy to --postgres host:port (DB_HOST/DB_PORT and
+             AZURE_DB_HOST/AZURE_DB_PORT); without it the app gets a closed port
+  redis      TcpFaultProxy to --redis host:port (REDIS_HOST/REDIS_PORT)
+
+then runs closed-loop clients against --path (plus --vote-share POST /vote)
+through each scenario in turn, injecting its faults into the --targets
+dependencies:
+
+  baseline   no faults
+  latency    200 ms +/- 50 ms per chunk/request
+  slow       2 s +/- 500 ms
+  drops      20% of connections/requests black-holed
+  resets     10% chance per chunk/request of a connection reset
+  blackhole  every new connection/request black-holed
+
+Per scenario it reports throughput, p50/p99/max latency, errors (5xx or no
+response), shed requests (429/503) and the share of responses flagged
+stale. --max-p99-ms / --max-error-rate turn it into a regression test: the
+exit status is 1 if any scenario exceeds them.
+
+Usage:
+    python load-tests/bench_degraded_dependencies.py [--app azure-voting-app.py] [--path /api/results] \\
+        [--targets onprem,postgres] [--postgres localhost:5432] [--redis localhost:6379] \\
+        [--scenarios baseline,latency,slow,drops,resets,blackhole] [--duration 20] [--clients 10] \\
+        [--max-p99-ms 1000 --max-error-rate 0.01] [--report degraded.json]
+"""
+
+import argparse
+import json
+import os
+import random
+import statistics
+import subprocess
+import sys
+import threading
+import time
+
+import requests
+
+from bench_startup import free_port
+from fault_proxy import HttpFaultProxy, TcpFaultProxy
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+
+SCENARIOS = {
+    'baseline': {},
+    'latency': {'latency_ms': 200, 'jitter_ms': 50},
+    'slow': {'latency_ms': 2000, 'jitter_ms': 500},
+    'drops': {'drop': 0.2},
+    'resets': {'reset': 0.1},
+    'blackhole': {'drop': 1.0},
+}
+
+def parse_address(text):
+    host, _, port = text.rpartition(':')
+    return host or 'localhost', int(port)
+
+class Clients:
+    def __init__(self, base, path, count, vote_share, choices, timeout):
+        self.base = base
+        self.path = path
+        self.count = count
+        self.vote_share = vote_share
+        self.choices = choices
+        self.timeout = timeout
+
+    def run(self, duration):
+        samples = []  # (latency, status or None, stale)
+        lock = threading.Lock()
+        deadline = time.monotonic() + duration
+
+        def work(client_id):
+            session = requests.Session()
+            mine = []
+            while time.monotonic() < deadline:
+                started = time.monotonic()
+                status, stale = None, False
+                try:
+                    if random.random() < self.vote_share:
+                        choice = random.choice(self.choices)
+                        response = session.post(f'{self.base}/vote', timeout=self.timeout,
+                                                json={'vote': choice, 'choice': choice, 'session_id': f'degraded-{client_id}'})
+                    else:
+                        response = session.get(f'{self.base}{self.path}', timeout=self.timeout)
+                        if response.headers.get('Content-Type', '').startswith('application/json'):
+                            stale = bool(response.json().get('stale'))
+                    status = response.status_code
+                except (requests.RequestException, ValueError):
+                    pass
+                mine.append((time.monotonic() - started, status, stale))
+            with lock:
+                samples.extend(mine)
+
+        threads = [threading.Thread(target=work, args=(i,)) for i in range(self.count)]
+        started = time.monotonic()
+        for t in threads:
+            t.start()
+        for t in threads:
+            t.join()
+        return samples, time.monotonic() - started
+
+def summarise(samples, elapsed):
+    latencies = sorted(s[0] * 1000 for s in samples)
+    errors = sum(1 for s in samples if s[1] is None or (s[1] >= 500 and s[1] != 503))
+    return {
+        'requests': len(samples),
+        'throughput': round(len(samples) / elapsed, 1),
+        'p50_ms': round(statistics.median(latencies), 1) if latencies else None,
+        'p99_ms': round(latencies[min(len(latencies) - 1, int(len(latencies) * 0.99))], 1) if latencies else None,
+        'max_ms': round(latencies[-1], 1) if latencies else None,
+        'error_rate': round(errors / len(samples), 4) if samples else 1.0,
+        'shed': sum(1 for s in samples if s[1] in (429, 503)),
+        'stale_share': round(sum(1 for s in samples if s[2]) / len(samples), 4) if samples else 0.0
+    }
+
+def start_app(app_path, port, env, ready_timeout):
+    proc = subprocess.Popen([sys.executable, os.path.join(HERE, 'bench_startup.py'), app_path,
+                             '--child', '--port', str(port)],
+                            env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    deadline = time.monotonic() + ready_timeout
+    while time.monotonic() < deadline:
+        if proc.poll() is not None:
+            raise RuntimeError(f"{app_path} exited with status {proc.returncode}")
+        try:
+            # Any answer will do: /ready may stay 503 with a dependency down on purpose
+            requests.get(f'http://127.0.0.1:{port}/ready', timeout=1)
+            return proc
+        except requests.RequestException:
+            time.sleep(0.1)
+    proc.terminate()
+    raise RuntimeError(f"{app_path} did not start within {ready_timeout}s")
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure a voting app under injected dependency faults')
+    parser.add_argument('--app', default=os.path.join(HERE, '..', 'azure-voting-app.py'))
+    parser.add_argument('--path', default='/api/results', help='GET endpoint exercised by the clients')
+    parser.add_argument('--vote-share', type=float, default=0.2, help='share of requests that POST /vote')
+    parser.add_argument('--choices', default='cat,dog')
+    parser.add_argument('--targets', default='onprem,postgres', help='dependencies that get the faults')
+    parser.add_argument('--postgres', type=parse_address, help='real Postgres host:port to proxy')
+    parser.add_argument('--redis', type=parse_address, help='real Redis host:port to proxy')
+    parser.add_argument('--scenarios', default=','.join(SCENARIOS))
+    parser.add_argument('--duration', type=float, default=20, help='seconds of traffic per scenario')
+    parser.add_argument('--settle', type=float, default=2, help='seconds between setting faults and measuring')
+    parser.add_argument('--clients', type=int, default=10)
+    parser.add_argument('--request-timeout', type=float, default=10)
+    parser.add_argument('--ready-timeout', type=float, default=60)
+    parser.add_argument('--max-p99-ms', type=float, help='fail if any scenario has a higher p99')
+    parser.add_argument('--max-error-rate', type=float, help='fail if any scenario has a higher error rate')
+    parser.add_argument('--report', help='write the results as JSON')
+    args = parser.parse_args()
+
+    scenarios = args.scenarios.split(',')
+    unknown = [name for name in scenarios if name not in SCENARIOS]
+    if unknown:
+        parser.error(f"unknown scenarios {unknown}, choose from {list(SCENARIOS)}")
+    targets = set(args.targets.split(','))
+
+    onprem = HttpFaultProxy(stub_body=lambda: {'onprem_votes': {'cat': 40, 'dog': 38}}).start()
+    proxies = {'onprem': onprem}
+    env = {**os.environ, 'ONPREM_API_URL': f'http://127.0.0.1:{onprem.port}/api/results',
+           'SHARED_COUNTERS_PATH': ''}
+    if args.postgres:
+        proxies['postgres'] = TcpFaultProxy(*args.postgres).start()
+    postgres_port = proxies['postgres'].port if 'postgres' in proxies else free_port()
+    env.update({'DB_HOST': '127.0.0.1', 'DB_PORT': str(postgres_port),
+                'AZURE_DB_HOST': '127.0.0.1', 'AZURE_DB_PORT': str(postgres_port), 'AZURE_DB_SSLMODE': 'prefer'})
+    if args.redis:
+        proxies['redis'] = TcpFaultProxy(*args.redis).start()
+    env.update({'REDIS_HOST': '127.0.0.1',
+                'REDIS_PORT': str(proxies['redis'].port if 'redis' in proxies else free_port())})
+
+    port = free_port()
+    app = start_app(args.app, port, env, args.ready_timeout)
+    clients = Clients(f'http://127.0.0.1:{port}', args.path, args.clients, args.vote_share,
+                      args.choices.split(','), args.request_timeout)
+    print(f"{os.path.basename(args.app)} on :{port}, faults on {sorted(targets & proxies.keys())}, "
+          f"{args.clients} clients, {args.duration:g}s per scenario\n")
+    print(f"{'scenario':<10} {'req/s':>8} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'errors':>7} {'shed':>6} {'stale':>6}")
+
+    results = {}
+    try:
+        for name in scenarios:
+            for target, proxy in proxies.items():
+                proxy.faults.clear()
+                if target in targets:
+                    proxy.faults.set(**SCENARIOS[name])
+            time.sleep(args.settle)
+            samples, elapsed = clients.run(args.duration)
+            result = summarise(samples, elapsed)
+            result['faults'] = SCENARIOS[name]
+            result['proxies'] = {target: proxy.stats() for target, proxy in proxies.items()}
+            results[name] = result
+            print(f"{name:<10} {result['throughput']:>8} {result['p50_ms']:>8} {result['p99_ms']:>8} "
+                  f"{result['max_ms']:>8} {result['error_rate']:>7.2%} {result['shed']:>6} {result['stale_share']:>6.0%}")
+            for proxy in proxies.values():
+                proxy.faults.clear()
+    finally:
+        app.terminate()
+        app.wait()
+
+    failures = []
+    for name, result in results.items():
+        if args.max_p99_ms is not None and (result['p99_ms'] or 0) > args.max_p99_ms:
+            failures.append(f"{name}: p99 {result['p99_ms']}ms > {args.max_p99_ms}ms")
+        if args.max_error_rate is not None and result['error_rate'] > args.max_error_rate:
+            failures.append(f"{name}: error rate {result['error_rate']:.2%} > {args.max_error_rate:.2%}")
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump({'app': args.app, 'path': args.path, 'targets': sorted(targets),
+                       'scenarios': results, 'failures': failures}, f, indent=2)
+    for failure in failures:
+        print(f"FAIL {failure}")
+    sys.exit(1 if failures else 0)
+
+if __name__ == '__main__':
+    main()
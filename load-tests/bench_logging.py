@@ -0,0 +1,118 @@
+#!/usr/bin/env python3
+"""
+Request latency with synchronous print() logging vs the queued, sampled
+EventLog (app/event_log.py) at different verbosity levels.
+
+A small Flask app serves a results-like endpoint that logs the way
+azure-voting-app.py used to (a line per row plus the whole result) or through
+EventLog. Log output goes to a pipe drained by a deliberately slow reader,
+standing in for a container runtime that can't keep up with stdout; once
+the pipe buffer fills, synchronous writes block the request threads.
+
+Usage:
+    python load-tests/bench_logging.py [--requests 5000] [--threads 8] [--rows 20]
+        [--drain-delay-ms 2] [--sample-rate 0.01]
+"""
+
+import argparse
+import os
+import statistics
+import sys
+import threading
+import time
+
+from flask import Flask, jsonify
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from event_log import EventLog
+
+def slow_sink(delay):
+    """A line-buffered file whose reader drains 4 KiB per delay seconds"""
+    read_fd, write_fd = os.pipe()
+
+    def drain():
+        with os.fdopen(read_fd, 'rb') as reader:
+            while reader.read1(4096):
+                time.sleep(delay)
+
+    threading.Thread(target=drain, daemon=True).start()
+    return os.fdopen(write_fd, 'w', buffering=1)
+
+def build_app(mode, sink, rows, log):
+    app = Flask(__name__)
+    data = [(f'option-{i}', i * 7) for i in range(rows)]
+
+    @app.route('/api/results')
+    def api_results():
+        votes = {}
+        if mode == 'print':
+            print("📊 Azure PostgreSQL rows:", file=sink)
+        for option, count in data:
+            if mode == 'print':
+                print(f"  Azure row: option='{option}', count={count}", file=sink)
+            votes[option] = count
+        result = {'votes': votes, 'total_votes': sum(votes.values()), 'stale': False}
+        if mode == 'print':
+            print(f"📊 Azure API result: {result}", file=sink)
+        elif log:
+            log.debug('azure-db', 'votes loaded', rows=len(data), votes=votes)
+            log.event('results', 'results served', total_votes=result['total_votes'], stale=False)
+        return jsonify(result)
+
+    return app
+
+def run(app, requests, threads):
+    latencies = []
+    lock = threading.Lock()
+    per_thread = requests // threads
+
+    def work():
+        client = app.test_client()
+        mine = []
+        for _ in range(per_thread):
+            started = time.perf_counter()
+            client.get('/api/results')
+            mine.append(time.perf_counter() - started)
+        with lock:
+            latencies.extend(mine)
+
+    workers = [threading.Thread(target=work) for _ in range(threads)]
+    started = time.perf_counter()
+    for t in workers:
+        t.start()
+    for t in workers:
+        t.join()
+    return time.perf_counter() - started, sorted(latencies)
+
+def main():
+    parser = argparse.ArgumentParser(description='Request latency under different logging setups')
+    parser.add_argument('--requests', type=int, default=5000)
+    parser.add_argument('--threads', type=int, default=8)
+    parser.add_argument('--rows', type=int, default=20, help='vote_option rows logged per request by print mode')
+    parser.add_argument('--drain-delay-ms', type=float, default=2.0,
+                        help='reader pause per 4 KiB drained from the log pipe')
+    parser.add_argument('--sample-rate', type=float, default=0.01, help='results sample rate for the sampled setup')
+    args = parser.parse_args()
+
+    setups = [
+        ('no logging', 'none', None),
+        ('print() per row + result', 'print', None),
+        ('EventLog level=debug', 'event_log', {'level': 'debug'}),
+        ('EventLog level=info', 'event_log', {'level': 'info'}),
+        (f'EventLog info, sampled {args.sample_rate}', 'event_log',
+         {'level': 'info', 'rates': {'results': args.sample_rate}}),
+        ('EventLog level=error', 'event_log', {'level': 'error'}),
+    ]
+    print(f"{args.requests} requests, {args.threads} threads, log pipe drained 4 KiB per {args.drain_delay_ms}ms\n")
+    print(f"{'setup':<34} {'req/s':>9} {'p50 ms':>8} {'p99 ms':>8} {'max ms':>8} {'dropped':>8}")
+    for name, mode, settings in setups:
+        sink = slow_sink(args.drain_delay_ms / 1000)
+        log = EventLog(stream=sink, **settings) if settings else None
+        elapsed, latencies = run(build_app(mode, sink, args.rows, log), args.requests, args.threads)
+        p99 = latencies[int(len(latencies) * 0.99) - 1]
+        print(f"{name:<34} {len(latencies) / elapsed:>9,.0f} {statistics.median(latencies) * 1000:>8.2f} "
+              f"{p99 * 1000:>8.2f} {latencies[-1] * 1000:>8.2f} {log.dropped if log else '-':>8}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,301 @@
+#!/usr/bin/env python3
+"""
+Seed the vote schemas with synthetic votes at scale and benchmark every read query.
+
+Three schemas are built side by side in one local database:
+
+  bench_app        the app-with-db schema (all migrations), read via vote_summary,
+                   vote_summary_clean and the tiered-storage reconcile query
+  bench_azure      the azure-voting-app vote_option counter table
+  bench_analytics  the legacy votes(vote_option, source, timestamp) table that the
+                   analytics scripts (cross_environment_analytics, hybrid server) query
+
+Votes are generated with a skewed choice ratio, a source mix, diurnal
+timestamps (an evening peak) and Zipf-distributed IPs and user agents, and
+streamed into Postgres with COPY one batch at a time. Every query is
+then run --runs times for a latency distribution, and once under
+EXPLAIN (ANALYZE, BUFFERS) for its plan. Everything goes into a JSON report;
+pass --compare with an earlier report to print per-query changes.
+
+Seeding tens of millions of rows takes a while, so --keep leaves the schemas
+in place and --skip-seed reuses them for the next run.
+
+Usage:
+    python load-tests/bench_schema_queries.py --dsn "host=localhost dbname=voting_bench" --rows 10000000 --keep
+    python load-tests/bench_schema_queries.py --dsn "host=localhost dbname=voting_bench" --skip-seed \\
+        --report after.json --compare before.json
+"""
+
+import argparse
+import bisect
+import itertools
+import json
+import math
+import os
+import random
+import statistics
+import subprocess
+import sys
+import time
+from datetime import datetime, timedelta, timezone
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from migrations import migrate
+from tiered_store import SUMMARY_QUERY
+
+LEGACY_SCHEMA_SQL = '''
+    CREATE TABLE IF NOT EXISTS bench_analytics.votes (
+        id SERIAL PRIMARY KEY,
+        vote_option VARCHAR(10) NOT NULL,
+        source VARCHAR(20) NOT NULL,
+        timestamp TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP
+    );
+    CREATE TABLE IF NOT EXISTS bench_azure.vote_option (
+        id SERIAL PRIMARY KEY,
+        vote_option VARCHAR(10) NOT NULL UNIQUE,
+        vote_count INTEGER NOT NULL DEFAULT 0
+    );
+'''
+
+# (name, origin, sql, params): the read queries exactly as the apps and scripts issue them
+QUERIES = [
+    ('vote_summary', 'app-with-db.py results/api_results',
+     "SELECT * FROM bench_app.vote_summary ORDER BY vote_choice", None),
+    ('vote_summary_clean', 'app-with-db.py abuse-excluded totals',
+     "SELECT * FROM bench_app.vote_summary_clean ORDER BY vote_choice", None),
+    ('tiered_reconcile', 'tiered_store.postgres_counts',
+     SUMMARY_QUERY.replace('FROM votes_expanded', 'FROM bench_app.votes_expanded'), None),
+    ('azure_read_votes', 'azure-voting-app.py READ_VOTES_SQL',
+     "SELECT vote_option, vote_count FROM bench_azure.vote_option ORDER BY vote_option", None),
+    ('analytics_counts', 'cross_environment_analytics get_vote_counts',
+     "SELECT vote_option, COUNT(*) as count FROM bench_analytics.votes GROUP BY vote_option ORDER BY vote_option", None),
+    ('analytics_total', 'cross_environment_analytics get_vote_counts',
+     "SELECT COUNT(*) FROM bench_analytics.votes", None),
+    ('analytics_recent', 'cross_environment_analytics get_vote_counts',
+     "SELECT vote_option, source, timestamp FROM bench_analytics.votes ORDER BY timestamp DESC LIMIT 10", None),
+    ('analytics_export_batch', 'cross_environment_analytics iter_vote_batches',
+     "SELECT id, vote_option, source, timestamp FROM bench_analytics.votes WHERE id > %s AND timestamp >= %s "
+     "ORDER BY id LIMIT 5000", 'export'),
+    ('analytics_grouping_sets', 'hybrid_analytics_server AGGREGATE_QUERY',
+     "SELECT vote_option, source, COUNT(*), GROUPING(vote_option), GROUPING(source) FROM bench_analytics.votes "
+     "GROUP BY GROUPING SETS ((vote_option), (source), ())", None),
+]
+
+class VoteGenerator:
+    """Synthetic votes with realistic skew; all draws use cumulative weight tables"""
+
+    def __init__(self, days, cat_share, azure_share, ips, user_agents, seed=1):
+        self.random = random.Random(seed)
+        self.end = datetime.now(timezone.utc).replace(minute=0, second=0, microsecond=0)
+        self.days = days
+        self.cat_share = cat_share
+        self.azure_share = azure_share
+        # Diurnal curve: quiet at 04:00 UTC, peaking around 20:00
+        self.hour_weights = list(itertools.accumulate(
+            1.2 + math.sin((hour - 14) / 24 * 2 * math.pi) for hour in range(24)))
+        self.ips = [f'{10 + i % 200}.{i >> 16 & 255}.{i >> 8 & 255}.{i & 255}' for i in range(ips)]
+        self.ip_weights = list(itertools.accumulate(1 / (rank + 1) for rank in range(ips)))
+        self.user_agents = [
+            f'Mozilla/5.0 ({("Windows NT 10.0; Win64; x64", "Macintosh; Intel Mac OS X 14_4", "Linux; Android 14")[i % 3]}) '
+            f'AppleWebKit/537.36 (KHTML, like Gecko) Chrome/{100 + i % 30}.0.{i}.0 Safari/537.36'
+            for i in range(user_agents)]
+        self.agent_weights = list(itertools.accumulate(1 / (rank + 1) ** 1.2 for rank in range(user_agents)))
+
+    def pick(self, values, cum_weights):
+        return values[bisect.bisect(cum_weights, self.random.random() * cum_weights[-1])]
+
+    def timestamp(self):
+        day = self.random.randrange(self.days)
+        hour = bisect.bisect(self.hour_weights, self.random.random() * self.hour_weights[-1])
+        return (self.end - timedelta(days=day + 1, hours=-hour, seconds=-self.random.randrange(3600))).isoformat()
+
+    def vote(self):
+        rnd = self.random.random
+        return ('cat' if rnd() < self.cat_share else 'dog',
+                'azure' if rnd() < self.azure_share else 'onprem',
+                self.timestamp(),
+                self.pick(self.ips, self.ip_weights),
+                self.pick(self.user_agents, self.agent_weights))
+
+class CsvStream:
+    """File-like object feeding COPY from a row generator a chunk at a time"""
+
+    def __init__(self, rows, format_row):
+        self.rows = rows
+        self.format_row = format_row
+        self.buffer = ''
+
+    def read(self, size=-1):
+        size = size if size and size > 0 else 1 << 16
+        while len(self.buffer) < size:
+            chunk = ''.join(self.format_row(row) for row in itertools.islice(self.rows, 1000))
+            if not chunk:
+                break
+            self.buffer += chunk
+        data, self.buffer = self.buffer[:size], self.buffer[size:]
+        return data
+
+def seed(conn, args):
+    cursor = conn.cursor()
+    cursor.execute("CREATE SCHEMA IF NOT EXISTS bench_app; CREATE SCHEMA IF NOT EXISTS bench_azure; CREATE SCHEMA IF NOT EXISTS bench_analytics")
+    cursor.execute("SET search_path TO bench_app")
+    conn.commit()
+    migrate(conn)
+    cursor.execute(LEGACY_SCHEMA_SQL)
+    conn.commit()
+
+    generator = VoteGenerator(args.days, args.cat_share, args.azure_share, args.ips, args.user_agents)
+    started = time.perf_counter()
+    loaded = 0
+    counts = {'cat': 0, 'dog': 0}
+    while loaded < args.rows:
+        batch = min(args.copy_batch, args.rows - loaded)
+        votes = [generator.vote() for _ in range(batch)]
+        for choice in ('cat', 'dog'):
+            counts[choice] += sum(1 for vote in votes if vote[0] == choice)
+        # Same votes in both layouts; one COPY per table per batch
+        cursor.copy_expert(
+            "COPY bench_app.votes (vote_choice, vote_source, timestamp, ip_address, user_agent, session_id) "
+            "FROM STDIN WITH (FORMAT csv)",
+            CsvStream(iter(votes), lambda v: f'{v[0]},{v[1]},{v[2]},{v[3]},"{v[4]}",s-{hash(v[3]) & 0xFFFFFF:x}\n'))
+        cursor.copy_expert(
+            "COPY bench_analytics.votes (vote_option, source, timestamp) FROM STDIN WITH (FORMAT csv)",
+            CsvStream(iter(votes), lambda v: f'{v[0]},{v[1]},{v[2]}\n'))
+        conn.commit()
+        loaded += batch
+        rate = loaded / (time.perf_counter() - started)
+        print(f"\r  seeded {loaded:,}/{args.rows:,} votes ({rate:,.0f}/s)", end='', flush=True)
+    print()
+
+    cursor.execute('''
+        INSERT INTO bench_azure.vote_option (vote_option, vote_count) VALUES ('cat', %s), ('dog', %s)
+        ON CONFLICT (vote_option) DO UPDATE SET vote_count = bench_azure.vote_option.vote_count + EXCLUDED.vote_count
+    ''', (counts['cat'], counts['dog']))
+    conn.commit()
+    conn.autocommit = True
+    for table in ('bench_app.votes', 'bench_analytics.votes', 'bench_azure.vote_option'):
+        cursor.execute(f"VACUUM ANALYZE {table}")
+    conn.autocommit = False
+    return time.perf_counter() - started
+
+def query_params(kind, cursor):
+    if kind == 'export':
+        # Resume point half way through the table, last week of data
+        cursor.execute("SELECT COALESCE(MAX(id) / 2, 0) FROM bench_analytics.votes")
+        return (cursor.fetchone()[0], datetime.now(timezone.utc) - timedelta(days=7))
+    return None
+
+def run_query(cursor, name, sql, params, runs):
+    cursor.execute(f"EXPLAIN (ANALYZE, BUFFERS, FORMAT JSON) {sql}", params)
+    plan = cursor.fetchone()[0][0]
+    samples = []
+    for _ in range(runs):
+        started = time.perf_counter()
+        cursor.execute(sql, params)
+        cursor.fetchall()
+        samples.append(time.perf_counter() - started)
+    samples.sort()
+    root = plan['Plan']
+    return {
+        'runs': runs,
+        'p50_ms': statistics.median(samples) * 1000,
+        'p95_ms': samples[max(0, int(len(samples) * 0.95) - 1)] * 1000,
+        'max_ms': samples[-1] * 1000,
+        'plan_node': root['Node Type'],
+        'planning_ms': plan.get('Planning Time'),
+        'execution_ms': plan.get('Execution Time'),
+        'shared_hit_blocks': root.get('Shared Hit Blocks'),
+        'shared_read_blocks': root.get('Shared Read Blocks'),
+        'plan': plan
+    }
+
+def environment(cursor):
+    cursor.execute("SELECT version(), current_setting('shared_buffers'), current_setting('work_mem')")
+    version, shared_buffers, work_mem = cursor.fetchone()
+    cursor.execute("SELECT COUNT(*) FROM bench_app.votes")
+    rows = cursor.fetchone()[0]
+    cursor.execute("SELECT pg_total_relation_size('bench_app.votes'), pg_total_relation_size('bench_analytics.votes')")
+    app_size, analytics_size = cursor.fetchone()
+    try:
+        revision = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], capture_output=True,
+                                  text=True, cwd=os.path.dirname(os.path.abspath(__file__))).stdout.strip()
+    except OSError:
+        revision = None
+    return {
+        'postgres': version,
+        'shared_buffers': shared_buffers,
+        'work_mem': work_mem,
+        'rows': rows,
+        'app_votes_bytes': app_size,
+        'analytics_votes_bytes': analytics_size,
+        'git_revision': revision,
+        'started_at': datetime.now(timezone.utc).isoformat()
+    }
+
+def compare(report, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)
+    print(f"\nvs {baseline_path} ({baseline['environment']['rows']:,} rows, {baseline['environment'].get('git_revision')})")
+    for name, result in report['queries'].items():
+        before = baseline['queries'].get(name)
+        if not before:
+            print(f"  {name:<26} new")
+            continue
+        change = (result['p50_ms'] - before['p50_ms']) / before['p50_ms'] * 100 if before['p50_ms'] else 0
+        plan_note = '' if result['plan_node'] == before['plan_node'] else f"  plan {before['plan_node']} -> {result['plan_node']}"
+        print(f"  {name:<26} p50 {before['p50_ms']:9.2f} -> {result['p50_ms']:9.2f} ms ({change:+6.1f}%){plan_note}")
+
+def main():
+    parser = argparse.ArgumentParser(description='Seed the vote schemas at scale and benchmark every read query')
+    parser.add_argument('--dsn', default=os.getenv('BENCH_DATABASE_URL', 'host=localhost dbname=voting_bench'))
+    parser.add_argument('--rows', type=int, default=1000000)
+    parser.add_argument('--days', type=int, default=30)
+    parser.add_argument('--cat-share', type=float, default=0.58)
+    parser.add_argument('--azure-share', type=float, default=0.35)
+    parser.add_argument('--ips', type=int, default=200000, help='distinct client IPs (Zipf-distributed)')
+    parser.add_argument('--user-agents', type=int, default=500)
+    parser.add_argument('--copy-batch', type=int, default=200000)
+    parser.add_argument('--runs', type=int, default=20)
+    parser.add_argument('--report', default='schema-queries-report.json')
+    parser.add_argument('--compare', help='earlier report to compare against')
+    parser.add_argument('--skip-seed', action='store_true', help='reuse schemas left by a previous --keep run')
+    parser.add_argument('--keep', action='store_true', help='leave the seeded schemas in place')
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(args.dsn)
+    try:
+        report = {'seed': None, 'queries': {}}
+        if not args.skip_seed:
+            elapsed = seed(conn, args)
+            report['seed'] = {key: getattr(args, key) for key in
+                              ('rows', 'days', 'cat_share', 'azure_share', 'ips', 'user_agents')}
+            report['seed']['seconds'] = elapsed
+        cursor = conn.cursor()
+        report['environment'] = environment(cursor)
+        print(f"{report['environment']['rows']:,} votes; {args.runs} runs per query")
+        for name, origin, sql, kind in QUERIES:
+            result = run_query(cursor, name, sql, query_params(kind, cursor), args.runs)
+            result['origin'] = origin
+            result['sql'] = ' '.join(sql.split())
+            report['queries'][name] = result
+            print(f"  {name:<26} p50={result['p50_ms']:9.2f} ms  p95={result['p95_ms']:9.2f} ms"
+                  f"  {result['plan_node']:<16} read={result['shared_read_blocks']} hit={result['shared_hit_blocks']}")
+        conn.rollback()
+
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+        print(f"Report written to {args.report}")
+        if args.compare:
+            compare(report, args.compare)
+    finally:
+        conn.rollback()
+        if not args.keep:
+            conn.autocommit = True
+            conn.cursor().execute("DROP SCHEMA IF EXISTS bench_app, bench_azure, bench_analytics CASCADE")
+        conn.close()
+
+if __name__ == '__main__':
+    main()
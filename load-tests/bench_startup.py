@@ -0,0 +1,107 @@
+#!/usr/bin/env python3
+"""
+Cold-start timings for the voting apps, as a freshly scheduled pod sees them:
+
+  import        time to import the app module (Flask app, clients, config)
+  ready         time from process start until /ready answers 200
+  first         latency of the first real request once ready
+  second        latency of the next request, for comparison
+
+Each run starts the app in a new process so nothing is shared between runs.
+Point it at the same Postgres/Redis the app would use in the cluster via the
+usual environment variables (DB_HOST, REDIS_HOST, ...).
+
+Usage:
+    python load-tests/bench_startup.py app/app-with-db.py [--runs 5] [--path /api/results]
+    python load-tests/bench_startup.py azure-voting-app.py --path /api/results
+"""
+
+import argparse
+import importlib.util
+import json
+import os
+import socket
+import statistics
+import subprocess
+import sys
+import time
+
+import requests
+
+def child(app_path, port):
+    """Import the app, report the import time, then serve it"""
+    started = time.perf_counter()
+    app_dir = os.path.dirname(os.path.abspath(app_path))
+    sys.path.insert(0, app_dir)
+    spec = importlib.util.spec_from_file_location('bench_app', app_path)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    print(json.dumps({'import': time.perf_counter() - started}), flush=True)
+
+    from werkzeug.serving import make_server
+    module.warmup.start()
+    make_server('127.0.0.1', port, module.app, threaded=True).serve_forever()
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def run_once(app_path, path, ready_timeout):
+    port = free_port()
+    base = f'http://127.0.0.1:{port}'
+    started = time.perf_counter()
+    proc = subprocess.Popen([sys.executable, __file__, '--child', app_path, '--port', str(port)],
+                            stdout=subprocess.PIPE, stderr=subprocess.DEVNULL, text=True)
+    try:
+        line = proc.stdout.readline()
+        while line and not line.startswith('{'):
+            line = proc.stdout.readline()
+        if not line:
+            raise RuntimeError(f"{app_path} exited before importing (status {proc.wait()})")
+        result = json.loads(line)
+
+        session = requests.Session()
+        deadline = started + ready_timeout
+        while True:
+            try:
+                if session.get(f'{base}/ready', timeout=1).status_code == 200:
+                    break
+            except requests.ConnectionError:
+                pass
+            if time.perf_counter() > deadline:
+                raise RuntimeError(f"/ready not 200 after {ready_timeout}s")
+            time.sleep(0.01)
+        result['ready'] = time.perf_counter() - started
+
+        for name in ('first', 'second'):
+            request_started = time.perf_counter()
+            session.get(f'{base}{path}', timeout=30)
+            result[name] = time.perf_counter() - request_started
+        return result
+    finally:
+        proc.terminate()
+        proc.wait()
+
+def main():
+    parser = argparse.ArgumentParser(description='Measure import time, time-to-ready and first-request latency')
+    parser.add_argument('app', help='path to app.py, app-with-db.py or azure-voting-app.py')
+    parser.add_argument('--runs', type=int, default=5)
+    parser.add_argument('--path', default='/results', help='request timed after /ready flips')
+    parser.add_argument('--ready-timeout', type=float, default=60)
+    parser.add_argument('--child', action='store_true', help=argparse.SUPPRESS)
+    parser.add_argument('--port', type=int, help=argparse.SUPPRESS)
+    args = parser.parse_args()
+
+    if args.child:
+        child(args.app, args.port)
+        return
+
+    results = [run_once(args.app, args.path, args.ready_timeout) for _ in range(args.runs)]
+    print(f"{args.app}: {args.runs} cold starts, GET {args.path}")
+    for name in ('import', 'ready', 'first', 'second'):
+        samples = [r[name] * 1000 for r in results]
+        print(f"  {name:<8} median={statistics.median(samples):8.1f} ms  max={max(samples):8.1f} ms")
+
+if __name__ == '__main__':
+    main()
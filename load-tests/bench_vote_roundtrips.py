@@ -0,0 +1,140 @@
+#!/usr/bin/env python3
+"""
+Per-vote latency and round-trips for the Postgres vote paths in app-with-db:
+
+  psycopg2      connect per request, INSERT + COMMIT, then a new connection
+                for the summary read the page makes right after voting
+  prepared      psycopg 3 pool, prepared INSERT then prepared summary read
+  pipelined     psycopg 3 pool, prepared INSERT + summary read in one pipeline
+
+Round-trips are estimated as latency divided by the latency of a bare
+"SELECT 1" on a pooled connection, so run it against a remote or
+latency-injected database for meaningful numbers. Tables are created in a
+throwaway schema that is dropped afterwards.
+
+Usage:
+    python load-tests/bench_vote_roundtrips.py --dsn "host=localhost dbname=voting_app user=votinguser password=..." [--votes 500]
+"""
+
+import argparse
+import os
+import statistics
+import time
+
+import psycopg2
+from psycopg_pool import ConnectionPool
+
+SCHEMA = f'bench_roundtrips_{os.getpid()}'
+
+SCHEMA_SQL = f"""
+    CREATE SCHEMA {SCHEMA};
+    CREATE TABLE {SCHEMA}.votes (
+        id SERIAL PRIMARY KEY,
+        vote_choice VARCHAR(10) NOT NULL CHECK (vote_choice IN ('cat', 'dog')),
+        vote_source VARCHAR(20) NOT NULL CHECK (vote_source IN ('azure', 'onprem')),
+        timestamp TIMESTAMP WITH TIME ZONE DEFAULT CURRENT_TIMESTAMP,
+        ip_address INET,
+        user_agent TEXT,
+        session_id VARCHAR(255)
+    );
+    CREATE VIEW {SCHEMA}.vote_summary AS
+    SELECT vote_choice,
+           COUNT(*) as total_votes,
+           COUNT(CASE WHEN vote_source = 'azure' THEN 1 END) as azure_votes,
+           COUNT(CASE WHEN vote_source = 'onprem' THEN 1 END) as onprem_votes,
+           ROUND(COUNT(*) * 100.0 / (SELECT COUNT(*) FROM {SCHEMA}.votes), 2) as percentage
+    FROM {SCHEMA}.votes
+    GROUP BY vote_choice;
+"""
+
+INSERT_SQL = f"INSERT INTO {SCHEMA}.votes (vote_choice, vote_source, ip_address, user_agent) VALUES (%s, %s, %s, %s)"
+SUMMARY_SQL = f"SELECT * FROM {SCHEMA}.vote_summary ORDER BY vote_choice"
+
+def vote_params(i):
+    return ('cat' if i % 3 else 'dog', 'onprem', '10.0.0.1', 'bench/1.0')
+
+def time_calls(fn, count):
+    samples = []
+    for i in range(count):
+        started = time.perf_counter()
+        fn(i)
+        samples.append(time.perf_counter() - started)
+    return samples
+
+def bench_psycopg2(dsn, count):
+    def vote(i):
+        conn = psycopg2.connect(dsn)
+        cursor = conn.cursor()
+        cursor.execute(INSERT_SQL, vote_params(i))
+        conn.commit()
+        conn.close()
+        conn = psycopg2.connect(dsn)
+        cursor = conn.cursor()
+        cursor.execute(SUMMARY_SQL)
+        cursor.fetchall()
+        conn.close()
+    return time_calls(vote, count)
+
+def configure(conn):
+    conn.autocommit = True
+    conn.prepare_threshold = 0
+
+def bench_prepared(pool, count):
+    def vote(i):
+        with pool.connection() as conn:
+            conn.execute(INSERT_SQL, vote_params(i), prepare=True)
+            conn.cursor(binary=True).execute(SUMMARY_SQL, prepare=True).fetchall()
+    return time_calls(vote, count)
+
+def bench_pipelined(pool, count):
+    def vote(i):
+        with pool.connection() as conn:
+            with conn.pipeline(), conn.transaction():
+                conn.execute(INSERT_SQL, vote_params(i), prepare=True)
+                summary = conn.cursor(binary=True)
+                summary.execute(SUMMARY_SQL, prepare=True)
+            summary.fetchall()
+    return time_calls(vote, count)
+
+def bench_ping(pool, count):
+    def ping(_):
+        with pool.connection() as conn:
+            conn.execute("SELECT 1").fetchone()
+    return time_calls(ping, count)
+
+def report(name, samples, rtt):
+    samples = sorted(samples)
+    p50 = statistics.median(samples)
+    p95 = samples[int(len(samples) * 0.95) - 1]
+    print(f"{name:<12} p50={p50 * 1000:8.2f} ms  p95={p95 * 1000:8.2f} ms  ~{p50 / rtt:4.1f} round-trips/vote")
+
+def main():
+    parser = argparse.ArgumentParser(description='Compare per-vote round-trips across Postgres access paths')
+    parser.add_argument('--dsn', default=os.getenv('BENCH_DATABASE_URL', 'host=localhost dbname=voting_app'))
+    parser.add_argument('--votes', type=int, default=500)
+    args = parser.parse_args()
+
+    setup = psycopg2.connect(args.dsn)
+    setup.autocommit = True
+    setup.cursor().execute(SCHEMA_SQL)
+
+    pool = ConnectionPool(args.dsn, min_size=1, max_size=1, configure=configure)
+    try:
+        pool.wait()
+        warmup = max(10, args.votes // 10)
+        bench_ping(pool, warmup)
+        rtt = statistics.median(bench_ping(pool, args.votes))
+        print(f"baseline     SELECT 1 p50={rtt * 1000:.2f} ms ({args.votes} votes per mode)")
+
+        report('psycopg2', bench_psycopg2(args.dsn, args.votes), rtt)
+        bench_prepared(pool, warmup)
+        report('prepared', bench_prepared(pool, args.votes), rtt)
+        bench_pipelined(pool, warmup)
+        report('pipelined', bench_pipelined(pool, args.votes), rtt)
+    finally:
+        pool.close()
+        setup.cursor().execute(f"DROP SCHEMA {SCHEMA} CASCADE")
+        setup.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,431 @@
+#!/usr/bin/env python3
+"""
+Local failover drill: vote loss and recovery time when the primary endpoint fails.
+
+Starts two instances of a voting app, VOTE_SOURCE/ENVIRONMENT "azure"
+(priority 1) and "onprem" (priority 2), behind a local routing proxy that
+behaves like the Traffic Manager profile in azure-traffic-manager.bicep:
+
+  - the proxy probes every endpoint's probe path every --probe-interval s;
+    an endpoint is Degraded after --tolerated-failures consecutive failed
+    probes (timeout --probe-timeout) and Online again after one success
+  - Priority routing sends clients to the first Online endpoint (Weighted
+    splits by --weights); with every endpoint down Traffic Manager keeps
+    answering with all of them, and so does the proxy
+  - Traffic Manager is DNS based, so each client keeps the endpoint it
+    resolved for --dns-ttl seconds, healthy or not
+
+Client threads vote through the proxy while the primary is killed
+(SIGKILL, then restarted) or hung (SIGSTOP, then SIGCONT) for --down seconds.
+The report covers:
+
+  time to detect     fault -> proxy marks the primary Degraded
+  time to reroute    fault -> first vote acknowledged by the backup
+  time to fail back  restore -> first vote acknowledged by the primary again
+  votes              sent / acknowledged / failed, and per vote id: lost
+                     (acknowledged, never counted), duplicated (extra
+                     copies counted) and counted though unacknowledged
+  latency            p50/p99/max before the fault, during the outage and after
+
+Each instance gets its own SharedCounters file so a killed instance keeps its
+in-memory counts across the restart. Point REDIS_HOST/DB_HOST at real stores
+to drill those paths; with --shared-store totals are read from one endpoint.
+
+Every vote carries a unique session_id (kept across its retries) so it can be
+reconciled on its own. Totals alone can't separate losses from duplicates, as
+one hides the other. Per-vote rows only exist in the votes table
+(app-with-db.py): pass --ledger-dsn once per database the instances write to
+('' for DB_HOST/DB_NAME/...). Counter-only stores report just the net
+difference between acknowledged and counted votes.
+
+Usage:
+    python load-tests/failover_simulator.py [--app app/app.py] [--fault kill|hang] [--down 60] \\
+        [--probe-interval 30 --tolerated-failures 3 --probe-timeout 10 --dns-ttl 30] [--report failover.json] \\
+        [--ledger-dsn "host=... dbname=..."]
+    # quick run with tighter probing:
+    python load-tests/failover_simulator.py --probe-interval 2 --probe-timeout 1 --dns-ttl 5 --down 20
+"""
+
+import argparse
+import http.client
+import json
+import os
+import random
+import signal
+import statistics
+import subprocess
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+from bench_startup import free_port
+
+HERE = os.path.dirname(os.path.abspath(__file__))
+HOP_HEADERS = {'connection', 'keep-alive', 'transfer-encoding', 'content-length', 'host'}
+
+class Endpoint:
+    def __init__(self, name, priority, weight, port):
+        self.name = name
+        self.priority = priority
+        self.weight = weight
+        self.port = port
+        self.online = True
+        self.failures = 0
+        self.changes = []  # (monotonic time, online)
+
+class TrafficManager:
+    """Health probing and Priority/Weighted endpoint selection with per-client DNS caching"""
+
+    def __init__(self, endpoints, method, probe_path, interval, timeout, tolerated, ttl):
+        self.endpoints = endpoints
+        self.method = method
+        self.probe_path = probe_path
+        self.interval = interval
+        self.timeout = timeout
+        self.tolerated = tolerated
+        self.ttl = ttl
+        self.resolved = {}
+        self.lock = threading.Lock()
+
+    def probe(self, endpoint):
+        try:
+            conn = http.client.HTTPConnection('127.0.0.1', endpoint.port, timeout=self.timeout)
+            conn.request('GET', self.probe_path)
+            ok = 200 <= conn.getresponse().status < 300
+            conn.close()
+        except (OSError, http.client.HTTPException):
+            ok = False
+        with self.lock:
+            endpoint.failures = 0 if ok else endpoint.failures + 1
+            online = ok or (endpoint.online and endpoint.failures < self.tolerated)
+            if online != endpoint.online:
+                endpoint.online = online
+                endpoint.changes.append((time.monotonic(), online))
+                print(f"  [{time.strftime('%H:%M:%S')}] {endpoint.name} {'Online' if online else 'Degraded'}")
+
+    def start(self):
+        def loop(endpoint):
+            while True:
+                started = time.monotonic()
+                self.probe(endpoint)
+                time.sleep(max(0, self.interval - (time.monotonic() - started)))
+        for endpoint in self.endpoints:
+            threading.Thread(target=loop, args=(endpoint,), daemon=True).start()
+
+    def choose(self):
+        candidates = [e for e in self.endpoints if e.online] or self.endpoints
+        if self.method == 'priority':
+            return min(candidates, key=lambda e: e.priority)
+        return random.choices(candidates, weights=[e.weight for e in candidates])[0]
+
+    def resolve(self, client):
+        now = time.monotonic()
+        with self.lock:
+            cached = self.resolved.get(client)
+            if cached and now - cached[1] < self.ttl:
+                return cached[0]
+            endpoint = self.choose()
+            self.resolved[client] = (endpoint, now)
+            return endpoint
+
+def proxy_handler(manager, timeout):
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'
+
+        def forward(self):
+            endpoint = manager.resolve(self.headers.get('X-Sim-Client', self.client_address[0]))
+            body = self.rfile.read(int(self.headers.get('Content-Length') or 0))
+            headers = {k: v for k, v in self.headers.items() if k.lower() not in HOP_HEADERS}
+            try:
+                conn = http.client.HTTPConnection('127.0.0.1', endpoint.port, timeout=timeout)
+                conn.request(self.command, self.path, body=body, headers=headers)
+                response = conn.getresponse()
+                status, payload, content_type = response.status, response.read(), response.getheader('Content-Type')
+                conn.close()
+            except (OSError, http.client.HTTPException) as e:
+                status, payload, content_type = 502, json.dumps({'error': str(e)}).encode(), 'application/json'
+            self.send_response(status)
+            self.send_header('Content-Type', content_type or 'application/octet-stream')
+            self.send_header('Content-Length', str(len(payload)))
+            self.send_header('X-Served-By', endpoint.name)
+            self.end_headers()
+            self.wfile.write(payload)
+
+        do_GET = do_POST = forward
+
+        def log_message(self, *args):
+            pass
+    return Handler
+
+class Instance:
+    def __init__(self, app_path, name, port, workdir):
+        self.app_path = app_path
+        self.name = name
+        self.port = port
+        self.env = {**os.environ, 'VOTE_SOURCE': name, 'ENVIRONMENT': name,
+                    'SHARED_COUNTERS_PATH': os.path.join(workdir, f'{name}-counters')}
+        self.proc = None
+
+    def start(self, ready_timeout):
+        self.proc = subprocess.Popen(
+            [sys.executable, os.path.join(HERE, 'bench_startup.py'), self.app_path, '--child', '--port', str(self.port)],
+            env=self.env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+        deadline = time.monotonic() + ready_timeout
+        while time.monotonic() < deadline:
+            try:
+                if requests.get(f'http://127.0.0.1:{self.port}/health', timeout=1).status_code < 500:
+                    return
+            except requests.RequestException:
+                pass
+            time.sleep(0.1)
+        raise RuntimeError(f"{self.name} did not come up within {ready_timeout}s")
+
+    def stop(self):
+        if self.proc and self.proc.poll() is None:
+            self.proc.send_signal(signal.SIGCONT)
+            self.proc.terminate()
+            self.proc.wait()
+
+def vote_total(payload, choices):
+    """Total votes from /results ({'cat': n}) or /api/results ({'votes': {'cat': {'total': n}}})"""
+    if isinstance(payload.get('votes'), dict):
+        return sum(v.get('total', 0) for v in payload['votes'].values())
+    return sum(int(payload.get(choice) or 0) for choice in choices)
+
+def read_totals(instances, path, choices, shared):
+    total = 0
+    for instance in instances[:1] if shared else instances:
+        total += vote_total(requests.get(f'http://127.0.0.1:{instance.port}{path}', timeout=10).json(), choices)
+    return total
+
+def read_ledger(dsns, prefix):
+    """{vote id: rows} for this run's votes in the votes table of each database"""
+    import psycopg2
+
+    counts = {}
+    for dsn in dsns:
+        if dsn:
+            conn = psycopg2.connect(dsn)
+        else:
+            conn = psycopg2.connect(host=os.getenv('DB_HOST', 'localhost'), port=os.getenv('DB_PORT', '5432'),
+                                    database=os.getenv('DB_NAME', 'voting_app'),
+                                    user=os.getenv('DB_USER', 'votinguser'), password=os.getenv('DB_PASSWORD', ''))
+        try:
+            cursor = conn.cursor()
+            cursor.execute("SELECT session_id, COUNT(*) FROM votes WHERE session_id LIKE %s GROUP BY session_id",
+                           (f'{prefix}-%',))
+            for vote_id, count in cursor.fetchall():
+                counts[vote_id] = counts.get(vote_id, 0) + count
+        finally:
+            conn.close()
+    return counts
+
+def reconcile(samples, counts):
+    """Compare each vote's acknowledgement with how many times it was counted"""
+    lost = sorted(s[5] for s in samples if s[2] and not counts.get(s[5]))
+    return {
+        'lost': len(lost),
+        'duplicated': sum(count - 1 for count in counts.values() if count > 1),
+        'counted_unacknowledged': sum(1 for s in samples if not s[2] and counts.get(s[5])),
+        'lost_ids': lost[:20]
+    }
+
+class Clients:
+    def __init__(self, proxy_port, count, rate, retries, choices, timeout, run_id):
+        self.url = f'http://127.0.0.1:{proxy_port}/vote'
+        self.run_id = run_id
+        self.count = count
+        self.interval = count / rate
+        self.retries = retries
+        self.choices = choices
+        self.timeout = timeout
+        self.samples = []  # (monotonic time, latency, acknowledged, served_by, attempts, vote id)
+        self.stopping = threading.Event()
+        self.lock = threading.Lock()
+
+    def run(self, client_id):
+        session = requests.Session()
+        headers = {'X-Sim-Client': f'client-{client_id}', 'User-Agent': f'failover-sim/{client_id}'}
+        sequence = 0
+        while not self.stopping.is_set():
+            started = time.monotonic()
+            sequence += 1
+            # Retries resend the same id, so a vote counted twice shows up as such
+            vote_id = f'{self.run_id}-{client_id}-{sequence}'
+            body = {'vote': random.choice(self.choices), 'session_id': vote_id}
+            acknowledged, served_by, attempts = False, None, 0
+            while attempts <= self.retries and not acknowledged:
+                attempts += 1
+                try:
+                    response = session.post(self.url, json=body, headers=headers, timeout=self.timeout)
+                    served_by = response.headers.get('X-Served-By')
+                    acknowledged = response.status_code == 200
+                except requests.RequestException:
+                    pass
+            with self.lock:
+                self.samples.append((started, time.monotonic() - started, acknowledged, served_by, attempts, vote_id))
+            time.sleep(max(0, self.interval - (time.monotonic() - started)))
+
+    def start(self):
+        self.threads = [threading.Thread(target=self.run, args=(i,), daemon=True) for i in range(self.count)]
+        for thread in self.threads:
+            thread.start()
+
+    def stop(self):
+        self.stopping.set()
+        for thread in self.threads:
+            thread.join()
+
+def latency(samples):
+    values = sorted(s[1] * 1000 for s in samples)
+    if not values:
+        return None
+    return {'count': len(values), 'p50_ms': round(statistics.median(values), 1),
+            'p99_ms': round(values[min(len(values) - 1, int(len(values) * 0.99))], 1),
+            'max_ms': round(values[-1], 1), 'failed': sum(1 for s in samples if not s[2])}
+
+def first_after(samples, since, served_by):
+    times = [s[0] + s[1] for s in samples if s[0] >= since and s[2] and s[3] == served_by]
+    return min(times) - since if times else None
+
+def main():
+    parser = argparse.ArgumentParser(description='Drill endpoint failover behind a Traffic Manager-like proxy')
+    parser.add_argument('--app', default=os.path.join(HERE, '..', 'app', 'app.py'))
+    parser.add_argument('--results-path', default='/results')
+    parser.add_argument('--choices', default='cat,dog')
+    parser.add_argument('--routing', choices=('priority', 'weighted'), default='priority')
+    parser.add_argument('--weights', default='100,100', help='azure,onprem weights for weighted routing')
+    parser.add_argument('--probe-path', default='/')
+    parser.add_argument('--probe-interval', type=float, default=30)
+    parser.add_argument('--probe-timeout', type=float, default=10)
+    parser.add_argument('--tolerated-failures', type=int, default=3)
+    parser.add_argument('--dns-ttl', type=float, default=30)
+    parser.add_argument('--fault', choices=('kill', 'hang'), default='kill')
+    parser.add_argument('--warm', type=float, default=10, help='seconds of traffic before the fault')
+    parser.add_argument('--down', type=float, default=120, help='seconds the primary stays failed')
+    parser.add_argument('--settle', type=float, default=None, help='seconds of traffic after restoring (default: detection + TTL)')
+    parser.add_argument('--clients', type=int, default=20)
+    parser.add_argument('--rate', type=float, default=50, help='votes per second across all clients')
+    parser.add_argument('--retries', type=int, default=1, help='client retries per vote (retries can duplicate)')
+    parser.add_argument('--request-timeout', type=float, default=5)
+    parser.add_argument('--shared-store', action='store_true', help='both instances share one vote store')
+    parser.add_argument('--ready-timeout', type=float, default=60)
+    parser.add_argument('--ledger-dsn', action='append',
+                        help="database to reconcile votes in per id (repeat per database; '' uses DB_HOST etc.)")
+    parser.add_argument('--report', help='write the results as JSON')
+    args = parser.parse_args()
+
+    choices = args.choices.split(',')
+    weights = [int(w) for w in args.weights.split(',')]
+    settle = args.settle if args.settle is not None else \
+        args.probe_interval * (args.tolerated_failures + 1) + args.dns_ttl
+    workdir = tempfile.mkdtemp(prefix='failover-sim-')
+    run_id = f'sim{int(time.time())}{random.randrange(1000):03d}'
+    ports = [free_port() for _ in range(3)]
+    instances = [Instance(args.app, 'azure', ports[0], workdir),
+                 Instance(args.app, 'onprem', ports[1], workdir)]
+    endpoints = [Endpoint(i.name, priority, weight, i.port)
+                 for priority, (i, weight) in enumerate(zip(instances, weights), 1)]
+    primary = instances[0]
+
+    try:
+        for instance in instances:
+            instance.start(args.ready_timeout)
+        baseline = read_totals(instances, args.results_path, choices, args.shared_store)
+
+        manager = TrafficManager(endpoints, args.routing, args.probe_path, args.probe_interval,
+                                 args.probe_timeout, args.tolerated_failures, args.dns_ttl)
+        manager.start()
+        proxy = ThreadingHTTPServer(('127.0.0.1', ports[2]), proxy_handler(manager, args.request_timeout))
+        threading.Thread(target=proxy.serve_forever, daemon=True).start()
+
+        clients = Clients(ports[2], args.clients, args.rate, args.retries, choices, args.request_timeout, run_id)
+        print(f"Voting through proxy :{ports[2]} ({args.routing}), {args.clients} clients at {args.rate:g} votes/s")
+        clients.start()
+        time.sleep(args.warm)
+
+        print(f"  [{time.strftime('%H:%M:%S')}] fault: {args.fault} {primary.name}")
+        fault_at = time.monotonic()
+        if args.fault == 'kill':
+            primary.proc.kill()
+            primary.proc.wait()
+        else:
+            primary.proc.send_signal(signal.SIGSTOP)
+        time.sleep(args.down)
+
+        print(f"  [{time.strftime('%H:%M:%S')}] restore {primary.name}")
+        restore_at = time.monotonic()
+        if args.fault == 'kill':
+            primary.start(args.ready_timeout)
+        else:
+            primary.proc.send_signal(signal.SIGCONT)
+        time.sleep(settle)
+        clients.stop()
+        proxy.shutdown()
+        end_at = time.monotonic()
+
+        final = read_totals(instances, args.results_path, choices, args.shared_store)
+        ledger = read_ledger(args.ledger_dsn, run_id) if args.ledger_dsn else None
+    finally:
+        for instance in instances:
+            instance.stop()
+
+    samples = clients.samples
+    acknowledged = sum(1 for s in samples if s[2])
+    counted = final - baseline
+    degraded = [t for t, online in endpoints[0].changes if not online and t >= fault_at]
+    rerouted = first_after(samples, fault_at, 'onprem')
+    failback = first_after(samples, restore_at, 'azure')
+    reroute_at = fault_at + rerouted if rerouted is not None else restore_at
+    report = {
+        'config': {k: v for k, v in vars(args).items() if k != 'report'},
+        'time_to_detect_s': round(degraded[0] - fault_at, 2) if degraded else None,
+        'time_to_reroute_s': round(rerouted, 2) if rerouted is not None else None,
+        'time_to_failback_s': round(failback, 2) if failback is not None else None,
+        'votes': {
+            'sent': len(samples),
+            'acknowledged': acknowledged,
+            'failed': len(samples) - acknowledged,
+            'retried': sum(1 for s in samples if s[4] > 1),
+            'counted': counted,
+            # Without per-vote rows only the difference is known, not how it splits
+            'net_difference': acknowledged - counted,
+            **(reconcile(samples, ledger) if ledger is not None else
+               {'lost': None, 'duplicated': None, 'counted_unacknowledged': None})
+        },
+        'latency': {
+            'before': latency([s for s in samples if s[0] < fault_at]),
+            'outage': latency([s for s in samples if fault_at <= s[0] < reroute_at]),
+            'rerouted': latency([s for s in samples if reroute_at <= s[0] < restore_at]),
+            'after': latency([s for s in samples if restore_at <= s[0] < end_at])
+        }
+    }
+
+    print(f"\nfault={args.fault} down={args.down:g}s probe={args.probe_interval:g}s x{args.tolerated_failures}"
+          f" timeout={args.probe_timeout:g}s ttl={args.dns_ttl:g}s")
+    print(f"  time to detect    {report['time_to_detect_s']} s")
+    print(f"  time to reroute   {report['time_to_reroute_s']} s")
+    print(f"  time to fail back {report['time_to_failback_s']} s")
+    votes = report['votes']
+    print(f"  votes             sent={votes['sent']} acknowledged={votes['acknowledged']} failed={votes['failed']}"
+          f" retried={votes['retried']} counted={votes['counted']} net={votes['net_difference']}")
+    if ledger is not None:
+        print(f"  per vote id       lost={votes['lost']} duplicated={votes['duplicated']}"
+              f" counted_unacknowledged={votes['counted_unacknowledged']}")
+    else:
+        print("  per vote id       not reconciled (no --ledger-dsn)")
+    for phase, stats in report['latency'].items():
+        if stats:
+            print(f"  {phase:<9} n={stats['count']:<6} p50={stats['p50_ms']:8.1f} ms  p99={stats['p99_ms']:8.1f} ms"
+                  f"  max={stats['max_ms']:8.1f} ms  failed={stats['failed']}")
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f"Report written to {args.report}")
+
+if __name__ == '__main__':
+    main()
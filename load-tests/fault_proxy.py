@@ -0,0 +1,257 @@
+#!/usr/bin/env python3
+"""
+Local stand-in proxies that degrade a backend dependency on purpose.
+
+TcpFaultProxy sits in front of Postgres or Redis, HttpFaultProxy in front of
+an HTTP API such as the on-premises /api/results (or serves a canned JSON
+body when there is no upstream). Both apply the same Faults, which can be
+changed while traffic flows:
+
+  latency_ms / jitter_ms   added before every forwarded chunk (TCP) or request
+                           (HTTP); jitter is uniform in +/- jitter_ms
+  drop                     probability that a new connection or request is
+                           black-holed: accepted, then never answered until the
+                           client gives up (or hold_seconds pass)
+  reset                    probability that a connection is reset (RST)
+                           instead of forwarded: per chunk for TCP, per request
+                           for HTTP
+  error                    HTTP only: probability of answering 503
+
+Used by load-tests/bench_degraded_dependencies.py; also runs standalone:
+
+    python load-tests/fault_proxy.py tcp --listen 15432 --upstream localhost:5432 --latency-ms 200 --jitter-ms 50
+    python load-tests/fault_proxy.py http --listen 18080 --upstream http://66.242.207.21:31514 --drop 0.1
+"""
+
+import argparse
+import json
+import random
+import select
+import socket
+import struct
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import requests
+
+class Faults:
+    def __init__(self, latency_ms=0.0, jitter_ms=0.0, drop=0.0, reset=0.0, error=0.0, hold_seconds=60.0):
+        self.set(latency_ms=latency_ms, jitter_ms=jitter_ms, drop=drop, reset=reset, error=error,
+                 hold_seconds=hold_seconds)
+
+    def set(self, **settings):
+        """Change faults in place; attributes are read per chunk/request so this takes effect immediately"""
+        for name, value in settings.items():
+            setattr(self, name, float(value))
+        return self
+
+    def clear(self):
+        return self.set(latency_ms=0, jitter_ms=0, drop=0, reset=0, error=0)
+
+    def delay(self):
+        delay = (self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms)) / 1000
+        if delay > 0:
+            time.sleep(delay)
+
+    def happens(self, name):
+        probability = getattr(self, name)
+        return probability > 0 and random.random() < probability
+
+    def to_dict(self):
+        return {name: getattr(self, name) for name in ('latency_ms', 'jitter_ms', 'drop', 'reset', 'error')}
+
+def reset_socket(sock):
+    """Close with SO_LINGER 0 so the peer sees a connection reset, not a clean FIN"""
+    try:
+        sock.setsockopt(socket.SOL_SOCKET, socket.SO_LINGER, struct.pack('ii', 1, 0))
+    except OSError:
+        pass
+    sock.close()
+
+def hold(sock, seconds):
+    """Black-hole: keep the connection open and unanswered until the client closes it"""
+    deadline = time.monotonic() + seconds
+    try:
+        while time.monotonic() < deadline:
+            readable, _, _ = select.select([sock], [], [], 0.5)
+            if readable and not sock.recv(65536):
+                break
+    except OSError:
+        pass
+    sock.close()
+
+class TcpFaultProxy:
+    def __init__(self, upstream_host, upstream_port, faults=None, listen_port=0):
+        self.upstream = (upstream_host, upstream_port)
+        self.faults = faults or Faults()
+        self.server = socket.create_server(('127.0.0.1', listen_port))
+        self.port = self.server.getsockname()[1]
+        self.connections = 0
+        self.resets = 0
+        self.dropped = 0
+
+    def start(self):
+        threading.Thread(target=self.accept_loop, name=f'tcp-fault-{self.port}', daemon=True).start()
+        return self
+
+    def accept_loop(self):
+        while True:
+            try:
+                client, _ = self.server.accept()
+            except OSError:
+                return
+            self.connections += 1
+            threading.Thread(target=self.handle, args=(client,), daemon=True).start()
+
+    def handle(self, client):
+        if self.faults.happens('drop'):
+            self.dropped += 1
+            hold(client, self.faults.hold_seconds)
+            return
+        try:
+            upstream = socket.create_connection(self.upstream, timeout=10)
+            upstream.settimeout(None)
+        except OSError:
+            reset_socket(client)
+            return
+        for sock in (client, upstream):
+            sock.setsockopt(socket.IPPROTO_TCP, socket.TCP_NODELAY, 1)
+        closed = threading.Event()
+        threading.Thread(target=self.pump, args=(upstream, client, closed), daemon=True).start()
+        self.pump(client, upstream, closed)
+
+    def pump(self, source, destination, closed):
+        try:
+            while not closed.is_set():
+                data = source.recv(65536)
+                if not data:
+                    break
+                if self.faults.happens('reset'):
+                    self.resets += 1
+                    break
+                self.faults.delay()
+                destination.sendall(data)
+        except OSError:
+            pass
+        if not closed.is_set():
+            closed.set()
+            reset_socket(source)
+            reset_socket(destination)
+
+    def stats(self):
+        return {'connections': self.connections, 'resets': self.resets, 'dropped': self.dropped}
+
+    def close(self):
+        self.server.close()
+
+class HttpFaultProxy:
+    """Forwards to upstream_url (scheme://host:port), or answers every GET with stub_body"""
+
+    def __init__(self, upstream_url=None, faults=None, listen_port=0, stub_body=None, timeout=30):
+        self.upstream_url = upstream_url.rstrip('/') if upstream_url else None
+        self.faults = faults or Faults()
+        self.stub_body = stub_body
+        self.timeout = timeout
+        self.requests = 0
+        self.resets = 0
+        self.dropped = 0
+        self.errors = 0
+        self.server = ThreadingHTTPServer(('127.0.0.1', listen_port), self.handler())
+        self.server.daemon_threads = True
+        self.port = self.server.server_address[1]
+
+    def handler(self):
+        proxy = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = 'HTTP/1.1'
+
+            def forward(self):
+                proxy.requests += 1
+                faults = proxy.faults
+                if faults.happens('drop'):
+                    proxy.dropped += 1
+                    self.close_connection = True
+                    hold(self.connection, faults.hold_seconds)
+                    return
+                if faults.happens('reset'):
+                    proxy.resets += 1
+                    self.close_connection = True
+                    reset_socket(self.connection)
+                    return
+                faults.delay()
+                if faults.happens('error'):
+                    proxy.errors += 1
+                    return self.reply(503, b'{"error": "injected fault"}', 'application/json')
+                if proxy.upstream_url is None:
+                    body = json.dumps(proxy.stub_body() if callable(proxy.stub_body) else proxy.stub_body or {})
+                    return self.reply(200, body.encode(), 'application/json')
+
+                length = int(self.headers.get('Content-Length') or 0)
+                try:
+                    response = requests.request(
+                        self.command, proxy.upstream_url + self.path,
+                        data=self.rfile.read(length) if length else None,
+                        headers={k: v for k, v in self.headers.items() if k.lower() not in ('host', 'connection')},
+                        timeout=proxy.timeout)
+                except requests.RequestException as e:
+                    return self.reply(502, json.dumps({'error': str(e)}).encode(), 'application/json')
+                self.reply(response.status_code, response.content,
+                           response.headers.get('Content-Type', 'application/octet-stream'))
+
+            def reply(self, status, body, content_type):
+                self.send_response(status)
+                self.send_header('Content-Type', content_type)
+                self.send_header('Content-Length', str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = forward
+
+            def log_message(self, *args):
+                pass
+        return Handler
+
+    def start(self):
+        threading.Thread(target=self.server.serve_forever, name=f'http-fault-{self.port}', daemon=True).start()
+        return self
+
+    def stats(self):
+        return {'requests': self.requests, 'resets': self.resets, 'dropped': self.dropped, 'errors': self.errors}
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+def main():
+    parser = argparse.ArgumentParser(description='Run a latency/drop/reset injecting proxy in the foreground')
+    parser.add_argument('kind', choices=('tcp', 'http'))
+    parser.add_argument('--listen', type=int, required=True)
+    parser.add_argument('--upstream', help='host:port for tcp, base URL for http (omit for a stub on-prem API)')
+    parser.add_argument('--latency-ms', type=float, default=0)
+    parser.add_argument('--jitter-ms', type=float, default=0)
+    parser.add_argument('--drop', type=float, default=0)
+    parser.add_argument('--reset', type=float, default=0)
+    parser.add_argument('--error', type=float, default=0)
+    args = parser.parse_args()
+
+    faults = Faults(args.latency_ms, args.jitter_ms, args.drop, args.reset, args.error)
+    if args.kind == 'tcp':
+        if not args.upstream:
+            parser.error('tcp needs --upstream host:port')
+        host, _, port = args.upstream.rpartition(':')
+        proxy = TcpFaultProxy(host, int(port), faults, args.listen).start()
+    else:
+        proxy = HttpFaultProxy(args.upstream, faults, args.listen,
+                               stub_body={'onprem_votes': {'cat': 0, 'dog': 0}}).start()
+    print(f"{args.kind} fault proxy on 127.0.0.1:{proxy.port} -> {args.upstream or 'stub'} {faults.to_dict()}")
+    try:
+        while True:
+            time.sleep(10)
+            print(f"  {proxy.stats()}")
+    except KeyboardInterrupt:
+        proxy.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,344 @@
+#!/usr/bin/env python3
+"""
+Find where two vote databases disagree, without comparing them row by row.
+
+Each side summarises its votes per time bucket as a digest: the vote count
+plus the sum of a 60-bit hash of every vote's identity (order independent,
+and unlike XOR a duplicated vote changes it). Digests are compared top-down
+through the bucket levels (by default day, hour, minute): only buckets whose
+digests differ are split into their children and asked for again, and only
+the rows of divergent leaf buckets are fetched and diffed. Digests are
+computed by the database, so what crosses the network and gets compared
+grows with the drift, not with the size of the votes table; the drill-down
+queries read divergent buckets through the votes timestamp index (schema
+migration 7).
+
+Top-level buckets that ended more than --settle ago and on which both sides
+agreed are kept in a digest cache file between runs. Later runs only
+aggregate the votes after that watermark, plus the buckets that disagreed
+last time, instead of hashing every row on both sides again. The cache
+assumes settled buckets don't change; run with --digest-cache '' for a full
+recomputation. The cache only applies without --since/--until.
+
+A vote is identified by its poll, choice, source, timestamp and session
+rather than its id: rows written before migration 8 keep the SERIAL ids
+each database assigned on its own.
+
+Exits 1 when the databases disagree, so it can run from cron or CI.
+
+Usage:
+    python scripts/check_vote_consistency.py \\
+        --left azure="host=... dbname=... user=..." --right onprem="host=..." \\
+        [--levels 1d,1h,1m] [--since 2026-01-01] [--until 2026-02-01] \\
+        [--max-rows 10000] [--report drift.json] \\
+        [--digest-cache ~/.cache/vote-consistency-digests.json] [--settle 1h]
+        (a side without DSN falls back to DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD)
+"""
+
+import argparse
+import json
+import os
+import sys
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+
+import psycopg2
+
+# Identity of a vote that doesn't depend on ids, which predate migration 8 on old rows
+VOTE_KEY_SQL = "concat_ws('|', poll_id, vote_choice, vote_source, timestamp, session_id)"
+VOTE_HASH_SQL = f"('x' || substr(md5({VOTE_KEY_SQL}), 1, 15))::bit(60)::bigint"
+VOTE_COLUMNS = ('poll_id', 'vote_choice', 'vote_source', 'timestamp', 'session_id')
+
+UNITS = {'s': 1, 'm': 60, 'h': 3600, 'd': 86400}
+
+def parse_width(text):
+    """'6h' -> 21600"""
+    text = text.strip()
+    if not text or text[-1] not in UNITS or not text[:-1].isdigit():
+        raise argparse.ArgumentTypeError(f"Invalid bucket width {text!r} (use e.g. 1d, 6h, 5m, 30s)")
+    return int(text[:-1]) * UNITS[text[-1]]
+
+def parse_levels(text):
+    """'1d,1h,1m' -> [86400, 3600, 60]; each level must divide the one above it"""
+    levels = [parse_width(part) for part in text.split(',')]
+    for parent, child in zip(levels, levels[1:]):
+        if child >= parent or parent % child:
+            raise argparse.ArgumentTypeError("Each bucket level must evenly divide the previous one")
+    return levels
+
+def parse_side(text):
+    name, _, dsn = text.partition('=')
+    return name, dsn
+
+class Side:
+    """One database being compared, with its own connection"""
+
+    def __init__(self, name, dsn):
+        self.name = name
+        if dsn:
+            self.conn = psycopg2.connect(dsn)
+        else:
+            self.conn = psycopg2.connect(
+                host=os.getenv('DB_HOST', 'localhost'),
+                port=os.getenv('DB_PORT', '5432'),
+                database=os.getenv('DB_NAME', 'voting_app'),
+                user=os.getenv('DB_USER', 'votinguser'),
+                password=os.getenv('DB_PASSWORD', '')
+            )
+        self.conn.set_session(readonly=True, autocommit=True)
+        # Names the database in the digest cache (psycopg2 masks the password)
+        self.identity = self.conn.dsn
+        self.queries = 0
+        self.rows_fetched = 0
+        with self.conn.cursor() as cursor:
+            # The vote key includes the timestamp as text, so both sides must render it alike
+            cursor.execute("SET TIME ZONE 'UTC'")
+
+    def query(self, sql, params):
+        self.queries += 1
+        with self.conn.cursor() as cursor:
+            cursor.execute(sql, params)
+            return cursor.fetchall()
+
+    def top_digests(self, width, since, until):
+        """{bucket: (count, hash_sum)} for the whole range; None is the bucket of votes without a timestamp"""
+        conditions, params = [], {'width': width}
+        if since:
+            conditions.append('timestamp >= %(since)s')
+            params['since'] = since
+        if until:
+            conditions.append('timestamp < %(until)s')
+            params['until'] = until
+        rows = self.query(f'''
+            SELECT floor(extract(epoch FROM timestamp) / %(width)s)::bigint, COUNT(*), SUM({VOTE_HASH_SQL})
+            FROM votes_expanded
+            {'WHERE ' + ' AND '.join(conditions) if conditions else ''}
+            GROUP BY 1
+        ''', params)
+        return {bucket: (count, int(digest)) for bucket, count, digest in rows}
+
+    def recent_digests(self, width, through, buckets):
+        """Digests of the buckets from ``through`` on, of the given earlier buckets, and of untimed votes"""
+        rows = self.query(f'''
+            SELECT floor(extract(epoch FROM timestamp) / %(width)s)::bigint, COUNT(*), SUM({VOTE_HASH_SQL})
+            FROM (
+                SELECT * FROM votes_expanded
+                WHERE timestamp >= to_timestamp(%(from)s) OR timestamp IS NULL
+                UNION ALL
+                SELECT v.*
+                FROM unnest(%(starts)s::bigint[]) AS p(start)
+                JOIN votes_expanded v
+                  ON v.timestamp >= to_timestamp(p.start) AND v.timestamp < to_timestamp(p.start + %(width)s)
+            ) recent
+            GROUP BY 1
+        ''', {'width': width, 'from': through * width, 'starts': [b * width for b in buckets]})
+        return {bucket: (count, int(digest)) for bucket, count, digest in rows}
+
+    def child_digests(self, parents, parent_width, width, since, until):
+        """Digests at bucket width for the rows inside the given parent buckets"""
+        rows = self.query(f'''
+            SELECT floor(extract(epoch FROM v.timestamp) / %(width)s)::bigint, COUNT(*), SUM({VOTE_HASH_SQL})
+            FROM unnest(%(starts)s::bigint[]) AS p(start)
+            JOIN votes_expanded v
+              ON v.timestamp >= to_timestamp(p.start) AND v.timestamp < to_timestamp(p.start + %(parent_width)s)
+            WHERE (%(since)s::timestamptz IS NULL OR v.timestamp >= %(since)s)
+              AND (%(until)s::timestamptz IS NULL OR v.timestamp < %(until)s)
+            GROUP BY 1
+        ''', {'width': width, 'parent_width': parent_width, 'starts': [b * parent_width for b in parents],
+              'since': since, 'until': until})
+        return {bucket: (count, int(digest)) for bucket, count, digest in rows}
+
+    def bucket_rows(self, buckets, width, since, until, limit):
+        """(key, row) of every vote in the given buckets; bucket None selects votes without a timestamp"""
+        starts = [b * width for b in buckets if b is not None]
+        rows = self.query(f'''
+            (SELECT {VOTE_KEY_SQL}, {', '.join(VOTE_COLUMNS)}
+             FROM unnest(%(starts)s::bigint[]) AS p(start)
+             JOIN votes_expanded v
+               ON v.timestamp >= to_timestamp(p.start) AND v.timestamp < to_timestamp(p.start + %(width)s)
+             WHERE (%(since)s::timestamptz IS NULL OR v.timestamp >= %(since)s)
+               AND (%(until)s::timestamptz IS NULL OR v.timestamp < %(until)s))
+            UNION ALL
+            (SELECT {VOTE_KEY_SQL}, {', '.join(VOTE_COLUMNS)}
+             FROM votes_expanded v
+             WHERE %(nulls)s AND v.timestamp IS NULL)
+            LIMIT %(limit)s
+        ''', {'starts': starts, 'width': width, 'nulls': None in buckets,
+              'since': since, 'until': until, 'limit': limit})
+        self.rows_fetched += len(rows)
+        return rows
+
+    def close(self):
+        self.conn.close()
+
+class DigestCache:
+    """Top-level digests of settled buckets both sides agreed on, per pair of databases and width"""
+
+    def __init__(self, path, left, right, width):
+        self.path = path
+        self.key = f'{left.identity} | {right.identity} | {width}s'
+        self.width = width
+        try:
+            with open(path) as f:
+                self.entries = json.load(f)
+        except (OSError, ValueError):
+            self.entries = {}
+        entry = self.entries.get(self.key, {})
+        # Buckets below ``through`` are settled: cached when both sides agreed, else in ``divergent``
+        self.through = entry.get('through')
+        self.digests = {int(b): tuple(d) for b, d in entry.get('digests', {}).items()}
+        self.divergent = set(entry.get('divergent', []))
+
+    def update(self, left_fresh, right_fresh, now, settle):
+        """Record what this run computed for buckets that have now settled"""
+        through = int((now - settle) // self.width)
+        for bucket in self.divergent | (left_fresh.keys() | right_fresh.keys()) - {None}:
+            if bucket >= through:
+                continue
+            if left_fresh.get(bucket) == right_fresh.get(bucket):
+                self.divergent.discard(bucket)
+                if bucket in left_fresh:
+                    self.digests[bucket] = left_fresh[bucket]
+            else:
+                self.divergent.add(bucket)
+        self.through = through if self.through is None else max(through, self.through)
+
+    def save(self):
+        self.entries[self.key] = {'through': self.through, 'divergent': sorted(self.divergent),
+                                  'digests': {str(b): list(d) for b, d in self.digests.items()}}
+        directory = os.path.dirname(os.path.abspath(self.path))
+        os.makedirs(directory, exist_ok=True)
+        tmp = f'{self.path}.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(self.entries, f)
+        os.replace(tmp, self.path)
+
+def divergent(left, right):
+    return sorted((b for b in left.keys() | right.keys() if left.get(b) != right.get(b)),
+                  key=lambda b: (b is None, b or 0))
+
+def bucket_start(bucket, width):
+    return None if bucket is None else datetime.fromtimestamp(bucket * width, timezone.utc).isoformat()
+
+def check(left, right, levels, since=None, until=None, max_rows=10000, digest_cache=None, settle=3600):
+    pool = ThreadPoolExecutor(max_workers=2)
+
+    def both(method, *args):
+        results = [pool.submit(getattr(side, method), *args) for side in (left, right)]
+        return [result.result() for result in results]
+
+    report = {'left': left.name, 'right': right.name, 'levels': levels, 'levels_compared': []}
+    width = levels[0]
+    cache = DigestCache(digest_cache, left, right, width) if digest_cache and not (since or until) else None
+    if cache and cache.through is not None:
+        left_fresh, right_fresh = both('recent_digests', width, cache.through, sorted(cache.divergent))
+    else:
+        left_fresh, right_fresh = both('top_digests', width, since, until)
+    if cache:
+        report['cached_buckets'] = len(cache.digests)
+        left_digests, right_digests = {**cache.digests, **left_fresh}, {**cache.digests, **right_fresh}
+        cache.update(left_fresh, right_fresh, time.time(), settle)
+        cache.save()
+    else:
+        left_digests, right_digests = left_fresh, right_fresh
+    buckets = divergent(left_digests, right_digests)
+    report['levels_compared'].append({'width': width, 'buckets': len(left_digests.keys() | right_digests.keys()),
+                                      'divergent': len(buckets)})
+    print(f"{width}s buckets: {len(left_digests.keys() | right_digests.keys())} compared, {len(buckets)} differ")
+
+    # Votes without a timestamp can't be split further; they are diffed directly
+    untimed = [None] if None in buckets else []
+    untimed_counts = {left.name: left_digests.get(None, (0, 0))[0], right.name: right_digests.get(None, (0, 0))[0]}
+    buckets = [b for b in buckets if b is not None]
+    for child_width in levels[1:]:
+        if not buckets:
+            break
+        left_digests, right_digests = both('child_digests', buckets, width, child_width, since, until)
+        width = child_width
+        buckets = divergent(left_digests, right_digests)
+        report['levels_compared'].append({'width': width, 'buckets': len(left_digests.keys() | right_digests.keys()),
+                                          'divergent': len(buckets)})
+        print(f"{width}s buckets: {len(left_digests.keys() | right_digests.keys())} compared, {len(buckets)} differ")
+
+    report['divergent_buckets'] = [{
+        'start': bucket_start(b, width),
+        'width': width,
+        left.name: left_digests.get(b, (0, 0))[0],
+        right.name: right_digests.get(b, (0, 0))[0]
+    } for b in buckets]
+    if untimed:
+        report['divergent_buckets'].append({'start': None, 'width': None, **untimed_counts})
+
+    missing = {left.name: [], right.name: []}
+    truncated = False
+    if buckets or untimed:
+        left_rows, right_rows = both('bucket_rows', buckets + untimed, width, since, until, max_rows + 1)
+        truncated = len(left_rows) > max_rows or len(right_rows) > max_rows
+        left_keys = Counter(row[0] for row in left_rows[:max_rows])
+        right_keys = Counter(row[0] for row in right_rows[:max_rows])
+        # A vote missing on one side is reported once per missing copy
+        for rows, keys, other, name in ((right_rows, right_keys, left_keys, left.name),
+                                        (left_rows, left_keys, right_keys, right.name)):
+            extra = keys - other
+            for row in rows[:max_rows]:
+                if extra[row[0]] > 0:
+                    extra[row[0]] -= 1
+                    missing[name].append(dict(zip(VOTE_COLUMNS, row[1:])))
+    pool.shutdown()
+
+    report['missing'] = missing
+    report['truncated'] = truncated
+    report['consistent'] = not report['divergent_buckets']
+    report['queries'] = {left.name: left.queries, right.name: right.queries}
+    report['rows_fetched'] = {left.name: left.rows_fetched, right.name: right.rows_fetched}
+    return report
+
+def main():
+    parser = argparse.ArgumentParser(description='Bucketed digest comparison of the votes in two databases')
+    parser.add_argument('--left', type=parse_side, default=('azure', os.getenv('AZURE_DB_DSN', '')),
+                        help='NAME=DSN of the first database (default azure=$AZURE_DB_DSN)')
+    parser.add_argument('--right', type=parse_side, default=('onprem', os.getenv('ONPREM_DB_DSN', '')),
+                        help='NAME=DSN of the second database (default onprem=$ONPREM_DB_DSN)')
+    parser.add_argument('--levels', type=parse_levels, default=parse_levels('1d,1h,1m'),
+                        help='bucket widths from coarse to fine (default 1d,1h,1m)')
+    parser.add_argument('--since', help='only votes at or after this timestamp')
+    parser.add_argument('--until', help='only votes before this timestamp')
+    parser.add_argument('--max-rows', type=int, default=10000,
+                        help='most rows fetched per side from divergent buckets')
+    parser.add_argument('--report', help='write the full report as JSON to this file')
+    parser.add_argument('--digest-cache',
+                        default=os.getenv('VOTE_DIGEST_CACHE',
+                                          os.path.expanduser('~/.cache/vote-consistency-digests.json')),
+                        help="file keeping digests of settled buckets between runs ('' to disable)")
+    parser.add_argument('--settle', type=parse_width, default=parse_width('1h'),
+                        help='age after which a top-level bucket is assumed final (default 1h)')
+    args = parser.parse_args()
+    if args.left[0] == args.right[0]:
+        parser.error('--left and --right need different names')
+
+    started = time.perf_counter()
+    left, right = Side(*args.left), Side(*args.right)
+    try:
+        report = check(left, right, args.levels, args.since, args.until, args.max_rows,
+                       args.digest_cache, args.settle)
+    finally:
+        left.close()
+        right.close()
+    report['seconds'] = round(time.perf_counter() - started, 3)
+
+    if report['consistent']:
+        print(f"{left.name} and {right.name} agree ({report['seconds']}s)")
+    else:
+        print(f"{len(report['divergent_buckets'])} divergent {report['levels_compared'][-1]['width']}s buckets: "
+              f"{len(report['missing'][left.name])} votes missing on {left.name}, "
+              f"{len(report['missing'][right.name])} missing on {right.name}"
+              f"{' (row diff truncated, raise --max-rows)' if report['truncated'] else ''}")
+    if args.report:
+        with open(args.report, 'w') as f:
+            json.dump(report, f, indent=2, default=str)
+    sys.exit(0 if report['consistent'] else 1)
+
+if __name__ == '__main__':
+    main()
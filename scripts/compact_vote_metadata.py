@@ -0,0 +1,53 @@
+#!/usr/bin/env python3
+"""
+Convert existing votes to dictionary-encoded user agent / source ids.
+
+Run once after schema migration 5 is applied (any app pod applies it on
+start-up, or pass --migrate), then turn on COMPACT_METADATA=true for the
+apps. Rows are converted in committed id-range batches, so the script can be
+stopped and re-run at any time; already converted rows are skipped. Run
+VACUUM on votes afterwards to make the freed space reusable.
+
+Usage:
+    python scripts/compact_vote_metadata.py [--batch-size 50000] [--migrate]
+        (connection settings from DB_HOST, DB_PORT, DB_NAME, DB_USER, DB_PASSWORD)
+"""
+
+import argparse
+import os
+import sys
+import time
+
+import psycopg2
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app'))
+
+from metadata_dictionary import backfill
+from migrations import migrate
+
+def main():
+    parser = argparse.ArgumentParser(description='Backfill user agent / source lookup ids on existing votes')
+    parser.add_argument('--batch-size', type=int, default=50000)
+    parser.add_argument('--migrate', action='store_true', help='apply pending schema migrations first')
+    args = parser.parse_args()
+
+    conn = psycopg2.connect(
+        host=os.getenv('DB_HOST', 'localhost'),
+        port=os.getenv('DB_PORT', '5432'),
+        database=os.getenv('DB_NAME', 'voting_app'),
+        user=os.getenv('DB_USER', 'votinguser'),
+        password=os.getenv('DB_PASSWORD', '')
+    )
+    try:
+        if args.migrate:
+            applied = migrate(conn)
+            if applied:
+                print(f"Applied schema migrations: {applied}")
+        started = time.perf_counter()
+        converted = backfill(conn, args.batch_size)
+        print(f"Compacted {converted} votes in {time.perf_counter() - started:.1f}s")
+    finally:
+        conn.close()
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,19 @@
+from admission import AdaptiveLimiter
+
+def test_gradient_survives_zero_round_trips():
+    limiter = AdaptiveLimiter('postgres', strategy='gradient', initial=20)
+    for _ in range(50):
+        assert limiter.try_acquire('vote')
+        limiter.release(0.0)
+    assert limiter.min_limit <= limiter.limit <= limiter.max_limit
+
+def test_aimd_backs_off_on_slow_calls_and_sheds_low_priority_first():
+    limiter = AdaptiveLimiter('postgres', initial=10, target_latency=0.1)
+    limiter.try_acquire('vote')
+    limiter.release(1.0)
+    assert limiter.limit < 10
+
+    for _ in range(int(limiter.limit * 0.5)):
+        assert limiter.try_acquire('vote')
+    assert not limiter.try_acquire('health')
+    assert limiter.try_acquire('vote')
@@ -0,0 +1,89 @@
+import importlib.util
+import os
+
+import pytest
+import redis
+
+from polls import DEFAULT_POLL, counter_key
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'app.py')
+
+class FakeRedis:
+    """The handful of commands app.py uses, failing like redis-py while down"""
+
+    def __init__(self):
+        self.up = False
+        self.values = {}
+        self.hashes = {}
+
+    def check(self):
+        if not self.up:
+            raise redis.ConnectionError("Connection refused")
+
+    def ping(self):
+        self.check()
+        return True
+
+    def set(self, key, value, nx=False):
+        self.check()
+        if not (nx and key in self.values):
+            self.values[key] = str(value)
+
+    def incr(self, key, amount=1):
+        self.check()
+        self.values[key] = str(int(self.values.get(key, 0)) + amount)
+
+    def mget(self, keys):
+        self.check()
+        return [self.values.get(key) for key in keys]
+
+    def hsetnx(self, name, key, value):
+        self.check()
+        fields = self.hashes.setdefault(name, {})
+        if key in fields:
+            return 0
+        fields[key] = value
+        return 1
+
+    def hgetall(self, name):
+        self.check()
+        return dict(self.hashes.get(name, {}))
+
+@pytest.fixture
+def voting_app(monkeypatch):
+    monkeypatch.setenv('REDIS_RETRY_INTERVAL', '0')
+    monkeypatch.delenv('SHARED_COUNTERS_PATH', raising=False)
+    monkeypatch.delenv('VOTE_JOURNAL_DIR', raising=False)
+    spec = importlib.util.spec_from_file_location('redis_voting_app', APP_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    fake = FakeRedis()
+    monkeypatch.setattr(module, 'redis_client', fake)
+    return module, fake
+
+def test_votes_fall_back_while_redis_is_down(voting_app):
+    module, fake = voting_app
+    client = module.app.test_client()
+
+    assert client.post('/vote', json={'vote': 'cat'}).json == {'cat': 1, 'dog': 0}
+    assert client.get('/health').json['redis_connected'] is False
+
+def test_reads_and_writes_return_to_redis_once_it_recovers(voting_app):
+    module, fake = voting_app
+    client = module.app.test_client()
+    client.post('/vote', json={'vote': 'cat'})
+
+    fake.up = True
+    assert client.post('/vote', json={'vote': 'dog'}).json == {'cat': 0, 'dog': 1}
+    assert fake.values[counter_key(DEFAULT_POLL, 'dog')] == '1'
+    assert client.get('/health').json['redis_connected'] is True
+
+def test_a_failed_redis_call_moves_back_to_the_fallback(voting_app):
+    module, fake = voting_app
+    client = module.app.test_client()
+    fake.up = True
+    client.post('/vote', json={'vote': 'dog'})
+
+    fake.up = False
+    assert client.post('/vote', json={'vote': 'cat'}).json == {'cat': 1, 'dog': 0}
+    assert module.redis_state['up'] is False
@@ -0,0 +1,37 @@
+from batch_votes import validate_batch
+
+def options_for(poll_id):
+    return {'cat-vs-dog': ('cat', 'dog'), 'tea-vs-coffee': ('tea', 'coffee')}.get(poll_id)
+
+def test_non_string_poll_ids_are_rejected_per_item():
+    items = [{'choice': 'cat', 'poll_id': ['cat-vs-dog']}, {'choice': 'tea', 'poll_id': {'id': 1}},
+             {'choice': 'cat', 'poll_id': 7}, {'choice': 'tea', 'poll_id': 'tea-vs-coffee'}, 'dog']
+    records, errors = validate_batch(items, options_for, None, 'onprem')
+
+    assert [r['index'] for r in records] == [3, 4]
+    assert [r['poll_id'] for r in records] == ['tea-vs-coffee', 'cat-vs-dog']
+    assert errors == [{'index': i, 'error': 'Invalid poll_id: must be a string'} for i in range(3)]
+
+def test_unknown_polls_and_choices_are_reported():
+    records, errors = validate_batch([{'choice': 'cat', 'poll_id': 'nope'}, {'choice': 'fish'}, None],
+                                     options_for, ('azure', 'onprem'), 'onprem')
+    assert records == []
+    assert [e['error'] for e in errors] == ['Unknown poll: nope', 'Invalid choice: fish', 'Malformed item']
+
+def test_timestamps_are_normalised_to_utc_rfc_3339():
+    items = [{'choice': 'cat', 'timestamp': '2026-01-02T03:04:05Z'},
+             {'choice': 'cat', 'timestamp': '2026-01-02 05:04:05.5+02:00'},
+             {'choice': 'dog', 'timestamp': '2026-01-02T03:04:05'}]
+    records, errors = validate_batch(items, options_for, None, 'onprem')
+
+    assert errors == []
+    assert [r['timestamp'] for r in records] == ['2026-01-02T03:04:05+00:00', '2026-01-02T03:04:05.500000+00:00',
+                                                 '2026-01-02T03:04:05+00:00']
+
+def test_timestamps_postgres_would_not_parse_are_rejected():
+    stamps = ['2026-W01-2', '20260102T030405Z', '2026-02-30T00:00:00Z', '2026-01-02T03:04:05Z\n', 1767322800]
+    records, errors = validate_batch([{'choice': 'cat', 'timestamp': t} for t in stamps], options_for, None, 'onprem')
+
+    assert records == []
+    assert [e['index'] for e in errors] == list(range(len(stamps)))
+    assert all(e['error'].startswith('Invalid timestamp') for e in errors)
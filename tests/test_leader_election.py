@@ -0,0 +1,108 @@
+import pytest
+
+from leader_election import FileSnapshotStore, LocalLease, PostgresSnapshotStore, SharedPoller
+
+class CountingStore(FileSnapshotStore):
+    def __init__(self, directory, key):
+        super().__init__(directory, key)
+        self.reads = 0
+
+    def read(self):
+        self.reads += 1
+        return super().read()
+
+def poller(tmp_path, sources, **kwargs):
+    directory = str(tmp_path / 'coordination')
+    return SharedPoller(LocalLease(directory, 'voting', ttl=3.0), CountingStore(directory, 'voting'), sources,
+                        **kwargs)
+
+def test_one_replica_polls_and_the_others_read_what_it_published(tmp_path):
+    calls = []
+    sources = {'azure': lambda: calls.append('azure') or {'cat': 1}, 'onprem': lambda: {'dog': 2}}
+    leader, follower = poller(tmp_path, sources), poller(tmp_path, sources)
+    leader.campaign()
+    follower.campaign()
+    assert (leader.is_leader, follower.is_leader) == (True, False)
+
+    leader.poll()
+    assert follower.read('azure') == {'cat': 1} and follower.read('onprem') == {'dog': 2}
+    assert calls == ['azure']
+
+def test_a_follower_takes_over_when_the_leader_stops(tmp_path):
+    sources = {'azure': lambda: {'cat': 1}}
+    leader, follower = poller(tmp_path, sources), poller(tmp_path, sources)
+    leader.campaign()
+    leader.stop()
+    follower.campaign()
+    assert follower.is_leader and follower.elections == 1
+
+def test_every_source_is_served_from_one_store_read_per_refresh(tmp_path):
+    sources = {'azure': lambda: {'cat': 1}, 'onprem': lambda: {'dog': 2}}
+    leader = poller(tmp_path, sources)
+    leader.campaign()
+    leader.poll()
+
+    follower = poller(tmp_path, sources, read_ttl=60)
+    for _ in range(5):
+        follower.read('azure')
+        follower.read('onprem')
+    assert follower.store.reads == 1 and follower.status()['store_reads'] == 1
+
+    follower.read_ttl = 0
+    follower.read('azure')
+    assert follower.store.reads == 2
+
+def test_a_failing_source_keeps_its_last_value_until_it_is_too_old(tmp_path, monkeypatch):
+    values = [{'cat': 1}]
+    leader = poller(tmp_path, {'azure': lambda: values.pop()}, interval=1.0, max_age=10, read_ttl=0)
+    leader.campaign()
+    leader.poll()
+    leader.poll()  # the loader now raises IndexError
+    assert leader.read('azure') == {'cat': 1}
+    assert 'error' in leader.store.read()['azure']
+
+    polled_at = leader.store.read()['azure']['polled_at']
+    monkeypatch.setattr('leader_election.time.time', lambda: polled_at + 11)
+    with pytest.raises(TimeoutError):
+        leader.read('azure')
+
+def test_postgres_store_reuses_one_connection_and_reconnects_after_an_error():
+    connections = []
+
+    class Cursor:
+        description = ('snapshot',)
+
+        def __init__(self, conn):
+            self.conn = conn
+
+        def execute(self, sql, params):
+            assert 'CREATE' not in sql
+            if self.conn.broken:
+                raise ConnectionError("server closed the connection unexpectedly")
+
+        def fetchone(self):
+            return ({'azure': {'value': {}, 'polled_at': 0}},)
+
+    class Connection:
+        def __init__(self):
+            self.broken = False
+            self.closed = False
+            connections.append(self)
+
+        def cursor(self):
+            return Cursor(self)
+
+        def close(self):
+            self.closed = True
+
+    store = PostgresSnapshotStore(Connection, 'voting')
+    for _ in range(3):
+        assert 'azure' in store.read()
+    assert len(connections) == 1 and connections[0].autocommit
+
+    connections[0].broken = True
+    with pytest.raises(ConnectionError):
+        store.read()
+    assert connections[0].closed
+    store.read()
+    assert len(connections) == 2
@@ -0,0 +1,39 @@
+import tracemalloc
+
+import pytest
+from flask import Flask
+
+from memory_debug import MemoryDebug
+
+TOKEN = {'X-Admin-Token': 'secret'}
+
+@pytest.fixture
+def client():
+    app = Flask(__name__)
+    MemoryDebug('secret').init_app(app)
+    yield app.test_client()
+    if tracemalloc.is_tracing():
+        tracemalloc.stop()
+
+def test_routes_need_the_token(client):
+    assert client.get('/debug/memory').status_code == 401
+    assert client.get('/debug/memory', headers={'Authorization': 'Bearer wrong'}).status_code == 401
+    assert client.get('/debug/memory', headers={'Authorization': 'Bearer secret'}).status_code == 200
+
+@pytest.mark.parametrize('limit', ['abc', '0', '-3', '501', '1.5'])
+def test_a_bad_limit_is_a_400(client, limit):
+    client.post('/debug/memory/start', headers=TOKEN)
+    response = client.get(f'/debug/memory/top?limit={limit}', headers=TOKEN)
+    assert response.status_code == 400
+    assert 'limit' in response.json['error']
+
+@pytest.mark.parametrize('frames', ['x', '0', '101'])
+def test_bad_frames_are_a_400_and_leave_tracing_off(client, frames):
+    response = client.post(f'/debug/memory/start?frames={frames}', headers=TOKEN)
+    assert response.status_code == 400
+    assert not tracemalloc.is_tracing()
+
+def test_valid_arguments_are_used(client):
+    assert client.post('/debug/memory/start?frames=5', headers=TOKEN).json['frames'] == 5
+    response = client.get('/debug/memory/top?limit=3&group=filename', headers=TOKEN)
+    assert response.status_code == 200 and len(response.json['top']) <= 3
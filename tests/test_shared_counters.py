@@ -0,0 +1,73 @@
+import json
+import multiprocessing
+
+import pytest
+
+from shared_counters import SharedCounters
+
+def vote_in_child(path, name, times, ready, together):
+    counters = SharedCounters(path)
+    for _ in range(times):
+        counters.increment(name)
+    ready.put(counters.stripe)
+    # Stay alive until every worker has a stripe, so none is handed on to a later one
+    together.wait(timeout=30)
+
+def run_workers(path, plan):
+    context = multiprocessing.get_context('fork')
+    stripes, together = context.Queue(), context.Barrier(len(plan))
+    workers = [context.Process(target=vote_in_child, args=(path, name, times, stripes, together))
+               for name, times in plan]
+    for worker in workers:
+        worker.start()
+    for worker in workers:
+        worker.join(timeout=30)
+        assert worker.exitcode == 0
+    return sorted(stripes.get(timeout=5) for _ in workers)
+
+def test_increments_from_several_processes_add_up(tmp_path):
+    path = str(tmp_path / 'counters')
+    stripes = run_workers(path, [('cat', 5000), ('cat', 5000), ('dog', 3000), ('dog', 1)])
+
+    # Live workers each hold their own stripe
+    assert len(set(stripes)) == len(stripes)
+    assert SharedCounters(path).totals() == {'cat': 10000, 'dog': 3001}
+
+def test_a_restarted_worker_keeps_the_counts_of_its_stripe(tmp_path):
+    path = str(tmp_path / 'counters')
+    run_workers(path, [('cat', 10)])
+    run_workers(path, [('cat', 5)])
+    counters = SharedCounters(path)
+    counters.increment('dog', 2)
+    assert counters.totals() == {'cat': 15, 'dog': 2}
+
+def test_a_fresh_file_is_seeded_from_the_snapshot(tmp_path):
+    path, snapshot = str(tmp_path / 'counters'), str(tmp_path / 'snapshot.json')
+    counters = SharedCounters(path, snapshot_path=snapshot)
+    counters.increment('cat', 7)
+    counters.snapshot()
+
+    # /dev/shm is emptied when the container restarts
+    fresh = SharedCounters(str(tmp_path / 'counters-after-restart'), snapshot_path=snapshot)
+    assert fresh.totals() == {'cat': 7, 'dog': 0}
+    fresh.increment('cat')
+    assert fresh.totals()['cat'] == 8
+
+def test_an_unreadable_snapshot_starts_from_zero(tmp_path):
+    snapshot = tmp_path / 'snapshot.json'
+    snapshot.write_text('{"cat": 3')
+    counters = SharedCounters(str(tmp_path / 'counters'), snapshot_path=str(snapshot))
+    assert counters.totals() == {'cat': 0, 'dog': 0}
+
+def test_an_existing_file_with_another_layout_is_refused(tmp_path):
+    path = str(tmp_path / 'counters')
+    SharedCounters(path)
+    with pytest.raises(ValueError):
+        SharedCounters(path, names=('cat', 'dog', 'fish'))
+
+def test_snapshot_is_valid_json_of_the_totals(tmp_path):
+    snapshot = tmp_path / 'snapshot.json'
+    counters = SharedCounters(str(tmp_path / 'counters'), snapshot_path=str(snapshot))
+    counters.increment('dog', 4)
+    counters.snapshot()
+    assert json.loads(snapshot.read_text()) == {'cat': 0, 'dog': 4}
@@ -0,0 +1,142 @@
+import csv
+import importlib.util
+import io
+import os
+from contextlib import contextmanager, nullcontext
+
+import pytest
+from psycopg.adapt import Transformer
+from psycopg.copy import format_row_text
+
+from pg_pipeline import PipelinedPostgres
+
+APP_PATH = os.path.join(os.path.dirname(os.path.abspath(__file__)), '..', 'app', 'app-with-db.py')
+COLUMNS = ['id', 'vote_choice', 'vote_source', 'timestamp', 'ip_address', 'user_agent', 'session_id',
+           'abuse_flag', 'poll_id']
+
+def parse_copy_text(line):
+    """Read one line of COPY text format the way the server does (tabs, \\N, backslash escapes)"""
+    escapes = {'t': '\t', 'n': '\n', 'r': '\r', '\\': '\\'}
+    values = []
+    for field in line.rstrip('\n').split('\t'):
+        if field == '\\N':
+            values.append(None)
+            continue
+        out, chars = [], iter(field)
+        for char in chars:
+            out.append(escapes.get(next(chars), '') if char == '\\' else char)
+        values.append(''.join(out))
+    return values
+
+class FakeCopy:
+    def __init__(self, sink):
+        self.sink = sink
+        self.transformer = Transformer()
+
+    def write_row(self, row):
+        self.sink.append(bytes(format_row_text(row, self.transformer)).decode())
+
+class FakePool:
+    """Stands in for psycopg_pool: records what PipelinedPostgres.copy sends"""
+
+    def __init__(self):
+        self.statements = []
+        self.lines = []
+
+    @contextmanager
+    def connection(self):
+        pool = self
+
+        class Cursor:
+            description = None
+
+            @contextmanager
+            def copy(self, sql):
+                pool.statements.append(sql)
+                yield FakeCopy(pool.lines)
+
+            def execute(self, sql, params=None, prepare=None):
+                pool.statements.append(sql)
+
+        class Connection:
+            def transaction(self):
+                return nullcontext()
+
+            def cursor(self, binary=False):
+                return Cursor()
+
+        yield Connection()
+
+class FakePsycopg2:
+    """A psycopg2 connection that keeps the COPY statement and its CSV input"""
+
+    def __init__(self):
+        self.copies = []
+
+    def __call__(self, readonly=False):
+        return self
+
+    def cursor(self):
+        return self
+
+    def copy_expert(self, sql, buffer):
+        self.copies.append((sql, buffer.read()))
+
+    def execute(self, sql, params=None):
+        pass
+
+    def commit(self):
+        pass
+
+    def close(self):
+        pass
+
+@pytest.fixture
+def app_with_db(monkeypatch):
+    monkeypatch.setenv('VOTE_SOURCE', 'onprem')
+    monkeypatch.setenv('VOTE_ID_WORKER', '1')
+    for name in ('DB_DRIVER', 'STORAGE_MODE', 'COMPACT_METADATA', 'VOTE_JOURNAL_DIR'):
+        monkeypatch.delenv(name, raising=False)
+    spec = importlib.util.spec_from_file_location('db_voting_app', APP_PATH)
+    module = importlib.util.module_from_spec(spec)
+    spec.loader.exec_module(module)
+    monkeypatch.setattr(module.catalog, 'options', lambda poll_id: ('cat', 'dog') if poll_id == 'cat-vs-dog' else None)
+    monkeypatch.setattr(module, 'init_database', lambda: True)
+    return module
+
+BATCH = [{'choice': 'cat', 'session_id': 'kiosk-1', 'timestamp': '2026-01-02T03:04:05Z'},
+         {'choice': 'dog'}]
+
+def test_psycopg_copy_round_trips_a_batch_with_nulls(app_with_db):
+    pool = FakePool()
+    pg = PipelinedPostgres({'host': 'unused'})
+    pg.pool = pool
+    app_with_db.pg = pg
+
+    response = app_with_db.app.test_client().post('/votes/batch', json=BATCH)
+    assert response.status_code == 200
+
+    # The summary cache may refresh on its own thread; find the COPY among the statements
+    copy_sql, = [sql for sql in pool.statements if sql.startswith('COPY')]
+    assert copy_sql == app_with_db.COPY_VOTES_SQL
+    assert 'csv' not in copy_sql.lower()
+    rows = [dict(zip(COLUMNS, parse_copy_text(line))) for line in pool.lines]
+    assert [row['vote_choice'] for row in rows] == ['cat', 'dog']
+    assert rows[0]['session_id'] == 'kiosk-1'
+    assert rows[0]['timestamp'].startswith('2026-01-02T03:04:05')
+    assert rows[1]['session_id'] is None
+    assert rows[0]['abuse_flag'] is None and rows[0]['poll_id'] == 'cat-vs-dog'
+    assert int(rows[0]['id']) < int(rows[1]['id'])
+
+def test_psycopg2_copy_round_trips_a_batch_as_csv(app_with_db, monkeypatch):
+    conn = FakePsycopg2()
+    monkeypatch.setattr(app_with_db, 'get_db_connection', conn)
+
+    response = app_with_db.app.test_client().post('/votes/batch', json=BATCH)
+    assert response.status_code == 200
+
+    sql, data = conn.copies[0]
+    assert sql.endswith('WITH (FORMAT csv)')
+    rows = [dict(zip(COLUMNS, [value or None for value in row])) for row in csv.reader(io.StringIO(data))]
+    assert [row['vote_choice'] for row in rows] == ['cat', 'dog']
+    assert rows[1]['session_id'] is None
@@ -0,0 +1,30 @@
+import pytest
+
+from vote_ids import SEQUENCE_BITS, SITE_BITS, WORKER_BITS, VoteIdGenerator
+
+@pytest.mark.parametrize('worker', [None, '', 'pod-3', '-1'])
+def test_a_missing_or_malformed_worker_fails_at_startup(monkeypatch, worker):
+    if worker is None:
+        monkeypatch.delenv('VOTE_ID_WORKER', raising=False)
+    else:
+        monkeypatch.setenv('VOTE_ID_WORKER', worker)
+    with pytest.raises(ValueError):
+        VoteIdGenerator.from_env('onprem')
+
+def test_the_worker_reserved_for_the_database_default_is_refused(monkeypatch):
+    monkeypatch.setenv('VOTE_ID_WORKER', '127')
+    with pytest.raises(ValueError):
+        VoteIdGenerator.from_env('onprem')
+
+def test_ids_carry_site_and_worker_and_increase(monkeypatch):
+    monkeypatch.setenv('VOTE_ID_WORKER', '5')
+    ids = VoteIdGenerator.from_env('azure')
+    issued = [ids.next() for _ in range(10000)]
+
+    assert issued == sorted(set(issued))
+    node = issued[0] >> SEQUENCE_BITS & ((1 << (SITE_BITS + WORKER_BITS)) - 1)
+    assert node == (1 << WORKER_BITS | 5)
+
+def test_two_workers_never_issue_the_same_id():
+    first, second = VoteIdGenerator(0, 1), VoteIdGenerator(0, 2)
+    assert not {first.next() for _ in range(5000)} & {second.next() for _ in range(5000)}
@@ -0,0 +1,169 @@
+import os
+
+import pytest
+
+from vote_journal import QUARANTINE_FILE, PostgresJournalSink, VoteJournal, decode_record
+
+class MemorySink:
+    """Applies a batch and its offset together, like the real sinks' transactions"""
+
+    def __init__(self, fail_on_batch=None, refuse=()):
+        self.records = []
+        self.offsets = {}
+        self.batches = 0
+        self.fail_on_batch = fail_on_batch
+        self.refuse = set(refuse)
+
+    def committed_offset(self, journal_id):
+        return self.offsets.get(journal_id, 0)
+
+    def apply(self, journal_id, records, last_offset):
+        self.batches += 1
+        if self.batches == self.fail_on_batch:
+            raise ConnectionError("store went away mid-replay")
+        if any(r['session_id'] in self.refuse for r in records):
+            raise ValueError("invalid input syntax for type timestamp")
+        self.records.extend(records)
+        self.offsets[journal_id] = last_offset
+
+    def rejects(self, error):
+        return isinstance(error, ValueError)
+
+def vote(i):
+    return {'choice': 'cat' if i % 2 else 'dog', 'source': 'onprem', 'timestamp': '2026-01-01T00:00:00+00:00',
+            'session_id': f's{i}'}
+
+@pytest.fixture
+def journal_dir(tmp_path):
+    return str(tmp_path / 'journal')
+
+def test_torn_record_is_cut_off_on_recovery(journal_dir):
+    journal = VoteJournal(journal_dir)
+    for i in range(3):
+        journal.append(vote(i))
+    segment = journal.segments()[-1]
+    journal.close()
+
+    # A crash mid-write leaves half a line at the end of the segment
+    with open(segment, 'ab') as f:
+        f.write(b'4 deadbeef {"choice": "ca')
+
+    journal = VoteJournal(journal_dir)
+    assert journal.next_offset == 4
+    assert journal.append(vote(3)) == 4
+    with open(segment, 'rb') as f:
+        offsets = [decode_record(line)[0] for line in f]
+    journal.close()
+    assert offsets == [1, 2, 3, 4]
+
+def test_corrupt_record_stops_recovery_at_the_last_valid_offset(journal_dir):
+    journal = VoteJournal(journal_dir)
+    for i in range(3):
+        journal.append(vote(i))
+    segment = journal.segments()[-1]
+    journal.close()
+
+    with open(segment, 'rb') as f:
+        lines = f.readlines()
+    lines[2] = lines[2].replace(b'"dog"', b'"cow"')  # payload no longer matches its crc
+    with open(segment, 'wb') as f:
+        f.writelines(lines)
+
+    journal = VoteJournal(journal_dir)
+    assert journal.next_offset == 3
+    journal.close()
+
+def test_replay_delivers_each_vote_once_across_a_failed_batch(journal_dir):
+    journal = VoteJournal(journal_dir)
+    for i in range(10):
+        journal.append(vote(i))
+
+    sink = MemorySink(fail_on_batch=2)
+    with pytest.raises(ConnectionError):
+        journal.replay(sink, batch_size=4)
+    # Only the batch that committed moved the offset
+    assert sink.committed_offset(journal.journal_id) == 4
+    assert len(sink.records) == 4
+
+    assert journal.replay(sink, batch_size=4) == 6
+    assert [r['session_id'] for r in sink.records] == [f's{i}' for i in range(10)]
+    assert journal.backlog() == 0
+    assert journal.replay(sink, batch_size=4) == 0
+    journal.close()
+
+def test_replay_resumes_from_the_committed_offset_after_restart(journal_dir):
+    journal = VoteJournal(journal_dir)
+    for i in range(5):
+        journal.append(vote(i))
+    sink = MemorySink()
+    journal.replay(sink)
+    journal.close()
+
+    journal = VoteJournal(journal_dir)
+    journal.append(vote(5))
+    assert journal.replay(sink) == 1
+    assert [r['session_id'] for r in sink.records] == [f's{i}' for i in range(6)]
+    journal.close()
+
+def test_a_record_the_store_refuses_is_quarantined_not_retried(journal_dir):
+    journal = VoteJournal(journal_dir)
+    for i in range(6):
+        journal.append(vote(i))
+
+    sink = MemorySink(refuse={'s2'})
+    assert journal.replay(sink, batch_size=4) == 6
+    assert [r['session_id'] for r in sink.records] == ['s0', 's1', 's3', 's4', 's5']
+    assert sink.committed_offset(journal.journal_id) == 6
+    assert journal.quarantined == 1
+
+    with open(os.path.join(journal.directory, QUARANTINE_FILE), 'rb') as f:
+        offset, entry = decode_record(f.readline())
+    assert offset == 3 and entry['record']['session_id'] == 's2'
+    assert 'timestamp' in entry['error']
+    journal.close()
+
+def test_release_deletes_only_fully_replayed_segments(journal_dir):
+    journal = VoteJournal(journal_dir, segment_bytes=256)
+    for i in range(20):
+        journal.append(vote(i))
+    segments = journal.segments()
+    assert len(segments) > 2
+
+    # Replay only part of the journal: segments past the offset must stay
+    second_first = int(os.path.basename(segments[1]).split('.')[0])
+    journal.release(second_first - 1)
+    remaining = journal.segments()
+    assert remaining == segments[1:]
+
+    journal.replay(MemorySink())
+    # The segment being written is never removed
+    assert journal.segments() == [journal.file.name]
+    journal.close()
+
+def test_postgres_sink_writes_votes_and_offset_in_one_transaction(monkeypatch):
+    import psycopg2.extras
+
+    statements = []
+
+    class Cursor:
+        def execute(self, sql, params=None):
+            statements.append(('execute', sql))
+
+    class Connection:
+        def cursor(self):
+            return Cursor()
+
+        def commit(self):
+            statements.append(('commit', None))
+
+        def close(self):
+            statements.append(('close', None))
+
+    monkeypatch.setattr(psycopg2.extras, 'execute_values',
+                        lambda cursor, sql, rows: statements.append(('insert', sql)))
+    sink = PostgresJournalSink(Connection)
+    sink.apply('pod-0', [dict(vote(1), id=1)], 7)
+
+    kinds = [kind for kind, _ in statements]
+    assert kinds == ['insert', 'execute', 'commit', 'close']
+    assert 'vote_journal_offsets' in statements[1][1]